@@ -0,0 +1,27 @@
+from services import service_memory
+
+
+class MemoryMiddleware:
+    """
+    Pure ASGI middleware attributing traced allocations to route templates while
+    memory profiling is on (MEMORY_PROFILING=1 or POST /debug/memory/start).
+    Costs one ``tracemalloc.is_tracing()`` call per request otherwise.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = service_memory.start_request()
+        if state is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            service_memory.end_request(state, "{} {}".format(scope["method"], route.path if route is not None else "unmatched"))
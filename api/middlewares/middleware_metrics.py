@@ -0,0 +1,39 @@
+import time
+from services import service_metrics
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request count, latency and in-flight requests
+    per route template (``/documents/label-sets/{fingerprint}``, not the raw path,
+    to keep label cardinality bounded).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        start = time.perf_counter()
+        service_metrics.http_requests_in_flight.inc(method)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            service_metrics.http_requests_in_flight.dec(method)
+            route = scope.get("route")
+            template = route.path if route is not None else "unmatched"
+            service_metrics.http_requests.inc(method, template, str(status_code))
+            service_metrics.http_request_duration.observe(elapsed, method, template)
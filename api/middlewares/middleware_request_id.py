@@ -0,0 +1,56 @@
+import re
+import logging
+import time
+import uuid
+from services import service_log
+
+REQUEST_ID_HEADER = b"x-request-id"
+_VALID_REQUEST_ID = re.compile(rb"^[A-Za-z0-9._:-]{1,128}$")
+
+access_logger = service_log.get_logger("http")
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware binding a request id to the request's context, so every
+    log record written while serving it carries it. An incoming ``X-Request-ID``
+    is reused when well formed, otherwise one is generated; either way it is
+    echoed back. Also writes one access log record per request on
+    ``athross.http`` (a good candidate for LOG_SAMPLING).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER, b"")
+        request_id = incoming.decode() if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = service_log.request_id.set(request_id)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            access_logger.log(
+                logging.WARNING if status_code >= 500 else logging.INFO,
+                "%s %s %d", scope["method"], scope["path"], status_code,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                }
+            )
+            service_log.request_id.reset(token)
@@ -0,0 +1,36 @@
+import time
+from services import service_sql_accounting
+
+
+class SqlAccountingMiddleware:
+    """
+    Pure ASGI middleware counting and timing the SQL statements of each request.
+
+    The totals go out in a ``Server-Timing`` header (``db`` and ``app`` entries,
+    plus ``n-plus-one`` when a statement shape repeats) and in the
+    ``athross.sql`` log. Since the header is written when the response starts,
+    statements run by a streaming body after that are only logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries, token = service_sql_accounting.start_request()
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                timing = queries.server_timing(time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            service_sql_accounting.end_request(token)
+            service_sql_accounting.log_request(scope["method"], scope["path"], queries, time.perf_counter() - start)
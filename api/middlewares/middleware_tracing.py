@@ -0,0 +1,46 @@
+from services import service_log, service_tracing
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the server span of each sampled request. An
+    incoming W3C ``traceparent`` header continues the caller's trace; the span
+    is renamed after the route template once routing has happened.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = dict(scope["headers"]).get(b"traceparent")
+        remote = service_tracing.parse_traceparent(traceparent.decode("latin-1")) if traceparent else None
+        method = scope["method"]
+        with service_tracing.span(method, service_tracing.KIND_SERVER, remote=remote) as server_span:
+            if server_span is None:
+                await self.app(scope, receive, send)
+                return
+
+            server_span.attributes.update({
+                "http.request.method": method,
+                "url.path": scope["path"],
+                "request.id": service_log.request_id.get() or "",
+            })
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        server_span.status = (service_tracing.STATUS_ERROR, "HTTP {}".format(message["status"]))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    server_span.name = "{} {}".format(method, route.path)
+                    server_span.set_attribute("http.route", route.path)
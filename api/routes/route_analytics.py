@@ -0,0 +1,146 @@
+from fastapi import APIRouter, Depends, Query, status, HTTPException, Cookie
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from factory.factory_database import get_read_db
+from api.schemas import schema_analytics
+from services import service_auth
+
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"],
+    responses={
+        400: {"description": "Bad request"},
+        500: {"description": "Internal server error"}
+    }
+)
+
+
+def analytics():
+    # Imported on first use: numpy is the heaviest import of the application and only analytics needs it.
+    from services import service_analytics
+    return service_analytics.analytics
+
+
+FRESH_DESCRIPTION = "Wait for writes made since the last refresh to be included instead of answering from the current matrix"
+
+
+def parse_label(label: str) -> Tuple[str, Optional[str]]:
+    key, separator, value = label.partition("=")
+    if not key:
+        raise HTTPException(status_code=400, detail="Invalid label filter: {!r}".format(label))
+    return key, value if separator else None
+
+
+def document_filter(
+    type: Optional[str] = Query(None, description="Only count documents of this type"),
+    label: List[str] = Query([], description="Only count documents carrying `key=value` (or any `key`); repeatable")
+) -> Tuple[Optional[str], List[Tuple[str, Optional[str]]]]:
+    return type, [parse_label(item) for item in label]
+
+
+@router.get(
+    "/facets",
+    response_model=schema_analytics.FacetResponse,
+    summary="Count documents per label",
+    description="Number of documents carrying each label (of `key` only, if given) among the filtered documents, most common first.",
+    response_description="Label counts"
+)
+async def facets(
+    key: Optional[str] = Query(None, description="Only count labels with this key"),
+    limit: int = Query(100, ge=1, le=10000),
+    filters: Tuple = Depends(document_filter),
+    fresh: bool = Query(False, description=FRESH_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    matrix = await analytics().get(db, fresh)
+    mask = matrix.select(*filters)
+    return {
+        "total_documents": int(mask.sum()),
+        "generated_at": matrix.generated_at,
+        "facets": [{"key": key, "value": value, "count": count} for key, value, count in matrix.facets(mask, key, limit)]
+    }
+
+
+@router.get(
+    "/group-by",
+    response_model=schema_analytics.GroupByResponse,
+    summary="Count documents per value combination",
+    description="""
+    Number of filtered documents per value of one or two dimensions, most common first. A dimension is `type`
+    (the document type) or a label key, e.g. `by=type&by=port`. A document with several values for a key counts
+    once per value.
+""",
+    response_description="Value combinations with their document count"
+)
+async def group_by(
+    by: List[str] = Query(..., description="`type` or a label key; one or two"),
+    limit: int = Query(100, ge=1, le=10000),
+    filters: Tuple = Depends(document_filter),
+    fresh: bool = Query(False, description=FRESH_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+    if len(by) > 2:
+        raise HTTPException(status_code=400, detail="Group by at most two dimensions")
+
+    matrix = await analytics().get(db, fresh)
+    mask = matrix.select(*filters)
+    return {
+        "total_documents": int(mask.sum()),
+        "generated_at": matrix.generated_at,
+        "dimensions": by,
+        "groups": [{"values": list(values), "count": count} for values, count in matrix.group_by(mask, by, limit)]
+    }
+
+
+@router.get(
+    "/co-occurrence",
+    response_model=schema_analytics.CoOccurrenceResponse,
+    summary="Labels found together with a label",
+    description="Among the filtered documents carrying `label` (`key=value`, or any label with `key`), the other labels "
+                "they carry most often, with the share of those documents carrying each.",
+    response_description="Co-occurring labels"
+)
+async def co_occurrence(
+    label: str = Query(..., description="`key=value` or `key`"),
+    limit: int = Query(100, ge=1, le=10000),
+    filters: Tuple = Depends(document_filter),
+    fresh: bool = Query(False, description=FRESH_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    key, value = parse_label(label)
+    matrix = await analytics().get(db, fresh)
+    total, labels = matrix.co_occurrence(matrix.select(*filters), key, value, limit)
+    return {
+        "key": key,
+        "value": value,
+        "total_documents": total,
+        "generated_at": matrix.generated_at,
+        "labels": [
+            {"key": other_key, "value": other_value, "count": count, "ratio": round(count / total, 4)}
+            for other_key, other_value, count in labels
+        ]
+    }
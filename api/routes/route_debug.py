@@ -0,0 +1,199 @@
+import asyncio
+import os
+from fastapi import APIRouter, Depends, Query, status, HTTPException, Cookie
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from factory.factory_database import get_read_db
+from services import service_auth, service_profiler, service_memory, service_watchdog
+
+# The profiler and tracemalloc slow the whole worker down, so starting them is for operators who opt in.
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "false").lower() == "true"
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["Debug"],
+    responses={
+        401: {"description": "User Not Found or Inactive"},
+        404: {"description": "Profiling endpoints are off; set DEBUG_ENDPOINTS=true"},
+        409: {"description": "A profile is already running, or memory profiling is off"}
+    }
+)
+
+@router.get(
+    "/profile",
+    summary="Profile the running process",
+    description=(
+        "Samples the stacks of every thread of this worker for `seconds` and returns them as collapsed stacks "
+        "(flamegraph.pl, speedscope, inferno) or as a speedscope JSON file. Requests served meanwhile are profiled "
+        "as usual; only one profile runs per worker at a time. Answers 404 unless DEBUG_ENDPOINTS=true."
+    ),
+    response_description="Collapsed stacks as text or a speedscope document"
+)
+async def profile(
+    seconds: float = Query(5.0, gt=0, le=60),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    idle: bool = Query(False, description="Keep samples of threads waiting in select/poll/locks"),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    _require_debug_endpoints()
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+    await db.close()
+
+    profiler = service_profiler.SamplingProfiler(interval_ms / 1000, include_idle=idle)
+    try:
+        await asyncio.to_thread(profiler.run, seconds)
+    except service_profiler.ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running"
+        )
+
+    if format == "speedscope":
+        return JSONResponse(
+            profiler.speedscope(),
+            headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'}
+        )
+    return PlainTextResponse(profiler.collapsed())
+
+@router.get(
+    "/loop",
+    summary="Event loop lag and recent blocks",
+    description=(
+        "Event loop lag quantiles since start and the last blocks longer than WATCHDOG_THRESHOLD_MS, each with "
+        "the stack the loop was stuck in."
+    )
+)
+async def loop(
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+    watchdog = service_watchdog.watchdog
+    return {
+        "enabled": watchdog is not None,
+        "threshold_ms": watchdog.threshold * 1000 if watchdog else None,
+        "lag_seconds": {
+            "p{:g}".format(quantile * 100): service_watchdog.event_loop_lag.quantile(quantile)
+            for quantile in service_watchdog.event_loop_lag.quantiles
+        },
+        "blocks": watchdog.recent() if watchdog else [],
+    }
+
+
+def _require_debug_endpoints():
+    if not DEBUG_ENDPOINTS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+
+async def _require_memory_profiling(db: AsyncSession, access_token: str | None):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+    if not service_memory.enabled():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Memory profiling is off; set MEMORY_PROFILING=1 or POST /debug/memory/start"
+        )
+
+@router.get(
+    "/memory",
+    summary="Memory profiling summary",
+    description=(
+        "Traced memory of the worker and, per endpoint, the mean bytes a request retained, its mean and maximum "
+        "peak above its starting point, and the largest ORM identity map it built. Peaks of overlapping requests "
+        "include each other's allocations."
+    )
+)
+async def memory(
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    await _require_memory_profiling(db, access_token)
+    return service_memory.summary()
+
+@router.post(
+    "/memory/start",
+    summary="Start memory profiling",
+    description=(
+        "Starts tracemalloc keeping `frames` frames per allocation. Every allocation gets slower until stopped. "
+        "Answers 404 unless DEBUG_ENDPOINTS=true."
+    )
+)
+async def memory_start(
+    frames: int = Query(service_memory.DEFAULT_FRAMES, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    _require_debug_endpoints()
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+    service_memory.start(frames)
+    return service_memory.summary()
+
+@router.post(
+    "/memory/stop",
+    summary="Stop memory profiling",
+    description="Stops tracemalloc and discards the per-endpoint statistics and the snapshot baseline."
+)
+async def memory_stop(
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    await _require_memory_profiling(db, access_token)
+    service_memory.stop()
+    return {"enabled": False}
+
+@router.get(
+    "/memory/snapshot",
+    summary="Top allocation sites",
+    description="Takes a tracemalloc snapshot, returns its `limit` largest allocation sites and keeps it as the baseline of /debug/memory/diff."
+)
+async def memory_snapshot(
+    limit: int = Query(20, ge=1, le=1000),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    await _require_memory_profiling(db, access_token)
+    return {"statistics": service_memory.snapshot(limit, group_by)}
+
+@router.get(
+    "/memory/diff",
+    summary="Allocation growth since the last snapshot",
+    description="Compares a new snapshot with the one taken by /debug/memory/snapshot and returns the `limit` largest changes."
+)
+async def memory_diff(
+    limit: int = Query(20, ge=1, le=1000),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    await _require_memory_profiling(db, access_token)
+    statistics = service_memory.diff(limit, group_by)
+    if statistics is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No baseline; call /debug/memory/snapshot first"
+        )
+    return {"statistics": statistics}
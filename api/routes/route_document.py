@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, status, HTTPException, Cookie
-from fastapi.responses import JSONResponse
-from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict
+import json
 import uuid
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, Query, status, HTTPException, Cookie, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Dict, Optional, Set, Tuple
 import repository.repository_document as repository_document
-from factory.factory_database import get_async_db
+from factory.factory_database import get_async_db, get_read_db
 from services import service_label
 from repository import repository_label
-from api.schemas import schema_document, schema_search
-from services import service_auth
+from api.schemas import schema_document, schema_search, schema_label
+from api.schemas.schema_paginator import PaginatedResponse
+from services import service_auth, service_components, service_similarity
 
+NDJSON = "application/x-ndjson"
+SEARCH_PAGE_SIZE = 500
 
 router = APIRouter(
     prefix="/documents",
@@ -43,7 +48,7 @@ router = APIRouter(
     }
 )
 async def list_all(
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_read_db),
     access_token: str | None = Cookie(default=None)
 ):
     user = await service_auth.get_user_by_token(db, access_token)
@@ -58,7 +63,7 @@ async def list_all(
 
 @router.post(
     "/",
-    response_model=List[schema_document.Document],
+    response_model=Dict[str, List[schema_document.Document]],
     status_code=status.HTTP_201_CREATED,
     summary="Create or update documents",
     description="Creates new documents or updates existing ones in bulk operation.",
@@ -148,6 +153,206 @@ async def delete_list(
     return JSONResponse({"detail": "All documents deleted"}, status_code=200)
 
 
+@router.get(
+    "/select",
+    response_model=List[schema_document.Document],
+    summary="Select documents by label selector",
+    description="""
+    Returns the documents matching a label selector. Requirements are separated by commas and must all match:
+
+    - `key=value` / `key!=value`: the document has / does not have the label
+    - `key in (a,b)` / `key notin (a,b)`: the document has one / none of the labels
+    - `key` / `!key`: the document has / does not have any label with that key
+""",
+    responses={
+        400: {
+            "description": "Malformed selector",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid selector: expected a value for key 'port'"}
+                }
+            }
+        }
+    }
+)
+async def select_by_labels(
+    selector: str = Query(
+        "",
+        description="Label selector, e.g. `domain,port in (5432,5672),!deprecated`"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    return await repository_document.list_by_selector(db, selector)
+
+
+@router.get(
+    "/label-sets",
+    response_model=PaginatedResponse[schema_document.LabelSet],
+    summary="Group documents by label set",
+    description="Lists the distinct label sets in use, largest group first, with the number of documents carrying exactly that set.",
+    response_description="Paginated label sets with their fingerprint and document count"
+)
+async def list_label_sets(
+    skip: int = Query(0, alias="offset", ge=0, description="Number of label sets to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of label sets to return (up to 1000)"),
+    min_size: int = Query(1, ge=1, description="Only return label sets shared by at least this many documents"),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    items, total = await repository_document.list_label_sets(db, skip=skip, limit=limit, min_size=min_size)
+    return {
+        "items": items,
+        "total": total,
+        "skip": skip,
+        "limit": limit
+    }
+
+
+@router.get(
+    "/label-sets/{fingerprint}",
+    response_model=List[schema_document.Document],
+    summary="List documents of a label set",
+    description="Returns the documents whose label set has the given fingerprint.",
+    response_description="Documents carrying exactly that label set"
+)
+async def list_by_label_set_fingerprint(
+    fingerprint: str,
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    return await repository_document.list_by_labels_fingerprint(db, fingerprint)
+
+
+@router.post(
+    "/label-sets/match",
+    response_model=List[schema_document.Document],
+    summary="Find documents with exactly these labels",
+    description="Returns the documents whose label set is exactly the given one, regardless of label order.",
+    response_description="Documents carrying exactly that label set"
+)
+async def match_label_set(
+    labels: List[schema_label.LabelBase],
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    return await repository_document.list_by_label_set(db, labels)
+
+
+@router.get(
+    "/{document_id}/related",
+    response_model=List[schema_document.Document],
+    summary="List the documents connected to a document",
+    description=(
+        "Returns every document reachable from the given one by following shared labels any number of hops, "
+        "the document itself included. Answered from an in-memory connected components index."
+    ),
+    response_description="Documents of the same connected component",
+    responses={
+        404: {
+            "description": "Document not found on database",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Document not found"}
+                }
+            }
+        }
+    }
+)
+async def list_related(
+    document_id: uuid.UUID,
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    related = await service_components.components.related(db, document_id)
+    if related is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return await repository_document.list_by_ids(db, related)
+
+
+@router.get(
+    "/{document_id}/similar",
+    response_model=List[schema_document.SimilarDocument],
+    summary="List the documents most similar to a document",
+    description=(
+        "Returns up to `k` documents whose label sets are most alike the given one's, by Jaccard similarity over "
+        "their labels and label keys, so the same service in another environment ranks high and near-duplicate "
+        "registrations rank first. Candidates come from a MinHash/LSH index, so documents far below "
+        "0.5 similarity are usually not considered at all."
+    ),
+    response_description="Similar documents, most similar first",
+    responses={
+        404: {
+            "description": "Document not found on database",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Document not found"}
+                }
+            }
+        }
+    }
+)
+async def list_similar(
+    document_id: uuid.UUID,
+    k: int = Query(10, ge=1, le=100, description="Maximum number of documents to return"),
+    min_similarity: float = Query(0.0, ge=0, le=1, description="Only return documents at least this similar"),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    index = await service_similarity.similarity.get(db)
+    similar = index.similar(document_id, k, min_similarity)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    documents = {document.id: document for document in await repository_document.list_by_ids(db, [document_id for document_id, _ in similar])}
+    return [
+        {"similarity": round(score, 4), "document": documents[document_id]}
+        for document_id, score in similar
+        if document_id in documents
+    ]
+
+
 @router.post(
     "/search",
     response_model=schema_search.DocumentSearchResponse,
@@ -160,6 +365,22 @@ async def delete_list(
     - If by_type = False: the documents will be returned in a flat list under the documents field.
 
     - If by_type = True: the documents will be grouped by type in a dictionary under the documents_by_type field.
+
+    The search starts from the documents carrying every given label (the labels of `document_uuid` when none
+    are given) and follows shared labels up to `max_depth` hops:
+
+    - `allow_keys` / `deny_keys`: only follow / never follow labels with these keys
+    - `max_fanout`: follow at most this many documents through any one label
+    - `skip_hubs`: do not follow labels carried by more than `hub_ratio` of all documents (they are listed in
+      `metadata.skipped_hubs`), so a label such as `port=5432` does not pull in the whole inventory
+
+    With `strategy = "database"` the walk runs as a recursive query inside the database and only the resulting
+    documents are streamed back, so it works on inventories that do not fit in worker memory.
+
+    Documents come nearest first. With `limit` only that many are returned, and `metadata.next_cursor` resumes the
+    same search where the page stopped (pass it back as `cursor`). With `Accept: application/x-ndjson` the response
+    is streamed as one JSON document per line, with its `depth`, hop by hop as they load, followed by a
+    `{"metadata": ...}` line; a client that has seen enough can close the connection and the walk stops.
 """,
     responses={
         200: {
@@ -179,6 +400,14 @@ async def delete_list(
                 }
             }
         },
+        400: {
+            "description": "Cursor not issued for this search",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid cursor"}
+                }
+            }
+        },
         404: {
             "description": "Document not found on database",
             "content": {
@@ -191,24 +420,141 @@ async def delete_list(
 )
 async def search_on_document(
     search: schema_search.DocumentSearch,
-    db: AsyncSession = Depends(get_async_db),
-    access_token: str | None = Cookie(default=None)
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None),
+    accept: str | None = Header(default=None)
 ):
-    document_obj = await repository_document.get_document_by_uuid(db, search.document_uuid)
-    if not document_obj:
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    labels = await repository_label.get_or_create(db, search.labels)
-    
     user = await service_auth.get_user_by_token(db, access_token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User Not Found or Inactive"
         )
-    
+
+    document_obj = await repository_document.get_document_by_uuid(db, search.document_uuid)
+    if not document_obj:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    requested = search.labels or document_obj.labels
+    labels = await repository_label.list_by_pairs(db, search.labels) if search.labels else document_obj.labels
+
+    options = service_label.TraversalOptions(
+        allow_keys=frozenset(search.allow_keys) if search.allow_keys is not None else None,
+        deny_keys=frozenset(search.deny_keys),
+        max_fanout=search.max_fanout,
+        skip_hubs=search.skip_hubs,
+        hub_ratio=search.hub_ratio,
+        max_depth=search.max_depth
+    )
+    # A label that does not exist is on no document, so no document carries every requested one.
+    known = len(labels) == len({(label.key, label.value) for label in requested})
+    seed_label_ids = [label.id for label in labels] if known else []
+    initial_labels = [{"key": label.key, "value": label.value} for label in requested]
+
+    fingerprint = service_label.search_fingerprint(search.model_dump_json(exclude={"cursor", "limit"}))
+    after = None
+    if search.cursor:
+        try:
+            after = service_label.decode_cursor(search.cursor, fingerprint)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if accept and NDJSON in accept:
+        return StreamingResponse(
+            _stream_relations(db.bind, search, seed_label_ids, options, after, fingerprint, initial_labels),
+            media_type=NDJSON
+        )
+
+    related_docs, skipped_hubs, next_position = [], set(), None
+    async with aclosing(_relation_pages(db, search.strategy, seed_label_ids, options, after, skipped_hubs)) as pages:
+        async for depth, documents in pages:
+            for document in documents:
+                if search.limit is not None and len(related_docs) == search.limit:
+                    next_position = position
+                    break
+                related_docs.append(service_label.document_item(document))
+                position = (depth, document.id)
+            if next_position is not None:
+                break
+
     return service_label.generate_relations_json(
-        documents=document_obj.document,
-        initial_labels=labels,
-        by_type=search.by_type
+        related_docs=related_docs,
+        initial_labels=initial_labels,
+        by_type=search.by_type,
+        skipped_hubs=[{"key": key, "value": value} for key, value in sorted(skipped_hubs)],
+        next_cursor=service_label.encode_cursor(fingerprint, next_position) if next_position is not None else None
+    )
+
+
+async def _relation_pages(
+    db: AsyncSession,
+    strategy: str,
+    seed_label_ids: List[uuid.UUID],
+    options: service_label.TraversalOptions,
+    after: Optional[service_label.Position],
+    skipped_hubs: Set[Tuple[str, str]]
+) -> AsyncIterator[Tuple[int, list]]:
+    """
+    Related documents as ``(depth, documents)`` pages, nearest first and by id
+    within a hop, loaded a page at a time so a caller that stops early does not
+    pay for the rest. Hub labels not followed are added to ``skipped_hubs``.
+    """
+    if strategy == "database":
+        skipped_hubs.update((label.key, label.value) for label in await repository_document.relation_hubs(db, seed_label_ids, options))
+        page, page_depth = [], None
+        async for document, depth in repository_document.stream_relations(db, seed_label_ids, options, SEARCH_PAGE_SIZE, after):
+            if page and (depth != page_depth or len(page) >= SEARCH_PAGE_SIZE):
+                yield page_depth, page
+                page = []
+            page.append(document)
+            page_depth = depth
+        if page:
+            yield page_depth, page
+        return
+
+    index = await service_components.components.get(db)
+    hub_ids = set()
+    for depth, related_ids in service_label.traverse(index, seed_label_ids, options, hub_ids):
+        skipped_hubs.update(index.labels[label_id] for label_id in hub_ids)
+        related_ids = service_label.after_position(depth, related_ids, after)
+        for start in range(0, len(related_ids), SEARCH_PAGE_SIZE):
+            chunk = related_ids[start:start + SEARCH_PAGE_SIZE]
+            documents = {document.id: document for document in await repository_document.list_by_ids(db, chunk)}
+            yield depth, [documents[document_id] for document_id in chunk if document_id in documents]
+    skipped_hubs.update(index.labels[label_id] for label_id in hub_ids)
+
+
+async def _stream_relations(bind, search, seed_label_ids, options, after, fingerprint, initial_labels) -> AsyncIterator[str]:
+    """
+    NDJSON body: one line per document with its depth, written hop by hop as
+    pages load, then a last line with the metadata. Uses its own session, since
+    the request's one is closed once the response starts.
+    """
+    total, document_types, skipped_hubs = 0, {}, set()
+    position = next_position = None
+    async with AsyncSession(bind) as db:
+        async with aclosing(_relation_pages(db, search.strategy, seed_label_ids, options, after, skipped_hubs)) as pages:
+            async for depth, documents in pages:
+                lines = []
+                for document in documents:
+                    if search.limit is not None and total == search.limit:
+                        next_position = position
+                        break
+                    item = service_label.document_item(document)
+                    lines.append(json.dumps(dict(item, depth=depth), default=str))
+                    document_types[item["type"]] = None
+                    position = (depth, document.id)
+                    total += 1
+                if lines:
+                    yield "\n".join(lines) + "\n"
+                if next_position is not None:
+                    break
+
+    metadata = service_label.relations_metadata(
+        initial_labels,
+        total,
+        [{"key": key, "value": value} for key, value in sorted(skipped_hubs)],
+        service_label.encode_cursor(fingerprint, next_position) if next_position is not None else None
     )
+    metadata["document_types"] = list(document_types)
+    yield json.dumps({"metadata": metadata}) + "\n"
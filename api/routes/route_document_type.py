@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import api.schemas.schema_document_type as schema_document_type
 import repository.repository_document_type as repository_document_type
-from factory.factory_database import get_async_db
+from factory.factory_database import get_async_db, get_read_db
 from api.schemas.schema_paginator import PaginatedResponse
 from services import service_auth
 
@@ -28,7 +28,7 @@ router = APIRouter(
     response_description="Paginated response containing document types and collection metadata"
 )
 async def list_all(
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_read_db),
     skip: Optional[int] = Query(
         0,
         alias="offset",
@@ -0,0 +1,152 @@
+from fastapi import APIRouter, Depends, Query, status, HTTPException, Cookie
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import uuid
+import repository.repository_document as repository_document
+from factory.factory_database import get_read_db
+from api.schemas import schema_graph
+from services import service_auth, service_graph, service_label
+
+
+router = APIRouter(
+    prefix="/graph",
+    tags=["Graph"],
+    responses={
+        400: {"description": "Bad request"},
+        500: {"description": "Internal server error"}
+    }
+)
+
+
+def traversal_options(
+    max_depth: int = Query(10, ge=0, le=50, description="Most hops to follow"),
+    allow_keys: Optional[List[str]] = Query(None, description="Only follow labels with these keys"),
+    deny_keys: List[str] = Query([], description="Never follow labels with these keys"),
+    skip_hubs: bool = Query(True, description="Do not follow hub labels, carried by more than hub_ratio of all documents"),
+    hub_ratio: float = Query(0.05, gt=0, le=1)
+) -> service_label.TraversalOptions:
+    return service_label.TraversalOptions(
+        allow_keys=frozenset(allow_keys) if allow_keys is not None else None,
+        deny_keys=frozenset(deny_keys),
+        skip_hubs=skip_hubs,
+        hub_ratio=hub_ratio,
+        max_depth=max_depth
+    )
+
+
+@router.get(
+    "/path",
+    response_model=schema_graph.GraphPath,
+    summary="Shortest path between two documents",
+    description="""
+    Returns the fewest-hop chain of documents linking `source` to `target`, each step with the label it shares with
+    the previous one (`via`). Runs a bidirectional breadth-first search over an in-memory adjacency of `document_label`.
+
+    Hub labels are not followed by default (`skip_hubs`), so the path shows how documents are actually related
+    rather than that they share e.g. `port=5432`.
+""",
+    response_description="Documents along the path, source first",
+    responses={
+        404: {
+            "description": "A document does not exist, or no path within max_depth",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "No path found"}
+                }
+            }
+        }
+    }
+)
+async def shortest_path(
+    source: uuid.UUID,
+    target: uuid.UUID,
+    options: service_label.TraversalOptions = Depends(traversal_options),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    graph = await service_graph.graph.get(db)
+    source_index, target_index = graph.index_of(source), graph.index_of(target)
+    if source_index is None or target_index is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    path = graph.shortest_path(source_index, target_index, options)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No path found")
+
+    document_ids = [graph.document_id(document) for document, _ in path]
+    documents = {document.id: document for document in await repository_document.list_by_ids(db, document_ids)}
+    if len(documents) != len(document_ids):
+        raise HTTPException(status_code=404, detail="No path found")
+    return {
+        "length": len(path) - 1,
+        "steps": [
+            {
+                "document": documents[graph.document_id(document)],
+                "via": dict(zip(("key", "value"), graph.label_pair(label))) if label != -1 else None
+            }
+            for document, label in path
+        ]
+    }
+
+
+@router.get(
+    "/neighbourhood/{document_id}",
+    response_model=schema_graph.Neighbourhood,
+    summary="Documents within k hops of a document",
+    description="Counts the documents first reached at each hop up to `k` away from the document, and the labels "
+                "followed to reach them. With `document_ids` the ids of every hop are listed too.",
+    response_description="Per-hop document and label counts",
+    responses={
+        404: {
+            "description": "Document not found on database",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Document not found"}
+                }
+            }
+        }
+    }
+)
+async def neighbourhood(
+    document_id: uuid.UUID,
+    k: int = Query(2, ge=0, le=10, description="Hops to expand"),
+    document_ids: bool = Query(False, description="List the ids of the documents of every hop"),
+    options: service_label.TraversalOptions = Depends(traversal_options),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    graph = await service_graph.graph.get(db)
+    source = graph.index_of(document_id)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    skipped_hubs = set()
+    hops = graph.neighbourhood(source, k, options, skipped_hubs)
+    return {
+        "document_id": document_id,
+        "total_documents": sum(len(documents) for documents, _ in hops),
+        "hops": [
+            {
+                "depth": depth,
+                "documents": len(documents),
+                "labels": labels,
+                "document_ids": [graph.document_id(document) for document in documents] if document_ids else None
+            }
+            for depth, (documents, labels) in enumerate(hops)
+        ],
+        "skipped_hubs": [dict(zip(("key", "value"), pair)) for pair in sorted(graph.label_pair(label) for label in skipped_hubs)]
+    }
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Cookie, status
+from fastapi import APIRouter, Depends, HTTPException, Cookie, Query, status
 from pydantic import UUID4
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from database import get_async_db
+from database import get_async_db, get_read_db
 import api.schemas.schema_label as schema_label
 import repository.repository_label as repository_label
-from services import service_auth
+from api.schemas.schema_paginator import PaginatedResponse
+from services import service_auth, service_components
 
 
 router = APIRouter(
@@ -26,7 +27,7 @@ router = APIRouter(
     response_description="A list of label objects"
 )
 async def list_all(
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_read_db),
     access_token: str | None = Cookie(default=None)
     ):
     """
@@ -45,6 +46,51 @@ async def list_all(
     return await repository_label.list_all(db)
 
 
+@router.get(
+    "/degrees",
+    response_model=PaginatedResponse[schema_label.LabelDegree],
+    summary="List labels by degree",
+    description="Labels ordered by the number of documents carrying them, with whether relation searches treat them as hubs "
+                "(carried by more than `hub_ratio` of all documents).",
+    response_description="Paginated labels with their degree"
+)
+async def list_degrees(
+    skip: int = Query(0, alias="offset", ge=0, description="Number of labels to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of labels to return (up to 1000)"),
+    hub_ratio: float = Query(0.05, gt=0, le=1),
+    db: AsyncSession = Depends(get_read_db),
+    access_token: str | None = Cookie(default=None)
+):
+    user = await service_auth.get_user_by_token(db, access_token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User Not Found or Inactive"
+        )
+
+    index = await service_components.components.get(db)
+    hub_degree = index.hub_degree(hub_ratio)
+    degrees = sorted(
+        ((len(documents), label_id) for label_id, documents in index.label_documents.items()),
+        key=lambda item: (-item[0], index.labels[item[1]])
+    )
+    return {
+        "items": [
+            {
+                "id": label_id,
+                "key": index.labels[label_id][0],
+                "value": index.labels[label_id][1],
+                "degree": degree,
+                "hub": degree > hub_degree
+            }
+            for degree, label_id in degrees[skip:skip + limit]
+        ],
+        "total": len(degrees),
+        "skip": skip,
+        "limit": limit
+    }
+
+
 @router.post(
     "/",
     response_model=List[schema_label.Label],
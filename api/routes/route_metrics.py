@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services import service_metrics
+
+
+router = APIRouter(
+    tags=["Observability"],
+)
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Prometheus metrics",
+    description="Request, database, connection pool and cache metrics in the Prometheus text exposition format.",
+    response_description="Metrics in text format version 0.0.4"
+)
+async def metrics():
+    return PlainTextResponse(
+        service_metrics.registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
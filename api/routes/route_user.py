@@ -1,8 +1,9 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status, Cookie
 from fastapi.responses import JSONResponse
 from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_async_db
+from database import get_async_db, get_read_db
 from models import model_user
 from api.schemas import schema_user
 from repository import repository_user
@@ -127,7 +128,7 @@ async def register(
 )
 async def login(
     user_credentials: schema_user.LoginRequest,
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Authenticate user and generate access token.
@@ -163,7 +164,7 @@ async def login(
         )
         
 
-    if not security.verify_password(user_credentials.password, user.password):
+    if not await asyncio.to_thread(security.verify_password, user_credentials.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid Credentials"
@@ -196,7 +197,7 @@ async def login(
     response_description="User object",
 )
 async def get_current_user(
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_read_db),
     access_token: str | None = Cookie(default=None)
 ):
     return await service_auth.get_user_by_token(db, access_token)
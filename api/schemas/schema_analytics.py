@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+from api.schemas.schema_label import LabelBase
+
+
+class Facet(LabelBase):
+    count: int
+
+
+class FacetResponse(BaseModel):
+    total_documents: int
+    generated_at: datetime
+    facets: List[Facet]
+
+
+class Group(BaseModel):
+    values: List[str]
+    count: int
+
+
+class GroupByResponse(BaseModel):
+    total_documents: int
+    generated_at: datetime
+    dimensions: List[str]
+    groups: List[Group]
+
+
+class CoOccurrence(LabelBase):
+    count: int
+    ratio: float
+
+
+class CoOccurrenceResponse(BaseModel):
+    key: str
+    value: Optional[str] = None
+    total_documents: int
+    generated_at: datetime
+    labels: List[CoOccurrence]
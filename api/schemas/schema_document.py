@@ -17,6 +17,7 @@ class Document(DocumentBase):
     hash: str
     type: DocumentType
     labels: List[Label]
+    labels_fingerprint: Optional[str] = None
     created_by: str
     document: dict
     created_at: datetime
@@ -31,3 +32,14 @@ class DocumentCreate(DocumentBase):
     labels: List[LabelBase]
     class ConfigDict:
         model_config = ConfigDict(from_attributes=True)
+
+
+class LabelSet(BaseModel):
+    labels_fingerprint: str
+    labels_string: Optional[str] = None
+    total: int
+
+
+class SimilarDocument(BaseModel):
+    similarity: float
+    document: Document
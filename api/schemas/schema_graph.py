@@ -0,0 +1,28 @@
+from pydantic import BaseModel, UUID4
+from typing import List, Optional
+from api.schemas.schema_document import Document
+from api.schemas.schema_label import LabelBase
+
+
+class PathStep(BaseModel):
+    document: Document
+    via: Optional[LabelBase] = None
+
+
+class GraphPath(BaseModel):
+    length: int
+    steps: List[PathStep]
+
+
+class Hop(BaseModel):
+    depth: int
+    documents: int
+    labels: int
+    document_ids: Optional[List[UUID4]] = None
+
+
+class Neighbourhood(BaseModel):
+    document_id: UUID4
+    total_documents: int
+    hops: List[Hop]
+    skipped_hubs: List[LabelBase] = []
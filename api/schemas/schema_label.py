@@ -19,3 +19,9 @@ class Label(LabelBase):
 
     class ConfigDict:
         model_config = ConfigDict(from_attributes=True)
+
+
+class LabelDegree(LabelBase):
+    id: UUID4
+    degree: int
+    hub: bool
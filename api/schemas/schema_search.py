@@ -1,12 +1,25 @@
-from pydantic import BaseModel
-from typing import List, Dict, Union
+from pydantic import BaseModel, Field, UUID4
+from typing import List, Dict, Union, Optional, Literal
 from datetime import datetime
 from api.schemas.schema_label import LabelBase
 
 
 class DocumentSearch(BaseModel):
-    document_uuid: str
+    document_uuid: UUID4
     labels: List[LabelBase]
+    by_type: bool = False
+    max_depth: int = Field(10, ge=0, le=50, description="Hops followed from the documents carrying every label")
+    allow_keys: Optional[List[str]] = Field(None, description="Only follow labels with these keys")
+    deny_keys: List[str] = Field(default_factory=list, description="Never follow labels with these keys")
+    max_fanout: Optional[int] = Field(None, ge=1, description="Follow at most this many documents through any one label")
+    skip_hubs: bool = Field(True, description="Do not follow hub labels, carried by more than hub_ratio of all documents")
+    hub_ratio: float = Field(0.05, gt=0, le=1)
+    strategy: Literal["memory", "database"] = Field(
+        "memory",
+        description="Walk the in-memory label graph index, or a recursive query inside the database for inventories larger than worker memory"
+    )
+    limit: Optional[int] = Field(None, ge=1, le=10000, description="Return at most this many documents, nearest first")
+    cursor: Optional[str] = Field(None, description="metadata.next_cursor of the previous page of the same search")
 
     
 class Label(BaseModel):
@@ -17,7 +30,9 @@ class Label(BaseModel):
 class DocumentMetadata(BaseModel):
     initial_labels: List[Label]
     total_documents: int
-    document_types: List[str]
+    document_types: List[str] = []
+    skipped_hubs: List[Label] = []
+    next_cursor: Optional[str] = None
     timestamp: datetime
 
 
@@ -32,7 +47,7 @@ class DocumentItem(BaseModel):
     type: str
     created_by: str
     labels: List[Label]
-    document: RawDocument
+    document: dict
 
 
 class DocumentSearchResponseFlat(BaseModel):
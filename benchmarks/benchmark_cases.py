@@ -0,0 +1,111 @@
+from typing import Awaitable, Callable, Iterator, Tuple
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+import models.model_document as model_document
+import models.model_user as model_user
+from api.schemas import schema_document, schema_document_type, schema_label
+from factory import factory_documents
+from repository import repository_document, repository_document_type, repository_label, repository_user
+from services import service_auth
+from utils import security
+
+Case = Tuple[str, Callable[[], Awaitable]]
+
+PASSWORD = "Bench@password1"
+
+
+class Context:
+    """Identifiers picked from the seeded database that the cases look up."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.next_environment = total // factory_documents.DOCUMENTS_PER_ENVIRONMENT + 1
+        self.created: list = []
+
+    async def load(self, db: AsyncSession):
+        document = await db.scalar(
+            select(model_document.Document).where(model_document.Document.hash == factory_documents.generate_environment(0)[8]["hash"])
+        )
+        self.document_id = document.id
+        self.fingerprint = document.labels_fingerprint
+        self.user = model_user.User(
+            username="bench", email="bench@example.com", password=security.hash_password(PASSWORD), active=True
+        )
+        db.add(self.user)
+        await db.commit()
+        self.token = service_auth.create_access_token(user_uuid=str(self.user.uuid))["access_token"]
+
+    def new_documents(self, total: int = 10) -> list:
+        documents = []
+        while len(documents) < total:
+            documents += factory_documents.generate_environment(self.next_environment)
+            self.next_environment += 1
+        return documents[:total]
+
+
+def repository_cases(session: Callable, context: Context) -> Iterator[Case]:
+    async def with_session(function, *args, **kwargs):
+        async with session() as db:
+            return await function(db, *args, **kwargs)
+
+    async def ingest():
+        documents = [schema_document.DocumentCreate(**document) for document in context.new_documents()]
+        await with_session(repository_document.create_or_update_documents, documents)
+        context.created += [document.hash for document in documents]
+
+    async def delete():
+        async with session() as db:
+            hashes = context.created[-10:]
+            del context.created[-10:]
+            result = await db.execute(select(model_document.Document.id).where(model_document.Document.hash.in_(hashes)))
+            await repository_document.delete_by_uuids(db, [row[0] for row in result.all()])
+
+    yield "repository_document.list_all", lambda: with_session(repository_document.list_all)
+    yield "repository_document.get_document_by_uuid", lambda: with_session(repository_document.get_document_by_uuid, context.document_id)
+    yield "repository_document.list_by_selector[port=5432]", lambda: with_session(repository_document.list_by_selector, "port=5432")
+    yield "repository_document.list_by_selector[app-dev]", lambda: with_session(
+        repository_document.list_by_selector, "domain=app-dev.example.com,database in (database-dev.example.com),!port"
+    )
+    yield "repository_document.list_by_labels_fingerprint", lambda: with_session(repository_document.list_by_labels_fingerprint, context.fingerprint)
+    yield "repository_document.list_label_sets", lambda: with_session(repository_document.list_label_sets)
+    yield "repository_document.create_or_update_documents[10]", ingest
+    yield "repository_document.delete_by_uuids[10]", delete
+    yield "repository_label.list_all", lambda: with_session(repository_label.list_all)
+    yield "repository_label.get_or_create", lambda: with_session(repository_label.get_or_create, [schema_label.LabelCreate(key="port", value="5432")])
+    yield "repository_document_type.list_all", lambda: with_session(repository_document_type.list_all)
+    yield "repository_document_type.get_or_create", lambda: with_session(
+        repository_document_type.get_or_create, [schema_document_type.DocumentTypeCreate(name="dns")]
+    )
+    yield "repository_user.get_user", lambda: with_session(repository_user.get_user, context.user.uuid)
+    yield "service_auth.get_user_by_token", lambda: with_session(service_auth.get_user_by_token, context.token)
+
+
+def route_cases(client: AsyncClient, context: Context) -> Iterator[Case]:
+    client.cookies.set("access_token", context.token)
+
+    async def request(method, url, **kwargs):
+        response = await client.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError("{} {} returned {}: {}".format(method, url, response.status_code, response.text[:200]))
+        return response
+
+    async def ingest():
+        documents = context.new_documents()
+        await request("POST", "/documents/", json=documents)
+        context.created += [document["hash"] for document in documents]
+
+    yield "GET /documents/", lambda: request("GET", "/documents/")
+    yield "GET /documents/select", lambda: request("GET", "/documents/select", params={"selector": "port=5432"})
+    yield "GET /documents/{document_id}/related", lambda: request("GET", "/documents/{}/related".format(context.document_id))
+    yield "POST /documents/search", lambda: request("POST", "/documents/search", json={
+        "document_uuid": str(context.document_id), "labels": []
+    })
+    yield "GET /documents/label-sets", lambda: request("GET", "/documents/label-sets")
+    yield "POST /documents/[10]", ingest
+    yield "GET /labels/", lambda: request("GET", "/labels/")
+    yield "GET /document-types/", lambda: request("GET", "/document-types/")
+    yield "GET /user/profile", lambda: request("GET", "/user/profile")
+    yield "POST /user/login", lambda: request("POST", "/user/login", json={
+        "email": "bench@example.com", "password": PASSWORD, "remember": False
+    })
@@ -0,0 +1,261 @@
+"""
+Drive mixed concurrent traffic through the application and report throughput,
+error rates and HDR latency histograms per operation.
+
+    PYTHONPATH=. python -m benchmarks.load --documents 10000 --concurrency 32 --duration 30
+    PYTHONPATH=. python -m benchmarks.load --target uvicorn --mix select=8,ingest=1,login=1 --rate 200
+
+``--target asgi`` (default) runs the app in this process through httpx's ASGI
+transport, so client and server share one event loop. ``--target uvicorn``
+starts ``uvicorn main:app`` on a free local port in a scratch directory and
+drives it over HTTP. Without ``--rate`` every worker issues its next request as
+soon as the previous one finished (closed loop); with ``--rate`` requests are
+scheduled at a fixed total rate and latency is measured from the scheduled
+start, so a stalled server is not hidden by coordinated omission.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks import scratch
+from database import Base, get_async_db, get_read_db
+from main import app
+from factory import factory_documents
+from benchmarks import benchmark_cases
+from services import service_log
+from utils.histogram import Histogram
+
+DEFAULT_MIX = "select=6,label_sets=2,list_documents=1,list_labels=1,profile=4,ingest=1,login=1"
+
+
+def operations(client: AsyncClient, context: benchmark_cases.Context) -> Dict[str, Callable[[], Awaitable]]:
+    environments = max(1, context.total // factory_documents.DOCUMENTS_PER_ENVIRONMENT)
+
+    def select():
+        environment = factory_documents.environment_name(random.randrange(environments))
+        return client.get("/documents/select", params={
+            "selector": "domain=app-{}.example.com,database".format(environment)
+        })
+
+    def ingest():
+        return client.post("/documents/", json=context.new_documents(factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+
+    return {
+        "select": select,
+        "label_sets": lambda: client.get("/documents/label-sets", params={"limit": 20}),
+        "list_documents": lambda: client.get("/documents/"),
+        "list_labels": lambda: client.get("/labels/"),
+        "profile": lambda: client.get("/user/profile"),
+        "ingest": ingest,
+        "login": lambda: client.post("/user/login", json={
+            "email": "bench@example.com", "password": benchmark_cases.PASSWORD, "remember": False
+        }),
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+class Recorder:
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.statuses: Dict[str, Counter] = {}
+
+    def record(self, name: str, microseconds: int, status: str) -> None:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+            self.statuses[name] = Counter()
+        self.histograms[name].record(microseconds)
+        self.statuses[name][status] += 1
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        total = Histogram()
+        for name, histogram in sorted(self.histograms.items()):
+            errors = sum(count for status, count in self.statuses[name].items() if not status.startswith(("2", "3")))
+            routes[name] = {
+                "throughput": histogram.total / elapsed,
+                "error_rate": errors / histogram.total,
+                "statuses": dict(self.statuses[name]),
+                "latency_us": histogram.to_dict(),
+            }
+            total.merge(histogram)
+        return {"elapsed": elapsed, "throughput": total.total / elapsed, "routes": routes, "latency_us": total.to_dict()}
+
+
+async def worker(calls, names, weights, recorder, deadline, interval):
+    scheduled = time.perf_counter()
+    while True:
+        if interval:
+            scheduled += interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            start = scheduled
+        else:
+            start = time.perf_counter()
+        if start >= deadline:
+            return
+        name = random.choices(names, weights)[0]
+        try:
+            response = await calls[name]()
+            status = str(response.status_code)
+        except Exception as error:
+            status = type(error).__name__
+        recorder.record(name, int((time.perf_counter() - start) * 1_000_000), status)
+
+
+async def drive(client: AsyncClient, context: benchmark_cases.Context, arguments) -> dict:
+    client.cookies.set("access_token", context.token)
+    calls = operations(client, context)
+    weights = parse_mix(arguments.mix)
+    unknown = set(weights) - set(calls)
+    if unknown:
+        raise SystemExit("Unknown operations in --mix: {} (known: {})".format(", ".join(sorted(unknown)), ", ".join(calls)))
+
+    names = list(weights)
+    recorder = Recorder()
+    interval = arguments.concurrency / arguments.rate if arguments.rate else 0
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        worker(calls, names, [weights[name] for name in names], recorder, start + arguments.duration, interval)
+        for _ in range(arguments.concurrency)
+    ))
+    return recorder.report(time.perf_counter() - start)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+async def run(arguments) -> dict:
+    directory = scratch.DIRECTORY
+    engine = create_async_engine("sqlite+aiosqlite:///{}".format(scratch.DATABASE_FILE))
+    session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False, autocommit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session() as db:
+        await factory_documents.seed_database(db, list(factory_documents.generate_documents(arguments.documents)))
+    context = benchmark_cases.Context(arguments.documents)
+    async with session() as db:
+        await context.load(db)
+
+    limits = {"timeout": arguments.timeout}
+    if arguments.target == "asgi":
+        async def get_load_db():
+            async with session() as db:
+                try:
+                    yield db
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+
+        app.dependency_overrides[get_async_db] = app.dependency_overrides[get_read_db] = get_load_db
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://load", **limits) as client:
+                report = await drive(client, context, arguments)
+        finally:
+            app.dependency_overrides.pop(get_async_db, None)
+            app.dependency_overrides.pop(get_read_db, None)
+    else:
+        port = free_port()
+        environment = dict(os.environ, PYTHONPATH=os.getcwd())
+        server_log = open(os.path.join(directory, "uvicorn.log"), "w")
+        print("uvicorn output: {}".format(server_log.name), file=sys.stderr)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(arguments.workers), "--log-level", "warning", "--app-dir", os.getcwd()],
+            cwd=directory, env=environment, stdout=server_log, stderr=subprocess.STDOUT
+        )
+        try:
+            async with AsyncClient(base_url="http://127.0.0.1:{}".format(port), **limits) as client:
+                for _ in range(100):
+                    try:
+                        await client.get("/openapi.json")
+                        break
+                    except Exception:
+                        await asyncio.sleep(0.1)
+                report = await drive(client, context, arguments)
+        finally:
+            server.terminate()
+            server.wait()
+            server_log.close()
+    await engine.dispose()
+
+    report["meta"] = {
+        "target": arguments.target,
+        "documents": arguments.documents,
+        "concurrency": arguments.concurrency,
+        "rate": arguments.rate,
+        "mix": parse_mix(arguments.mix),
+    }
+    return report
+
+
+def print_report(report: dict) -> None:
+    print("{:<16} {:>8} {:>9} {:>7} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "operation", "count", "req/s", "errors", "p50 ms", "p90 ms", "p99 ms", "p99.9 ms", "max ms"
+    ))
+    rows = list(report["routes"].items()) + [("TOTAL", {
+        "throughput": report["throughput"],
+        "error_rate": sum(route["error_rate"] * route["latency_us"]["count"] for route in report["routes"].values())
+        / max(1, report["latency_us"]["count"]),
+        "latency_us": report["latency_us"],
+    })]
+    for name, route in rows:
+        latency = route["latency_us"]
+        print("{:<16} {:>8} {:>9.1f} {:>6.1%} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}".format(
+            name, latency["count"], route["throughput"], route["error_rate"],
+            latency["percentiles"]["p50"] / 1000, latency["percentiles"]["p90"] / 1000,
+            latency["percentiles"]["p99"] / 1000, latency["percentiles"]["p99.9"] / 1000, latency["max"] / 1000
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (--target uvicorn)")
+    parser.add_argument("--documents", type=int, default=1000, help="Size of the generated inventory")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Comma separated operation=weight pairs")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of traffic")
+    parser.add_argument("--rate", type=float, help="Total requests per second (open loop); closed loop when omitted")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the request mix")
+    parser.add_argument("--output", help="Write the report, histogram buckets included, as JSON to this file")
+    arguments = parser.parse_args(argv)
+    service_log.configure(level=os.getenv("LOG_LEVEL", "WARNING"))
+
+    if arguments.documents < factory_documents.DOCUMENTS_PER_ENVIRONMENT:
+        parser.error("--documents must be at least {}".format(factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+    random.seed(arguments.seed)
+
+    report = asyncio.run(run(arguments))
+    print_report(report)
+
+    if arguments.output:
+        os.makedirs(os.path.dirname(arguments.output) or ".", exist_ok=True)
+        with open(arguments.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark every repository function and route in-process against a generated
+inventory.
+
+    PYTHONPATH=. python -m benchmarks.run --documents 100000 --output benchmarks/results/current.json
+    PYTHONPATH=. python -m benchmarks.run --documents 1000 --compare benchmarks/baselines/1000.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks import scratch
+from database import Base, get_async_db, get_read_db
+from main import app
+from factory import factory_documents
+from benchmarks import benchmark_cases
+from services import service_log
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "samples": len(samples),
+        "ops_per_sec": len(samples) / sum(samples),
+        "mean_ms": 1000 * sum(samples) / len(samples),
+        "p50_ms": 1000 * percentile(samples, 0.50),
+        "p99_ms": 1000 * percentile(samples, 0.99),
+        "max_ms": 1000 * max(samples),
+    }
+
+
+async def measure(call: Callable[[], Awaitable], repeat: int, budget: float, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        await call()
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < repeat and (not samples or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(arguments) -> dict:
+    engine = create_async_engine("sqlite+aiosqlite:///{}".format(scratch.DATABASE_FILE))
+    session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False, autocommit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    start = time.perf_counter()
+    async with session() as db:
+        await factory_documents.seed_database(db, list(factory_documents.generate_documents(arguments.documents)))
+    seed_seconds = time.perf_counter() - start
+    print("Seeded {} documents in {:.2f}s".format(arguments.documents, seed_seconds), file=sys.stderr)
+
+    context = benchmark_cases.Context(arguments.documents)
+    async with session() as db:
+        await context.load(db)
+
+    results = {}
+
+    def selected(name: str) -> bool:
+        return not arguments.filter or any(pattern in name for pattern in arguments.filter)
+
+    for name, call in benchmark_cases.repository_cases(session, context):
+        if selected(name):
+            results[name] = await measure(call, arguments.repeat, arguments.budget)
+            print(format_row(name, results[name]), file=sys.stderr)
+
+    async def get_bench_db():
+        async with session() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = app.dependency_overrides[get_read_db] = get_bench_db
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            for name, call in benchmark_cases.route_cases(client, context):
+                if selected(name):
+                    results[name] = await measure(call, arguments.repeat, arguments.budget)
+                    print(format_row(name, results[name]), file=sys.stderr)
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+        app.dependency_overrides.pop(get_read_db, None)
+
+    await engine.dispose()
+
+    return {
+        "meta": {
+            "documents": arguments.documents,
+            "seed_seconds": seed_seconds,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+
+
+def format_row(name: str, result: dict) -> str:
+    return "{:<58} {:>6} {:>10.1f}/s p50 {:>9.3f}ms p99 {:>9.3f}ms".format(
+        name, result["samples"], result["ops_per_sec"], result["p50_ms"], result["p99_ms"]
+    )
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """Print the p50/p99 ratio of every case against ``baseline`` and return the regressed ones."""
+    regressions = []
+    print("\n{:<58} {:>10} {:>10}".format("case (vs {})".format(baseline["meta"]["revision"]), "p50", "p99"))
+    for name, result in report["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        p50 = result["p50_ms"] / previous["p50_ms"]
+        p99 = result["p99_ms"] / previous["p99_ms"]
+        flag = ""
+        if p50 > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("{:<58} {:>9.2f}x {:>9.2f}x{}".format(name, p50, p99, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1000, help="Size of the generated inventory")
+    parser.add_argument("--repeat", type=int, default=50, help="Measured iterations per case")
+    parser.add_argument("--budget", type=float, default=10.0, help="Maximum seconds spent measuring a case")
+    parser.add_argument("--filter", action="append", help="Only run cases whose name contains this text")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 ratio over the baseline that counts as a regression")
+    arguments = parser.parse_args(argv)
+    service_log.configure(level=os.getenv("LOG_LEVEL", "WARNING"))
+
+    if arguments.documents < factory_documents.DOCUMENTS_PER_ENVIRONMENT:
+        parser.error("--documents must be at least {}".format(factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+
+    report = asyncio.run(run(arguments))
+
+    if arguments.output:
+        os.makedirs(os.path.dirname(arguments.output) or ".", exist_ok=True)
+        with open(arguments.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), arguments.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
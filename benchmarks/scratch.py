@@ -0,0 +1,10 @@
+"""
+Imported by the benchmarks before the app: points ``DATABASE_FILE`` at a new
+scratch directory, so the database the app binds to and the generations and
+events files its workers share beside it never touch the working tree.
+"""
+import os
+import tempfile
+
+DIRECTORY = tempfile.mkdtemp(prefix="athross-bench-")
+DATABASE_FILE = os.environ["DATABASE_FILE"] = os.path.join(DIRECTORY, "app.db")
@@ -0,0 +1,143 @@
+"""
+Measure how long a fresh server process takes to become useful: importing
+``main``, and starting ``uvicorn main:app`` until its first request is
+answered. Every run is a new interpreter in a scratch directory, so nothing
+is warm but the operating system's file cache.
+
+    PYTHONPATH=. python -m benchmarks.startup --repeat 10 --output benchmarks/results/startup.json
+    PYTHONPATH=. python -m benchmarks.startup --compare benchmarks/baselines/startup.json
+
+``first_request`` is the time from spawning the server to the first answered
+``/openapi.json``; ``openapi`` and ``docs`` time the first request to each
+once the server is up, which is where lazily built state shows.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+import httpx
+from benchmarks.load import free_port
+from benchmarks.run import git_revision
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "samples": len(samples),
+        "median_ms": 1000 * statistics.median(samples),
+        "min_ms": 1000 * min(samples),
+        "max_ms": 1000 * max(samples),
+    }
+
+
+def measure_import(directory: str, environment: Dict[str, str]) -> float:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT], cwd=directory, env=environment)
+    return float(output)
+
+
+def measure_server(directory: str, environment: Dict[str, str], timeout: float) -> Dict[str, float]:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--app-dir", os.getcwd()],
+        cwd=directory, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url="http://127.0.0.1:{}".format(port), timeout=timeout) as client:
+            deadline = start + timeout
+            while True:
+                try:
+                    first = client.get("/openapi.json")
+                    break
+                except httpx.TransportError:
+                    if time.perf_counter() > deadline or server.poll() is not None:
+                        raise RuntimeError("uvicorn did not answer within {}s".format(timeout))
+                    time.sleep(0.005)
+            first.raise_for_status()
+            timings = {"first_request": time.perf_counter() - start, "openapi": first.elapsed.total_seconds()}
+            timings["docs"] = client.get("/docs").elapsed.total_seconds()
+            return timings
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(arguments) -> dict:
+    samples: Dict[str, List[float]] = {"import": [], "first_request": [], "openapi": [], "docs": []}
+    for attempt in range(arguments.repeat):
+        # A new database every run, so schema creation is part of what is measured.
+        with tempfile.TemporaryDirectory(prefix="athross-startup-") as directory:
+            environment = dict(os.environ, PYTHONPATH=os.getcwd(), DATABASE_FILE=os.path.join(directory, "app.db"))
+            samples["import"].append(measure_import(directory, environment))
+            for name, seconds in measure_server(directory, environment, arguments.timeout).items():
+                samples[name].append(seconds)
+        print("run {}: import {:.3f}s, first request {:.3f}s".format(
+            attempt + 1, samples["import"][-1], samples["first_request"][-1]
+        ), file=sys.stderr)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": {name: summarize(values) for name, values in samples.items()},
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """Print the median ratio of every measurement against ``baseline`` and return the regressed ones."""
+    regressions = []
+    print("\n{:<16} {:>10}".format("vs {}".format(baseline["meta"]["revision"]), "median"))
+    for name, result in report["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        ratio = result["median_ms"] / previous["median_ms"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("{:<16} {:>9.2f}x{}".format(name, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes started per measurement")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the server to answer")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Median ratio over the baseline that counts as a regression")
+    arguments = parser.parse_args(argv)
+
+    report = run(arguments)
+    for name, result in report["results"].items():
+        print("{:<16} median {:>9.1f}ms  min {:>9.1f}ms  max {:>9.1f}ms".format(
+            name, result["median_ms"], result["min_ms"], result["max_ms"]
+        ))
+
+    if arguments.output:
+        os.makedirs(os.path.dirname(arguments.output) or ".", exist_ok=True)
+        with open(arguments.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), arguments.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 #!/bin/bash
 
-# Run the FastAPI server
-uvicorn main:app --host 0.0.0.0 --port 8080
-
-exit 0
\ No newline at end of file
+# Run the FastAPI server: one worker per CPU (WEB_CONCURRENCY overrides it).
+# exec so the launcher gets SIGTERM (graceful stop) and SIGHUP (rolling reload).
+exec python3 serve.py --host 0.0.0.0 --port 8080
@@ -1,16 +1,65 @@
-from sqlalchemy import create_engine
+import os
+import time
+from typing import Optional
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from services import service_metrics, service_sql_accounting, service_tracing
 
 
-DATABASE_URL = "sqlite:///./app.db"
-ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./app.db"
+# The SQLite file every worker opens; the files workers share beside it are named after it.
+DATABASE_FILE = os.getenv("DATABASE_FILE", "./app.db")
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///{}".format(DATABASE_FILE)
 
+def read_only_url(path: str) -> str:
+    """URL opening ``path`` read-only: SQLite itself rejects any write made through it."""
+    # Absolute like the write engine's path, which SQLAlchemy resolves once; a URI filename would follow the cwd.
+    return "sqlite+aiosqlite:///file:{}?mode=ro&uri=true".format(os.path.abspath(path))
+
+READ_DATABASE_URL = read_only_url(DATABASE_FILE)
+
+def database_file(engine) -> Optional[str]:
+    """Absolute path of the file ``engine`` opens, the same for a database's write and read engines; None if in memory."""
+    name = engine.url.database or ""
+    if name in ("", ":memory:") or "mode=memory" in str(engine.url):
+        return None
+    return os.path.abspath(name.removeprefix("file:"))
+
+def shared_file(engine, suffix: str) -> Optional[str]:
+    """A file beside ``engine``'s database for every process using it, like SQLite's own -wal and -shm; None if in memory."""
+    path = database_file(engine)
+    return path + suffix if path else None
+
+def same_database(first, second) -> bool:
+    """Whether two engines open the same database, as the write and read engines of one file do."""
+    if first is None or second is None:
+        return False
+    if first is second:
+        return True
+    # Every in-memory engine is a database of its own.
+    path = database_file(first)
+    return path is not None and path == database_file(second)
+# Set by serve.py for its workers once it created the schema.
+SCHEMA_READY = "ATHROSS_SCHEMA_READY"
+
+ECHO = os.getenv("DATABASE_ECHO", "false").lower() == "true"
+
+# Separate pools, so reads never wait for a connection behind writes and each is sized on its own.
 async_engine = create_async_engine(
     ASYNC_DATABASE_URL,
-    echo=True,
+    echo=ECHO,
+    pool_size=int(os.getenv("DATABASE_WRITE_POOL_SIZE", "5")),
+    future=True
+)
+read_engine = create_async_engine(
+    READ_DATABASE_URL,
+    echo=ECHO,
+    pool_size=int(os.getenv("DATABASE_READ_POOL_SIZE", "20")),
     future=True
 )
+for instrumented in (async_engine, read_engine):
+    service_metrics.instrument_engine(instrumented.sync_engine)
+    service_sql_accounting.instrument_engine(instrumented.sync_engine)
+    service_tracing.instrument_engine(instrumented.sync_engine)
 
 AsyncSessionLocal = sessionmaker(
     async_engine,
@@ -19,10 +68,30 @@ AsyncSessionLocal = sessionmaker(
     autoflush=False,
     autocommit=False
 )
+ReadSessionLocal = sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+    autocommit=False
+)
+
+async def _checkout(session: AsyncSession) -> None:
+    start = time.perf_counter()
+    await session.connection()
+    service_metrics.db_pool_checkout_duration.observe(time.perf_counter() - start)
+
+async def get_read_db():
+    """Session for requests that only read: never flushed or committed, its transaction is rolled back on close."""
+    async with ReadSessionLocal() as session:
+        await _checkout(session)
+        yield session
 
 async def get_async_db():
+    """Session for requests that write, committed when the request succeeds."""
     async with AsyncSessionLocal() as session:
         try:
+            await _checkout(session)
             yield session
             await session.commit()
         except Exception:
@@ -31,6 +100,14 @@ async def get_async_db():
         finally:
             await session.close()
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+async def create_schema():
+    async with async_engine.begin() as connection:
+        # Persistent in the file: readers no longer block the writer's commit, nor wait for it.
+        await connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+        await connection.run_sync(Base.metadata.create_all)
+        for upgrade in upgrades:
+            await connection.run_sync(upgrade)
+
+Base = declarative_base()
+# Changes create_all cannot make to existing tables, run in order after it; models register their own.
+upgrades = []
\ No newline at end of file
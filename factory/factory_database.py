@@ -1,3 +1 @@
-from database import get_async_db
-
-async_db = get_async_db()
\ No newline at end of file
+from database import get_async_db, get_read_db
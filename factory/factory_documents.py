@@ -0,0 +1,153 @@
+import hashlib
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import models.model_document as model_document
+import models.model_document_type as model_document_type
+import models.model_label as model_label
+from models.model_relationship import document_label
+from api.schemas.schema_label import LabelBase
+
+SERVICES = {
+    "database": {"host": 1, "port": "5432", "document": lambda name: {"name": name, "domain": "example.com"}},
+    "queue": {"host": 2, "port": "5672", "document": lambda name: {}},
+    "s3": {"host": 3, "port": None, "document": lambda name: {}},
+    "web": {"host": 4, "port": None, "document": lambda name: {}},
+}
+SERVERS = 3
+DOCUMENTS_PER_ENVIRONMENT = 2 * len(SERVICES) + 2 + SERVERS
+SUBNETS = (1, 100, 250)
+
+
+def environment_name(index: int) -> str:
+    return ("dev", "stg", "prd")[index] if index < 3 else "env{}".format(index)
+
+
+def ipv4(index: int, subnet: int, host: int) -> str:
+    if index < 3:
+        return "10.{}.{}.{}".format(index, subnet, host)
+    network = index * len(SUBNETS) + SUBNETS.index(subnet)
+    return "{}.{}.{}.{}".format(10 + (network >> 16), (network >> 8) & 255, network & 255, host)
+
+
+def _document(environment: str, type: str, name: str, labels: list, document: dict) -> dict:
+    return {
+        "hash": hashlib.md5("{}:{}:{}".format(environment, type, name).encode()).hexdigest(),
+        "type": type,
+        "created_by": "data-fake",
+        "labels": [{"key": key, "value": value} for key, value in labels],
+        "document": document,
+    }
+
+
+def generate_environment(index: int) -> List[dict]:
+    """
+    The documents of one environment, following the dns/service/app/server/balancer
+    topology of ``documents.json``: ``generate_environment(0)`` is its dev block.
+    """
+    environment = environment_name(index)
+    documents = []
+    requires = []
+
+    for service, spec in SERVICES.items():
+        name = "{}-{}".format(service, environment)
+        fqdn = "{}.example.com".format(name)
+        address = ipv4(index, 100, spec["host"])
+        requires.append(fqdn)
+        documents.append(_document(environment, "dns", name, [
+            ("ipv4", address), ("domain", fqdn), (service, name)
+        ], {"fqdn": fqdn, "ipv4": address}))
+
+    for (service, spec), fqdn in zip(SERVICES.items(), requires):
+        name = "{}-{}".format(service, environment)
+        labels = [("ipv4", ipv4(index, 100, spec["host"]))]
+        if spec["port"]:
+            labels.append(("port", spec["port"]))
+        labels += [("domain", fqdn), (service, name if service != "web" else name + "-name")]
+        documents.append(_document(environment, service, name, labels, spec["document"](name)))
+
+    app = "app-{}".format(environment)
+    app_address = ipv4(index, 250, 1)
+    documents.append(_document(environment, "app", app, [
+        ("ipv4", app_address), ("domain", "{}.example.com".format(app))
+    ] + list(zip(SERVICES, requires)), {
+        "name": app, "domain": "{}.example.com".format(app), "requires": requires
+    }))
+
+    servers = [ipv4(index, 1, host) for host in range(1, SERVERS + 1)]
+    for server in servers:
+        documents.append(_document(environment, "server", server, [("ipv4", server)], {}))
+
+    documents.append(_document(environment, "balancer", "balancer-{}".format(environment), [
+        ("ipv4", app_address)
+    ] + [("ipv4", server) for server in servers], {"name": "balancer-{}".format(environment), "ip": app_address}))
+
+    return documents
+
+
+def generate_documents(total: int) -> Iterator[dict]:
+    """``total`` documents from as many environments as needed, each with a unique hash."""
+    index = 0
+    produced = 0
+    while produced < total:
+        for document in generate_environment(index):
+            if produced == total:
+                return
+            yield document
+            produced += 1
+        index += 1
+
+
+async def seed_database(db: AsyncSession, documents: List[dict], batch_size: int = 5000) -> None:
+    """
+    Bulk insert generated documents with Core statements, bypassing the ORM
+    upsert path of ``repository_document`` so large fixtures load in seconds.
+    """
+    now = datetime.utcnow()
+    type_ids: Dict[str, uuid.UUID] = {}
+    label_ids: Dict[tuple, uuid.UUID] = {}
+
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        new_types = []
+        new_labels = []
+        rows = []
+        links = []
+
+        for document in batch:
+            if document["type"] not in type_ids:
+                type_ids[document["type"]] = uuid.uuid4()
+                new_types.append({"id": type_ids[document["type"]], "name": document["type"], "created_at": now, "updated_at": now})
+
+            labels = [LabelBase(**label) for label in document["labels"]]
+            document_id = uuid.uuid4()
+            for label in labels:
+                key = (label.key, label.value)
+                if key not in label_ids:
+                    label_ids[key] = uuid.uuid4()
+                    new_labels.append({"id": label_ids[key], "key": label.key, "value": label.value, "created_at": now, "updated_at": now})
+            for label_id in dict.fromkeys(label_ids[(label.key, label.value)] for label in labels):
+                links.append({"document_id": document_id, "label_id": label_id})
+
+            rows.append({
+                "id": document_id,
+                "hash": document["hash"],
+                "type_id": type_ids[document["type"]],
+                "created_by": document["created_by"],
+                "document": document.get("document") or {},
+                "labels_string": model_document.generate_labels_string(labels),
+                "labels_fingerprint": model_document.generate_labels_fingerprint(labels),
+                "created_at": now,
+                "updated_at": now,
+            })
+
+        if new_types:
+            await db.execute(insert(model_document_type.DocumentType), new_types)
+        if new_labels:
+            await db.execute(insert(model_label.Label), new_labels)
+        await db.execute(insert(model_document.Document), rows)
+        await db.execute(insert(document_label), links)
+
+    await db.commit()
@@ -1,4 +1,5 @@
-from repository.repository_log import TestLogger
+import logging
+from services import service_log
 
-def get_logger(tag: str) -> TestLogger:
-    return TestLogger(tag)
\ No newline at end of file
+def get_logger(tag: str) -> logging.Logger:
+    return service_log.get_logger(tag)
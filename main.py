@@ -1,9 +1,28 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from database import Base, engine
-from api.routes import route_document, route_document_type, route_label, route_user
+import database
+from api.routes import route_document, route_document_type, route_label, route_user, route_metrics, route_debug, route_graph, route_analytics
+from api.middlewares.middleware_metrics import MetricsMiddleware
+from api.middlewares.middleware_sql_accounting import SqlAccountingMiddleware
+from api.middlewares.middleware_request_id import RequestIdMiddleware
+from api.middlewares.middleware_tracing import TracingMiddleware
+from api.middlewares.middleware_memory import MemoryMiddleware
 from fastapi.middleware.cors import CORSMiddleware
+from services import service_watchdog
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # serve.py creates the schema once before starting its workers.
+    if not os.getenv(database.SCHEMA_READY):
+        await database.create_schema()
+    # Built once here so the first /docs request does not pay for it; FastAPI caches it on the app.
+    app.openapi()
+    service_watchdog.start()
+    yield
+    await service_watchdog.stop()
 
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="FastAPI Document API",
@@ -11,7 +30,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -21,8 +41,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(SqlAccountingMiddleware)
+app.add_middleware(MemoryMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(route_document.router)
 app.include_router(route_document_type.router)
 app.include_router(route_label.router)
 app.include_router(route_user.router)
+app.include_router(route_metrics.router)
+app.include_router(route_debug.router)
+app.include_router(route_graph.router)
+app.include_router(route_analytics.router)
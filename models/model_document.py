@@ -1,10 +1,12 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, event
+from sqlalchemy import Column, String, DateTime, ForeignKey, bindparam, event, inspect, select, update
 from sqlalchemy.dialects.postgresql import UUID as pgUUID
 from sqlalchemy.orm import relationship, Session
 from datetime import datetime
+import hashlib
+import json
 import uuid
 from sqlalchemy import JSON as dbJson
-from database import Base
+from database import Base, upgrades
 import models.model_label as model_label
 from models.model_relationship import document_label
 
@@ -13,18 +15,66 @@ class Document(Base):
 
     id = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     hash = Column(String, unique=True, nullable=False)
-    type_id = Column(pgUUID(as_uuid=True), ForeignKey('document_types.id'), nullable=False)
-    created_by = Column(String, nullable=False)
+    type_id = Column(pgUUID(as_uuid=True), ForeignKey('document_types.id'), nullable=False, index=True)
+    created_by = Column(String, nullable=False, index=True)
     document = Column(dbJson, nullable=True, default={})
     labels_string = Column(String, nullable=True)
+    labels_fingerprint = Column(String(64), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     type = relationship("DocumentType")
-    labels = relationship("Label", secondary=document_label, back_populates="documents", lazy="joined")
+    labels = relationship("Label", secondary=document_label, back_populates="documents", lazy="selectin")
 
 def generate_labels_string(labels):
     return ",".join([f"{label.key}={label.value}" for label in labels])
 
+def generate_labels_fingerprint(labels):
+    pairs = sorted({(label.key, label.value) for label in labels})
+    return hashlib.sha256(json.dumps(pairs, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def labels_of(document_ids):
+    """``(document_id, key, value)`` of every label linked to ``document_ids``."""
+    return (
+        select(document_label.c.document_id, model_label.Label.key, model_label.Label.value)
+        .join(model_label.Label, model_label.Label.id == document_label.c.label_id)
+        .where(document_label.c.document_id.in_(document_ids))
+    )
+
+
+# Sets the columns the before_flush listener maintains, for documents whose links changed without loading them.
+update_label_columns = (
+    update(Document.__table__)
+    .where(Document.__table__.c.id == bindparam("document_id"))
+    .values(labels_string=bindparam("string"), labels_fingerprint=bindparam("fingerprint"))
+)
+
+
+def label_columns(document_ids, rows):
+    """Parameters of ``update_label_columns`` for ``document_ids``, from their ``labels_of`` rows."""
+    labels = {document_id: [] for document_id in document_ids}
+    for row in rows:
+        labels[row.document_id].append(row)
+    return [
+        {"document_id": document_id, "string": generate_labels_string(pairs), "fingerprint": generate_labels_fingerprint(pairs)}
+        for document_id, pairs in labels.items()
+    ]
+
+
+def add_labels_fingerprint(connection, chunk_size: int = 500) -> None:
+    """Adds ``labels_fingerprint`` to databases created before it and fingerprints the rows that have none."""
+    if "labels_fingerprint" not in {column["name"] for column in inspect(connection).get_columns("documents")}:
+        connection.exec_driver_sql("ALTER TABLE documents ADD COLUMN labels_fingerprint VARCHAR(64)")
+    for index in Document.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    stale = connection.execute(select(Document.id).where(Document.labels_fingerprint.is_(None))).scalars().all()
+    for start in range(0, len(stale), chunk_size):
+        document_ids = stale[start:start + chunk_size]
+        connection.execute(update_label_columns, label_columns(document_ids, connection.execute(labels_of(document_ids))))
+
+
+upgrades.append(add_labels_fingerprint)
+
 
 @event.listens_for(Session, "before_flush")
 def update_labels_string(session, flush_context, _):
@@ -32,4 +82,7 @@ def update_labels_string(session, flush_context, _):
         if isinstance(instance, Document):
             new_value = generate_labels_string(instance.labels or [])
             if instance.labels_string != new_value:
-                instance.labels_string = new_value
\ No newline at end of file
+                instance.labels_string = new_value
+            new_fingerprint = generate_labels_fingerprint(instance.labels or [])
+            if instance.labels_fingerprint != new_fingerprint:
+                instance.labels_fingerprint = new_fingerprint
@@ -1,10 +1,10 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Table, UniqueConstraint
+from sqlalchemy import Column, DDL, Integer, String, DateTime, ForeignKey, Table, UniqueConstraint, event, inspect
 from sqlalchemy.dialects.postgresql import UUID as pgUUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 
-from database import Base
+from database import Base, upgrades
 from models.model_relationship import document_label
 
 class Label(Base):
@@ -15,6 +15,8 @@ class Label(Base):
     value = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Number of documents carrying the label, kept by triggers on document_label (see DEGREE_TRIGGERS).
+    degree = Column(Integer, nullable=False, default=0, server_default="0", index=True)
 
     documents = relationship(
         "Document",
@@ -22,4 +24,29 @@ class Label(Base):
         back_populates='labels'
     )
 
-    __table_args__ = (UniqueConstraint('key', 'value', name='_name_value_uc'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('key', 'value', name='_name_value_uc'),)
+
+
+DEGREE_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS document_label_degree_insert AFTER INSERT ON document_label "
+    "BEGIN UPDATE labels SET degree = degree + 1 WHERE id = NEW.label_id; END",
+    "CREATE TRIGGER IF NOT EXISTS document_label_degree_delete AFTER DELETE ON document_label "
+    "BEGIN UPDATE labels SET degree = degree - 1 WHERE id = OLD.label_id; END",
+)
+for trigger in DEGREE_TRIGGERS:
+    event.listen(document_label, "after_create", DDL(trigger))
+
+
+def add_label_degrees(connection) -> None:
+    """Adds ``degree`` and its triggers to databases created before them, counting the existing links once."""
+    if "degree" in {column["name"] for column in inspect(connection).get_columns("labels")}:
+        return
+    connection.exec_driver_sql("ALTER TABLE labels ADD COLUMN degree INTEGER NOT NULL DEFAULT 0")
+    for index in Label.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    connection.exec_driver_sql("UPDATE labels SET degree = (SELECT count(*) FROM document_label WHERE label_id = labels.id)")
+    for trigger in DEGREE_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
+upgrades.append(add_label_degrees)
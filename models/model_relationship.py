@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Table, DateTime, func
+from sqlalchemy import Column, ForeignKey, Index, Table, DateTime, func
 from sqlalchemy.dialects.postgresql import UUID as pgUUID
 from database import Base
 import datetime
@@ -10,4 +10,5 @@ document_label = Table(
     Column('label_id', pgUUID(as_uuid=True), ForeignKey('labels.id'), primary_key=True),
     Column('created_at', DateTime(timezone=True), server_default=func.now(), nullable=False),
     Column('updated_at', DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False),
+    Index('ix_document_label_label_id_document_id', 'label_id', 'document_id'),
 )
\ No newline at end of file
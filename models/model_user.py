@@ -11,8 +11,8 @@ class User(Base):
     __tablename__ = 'users'
 
     uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    username = Column(String(100), nullable=False)
-    email = Column(String(100), nullable=False)
+    username = Column(String(100), nullable=False, index=True)
+    email = Column(String(100), nullable=False, index=True)
     password = Column(String(100), nullable=False)
     active = Column(String(100), nullable=False, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
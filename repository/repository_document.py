@@ -1,23 +1,25 @@
 import uuid
-import json
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
-from sqlalchemy import delete as sa_delete
-from typing import List, Dict
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import delete as sa_delete, and_, or_, exists, func, literal, union
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 import models.model_document as model_document
 import models.model_label as model_label
+from models.model_relationship import document_label
 import api.schemas.schema_document as schema_document
 import api.schemas.schema_document_type as schema_document_type
 import api.schemas.schema_label as schema_label
 from models.model_document_type import DocumentType
+from services import service_selector, service_tracing, service_events, service_generations, service_label, service_components
 
+@service_tracing.traced()
 async def list_all(db: AsyncSession) -> Dict[str, List[schema_document.Document]]:
     response = {}
 
     result = await db.execute(
         select(model_document.Document)
-        .options(joinedload(model_document.Document.labels), joinedload(model_document.Document.type))
+        .options(selectinload(model_document.Document.labels), joinedload(model_document.Document.type))
     )
     documents = result.unique().scalars().all()
     
@@ -48,23 +50,251 @@ async def list_all(db: AsyncSession) -> Dict[str, List[schema_document.Document]
                     for label in document.labels
                 ],
                 labels_string=document.labels_string,
+                labels_fingerprint=document.labels_fingerprint,
                 created_at=document.created_at,
                 updated_at=document.updated_at
             )
         )
-    print(response)
     return response
 
+@service_tracing.traced()
 async def get_document_by_uuid(db: AsyncSession, uuid: uuid.UUID):
     result = await db.execute(
         select(model_document.Document)
-        .options(joinedload(model_document.Document.labels), joinedload(model_document.Document.type))
+        .options(selectinload(model_document.Document.labels), joinedload(model_document.Document.type))
         .where(model_document.Document.id == uuid)
     )
     document = result.unique().scalar_one_or_none()
     return document
 
+@service_tracing.traced()
+async def list_by_ids(db: AsyncSession, ids: List[uuid.UUID], chunk_size: int = 500) -> List[model_document.Document]:
+    documents = []
+    for start in range(0, len(ids), chunk_size):
+        result = await db.execute(
+            select(model_document.Document)
+            .options(selectinload(model_document.Document.labels), joinedload(model_document.Document.type))
+            .where(model_document.Document.id.in_(ids[start:start + chunk_size]))
+        )
+        documents.extend(result.unique().scalars().all())
+    return documents
+
+@service_tracing.traced()
+async def refresh_label_columns(db: AsyncSession, ids: List[uuid.UUID], chunk_size: int = 500) -> None:
+    """Recompute ``labels_string`` and ``labels_fingerprint`` of documents whose links changed outside the ORM."""
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        rows = (await db.execute(model_document.labels_of(chunk))).all()
+        await db.execute(model_document.update_label_columns, model_document.label_columns(chunk, rows))
+
+def _label_condition(requirement: service_selector.Requirement):
+    condition = model_label.Label.key == requirement.key
+    if requirement.values:
+        condition = and_(condition, model_label.Label.value.in_(requirement.values))
+    return condition
+
+
+def _documents_with_label(requirement: service_selector.Requirement):
+    return (
+        select(document_label.c.document_id)
+        .join(model_label.Label, model_label.Label.id == document_label.c.label_id)
+        .where(_label_condition(requirement))
+    )
+
+
+def _has_label(requirement: service_selector.Requirement):
+    return exists(
+        _documents_with_label(requirement)
+        .where(document_label.c.document_id == model_document.Document.id)
+    )
+
+
+@service_tracing.traced()
+async def list_by_selector(db: AsyncSession, selector: str) -> List[model_document.Document]:
+    requirements = service_selector.parse(selector)
+
+    counts = {}
+    keys = {requirement.key for requirement in requirements}
+    if keys:
+        result = await db.execute(
+            select(model_label.Label.key, model_label.Label.value, func.count(document_label.c.document_id))
+            .join(document_label, document_label.c.label_id == model_label.Label.id)
+            .where(model_label.Label.key.in_(keys))
+            .group_by(model_label.Label.key, model_label.Label.value)
+        )
+        counts = {(key, value): count for key, value, count in result.all()}
+
+    positive, negative = service_selector.plan(requirements, counts)
+    if any(service_selector.estimate_matches(requirement, counts) == 0 for requirement in positive):
+        return []
+
+    stmt = (
+        select(model_document.Document)
+        .options(selectinload(model_document.Document.labels), joinedload(model_document.Document.type))
+    )
+    if positive:
+        stmt = stmt.where(model_document.Document.id.in_(_documents_with_label(positive[0])))
+    for requirement in positive[1:]:
+        stmt = stmt.where(_has_label(requirement))
+    for requirement in negative:
+        stmt = stmt.where(~_has_label(requirement))
+
+    result = await db.execute(stmt)
+    return result.unique().scalars().all()
+
+@service_tracing.traced()
+async def list_by_labels_fingerprint(db: AsyncSession, fingerprint: str) -> List[model_document.Document]:
+    result = await db.execute(
+        select(model_document.Document)
+        .options(selectinload(model_document.Document.labels), joinedload(model_document.Document.type))
+        .where(model_document.Document.labels_fingerprint == fingerprint)
+    )
+    return result.unique().scalars().all()
+
+@service_tracing.traced()
+async def list_by_label_set(db: AsyncSession, labels: List[schema_label.LabelBase]) -> List[model_document.Document]:
+    fingerprint = model_document.generate_labels_fingerprint(labels)
+    return await list_by_labels_fingerprint(db, fingerprint)
+
+@service_tracing.traced()
+async def list_label_sets(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    min_size: int = 1
+) -> Tuple[List[dict], int]:
+    groups = (
+        select(
+            model_document.Document.labels_fingerprint.label("labels_fingerprint"),
+            func.min(model_document.Document.labels_string).label("labels_string"),
+            func.count().label("total")
+        )
+        .where(model_document.Document.labels_fingerprint.is_not(None))
+        .group_by(model_document.Document.labels_fingerprint)
+        .having(func.count() >= min_size)
+    )
+
+    items_result = await db.execute(
+        groups.order_by(func.count().desc(), model_document.Document.labels_fingerprint)
+        .offset(skip)
+        .limit(limit)
+    )
+    items = [dict(row._mapping) for row in items_result.all()]
+
+    count_result = await db.execute(select(func.count()).select_from(groups.subquery()))
+    total = count_result.scalar_one()
+
+    return items, total
+
+def _relations_query(seed_label_ids: List[uuid.UUID], options: service_label.TraversalOptions):
+    """
+    Recursive CTE walking document -> label -> document edges breadth first
+    from the documents carrying every seed label. Rows are (document, depth);
+    ``max_depth`` bounds the recursion and UNION drops repeated (document,
+    depth) rows, so cycles and parallel paths cost at most one row per depth.
+    Returns the ``reach`` CTE and the ``hubs`` CTE (None without skip_hubs).
+    """
+    hubs = None
+    if options.skip_hubs:
+        # Label degrees are kept up to date on write, so hubs are a range scan of the degree index.
+        document_count = select(func.count()).select_from(model_document.Document).scalar_subquery()
+        hubs = (
+            select(model_label.Label.id.label("label_id"))
+            .where(model_label.Label.degree > func.max(literal(service_components.HUB_MIN_DEGREE), document_count * options.hub_ratio))
+            .cte("hubs")
+            .prefix_with("MATERIALIZED")
+        )
+
+    reach = (
+        select(document_label.c.document_id, literal(0).label("depth"))
+        .where(document_label.c.label_id.in_(seed_label_ids))
+        .group_by(document_label.c.document_id)
+        .having(func.count() == len(seed_label_ids))
+        .cte("reach", recursive=True)
+    )
+    via = document_label.alias("via")
+    following = document_label.alias("following")
+    step = (
+        select(following.c.document_id, reach.c.depth + 1)
+        .select_from(reach)
+        .join(via, via.c.document_id == reach.c.document_id)
+        .join(following, and_(following.c.label_id == via.c.label_id, following.c.document_id != reach.c.document_id))
+        .where(reach.c.depth < options.max_depth)
+    )
+    if options.max_fanout is not None:
+        # The first max_fanout documents of each label followed, read off the (label_id, document_id) index.
+        capped = document_label.alias("capped")
+        step = step.where(following.c.document_id.in_(
+            select(capped.c.document_id)
+            .where(capped.c.label_id == via.c.label_id)
+            .order_by(capped.c.document_id)
+            .limit(options.max_fanout)
+        ))
+    if options.allow_keys is not None or options.deny_keys:
+        step = step.join(model_label.Label, model_label.Label.id == via.c.label_id)
+        if options.allow_keys is not None:
+            step = step.where(model_label.Label.key.in_(sorted(options.allow_keys)))
+        if options.deny_keys:
+            step = step.where(model_label.Label.key.not_in(sorted(options.deny_keys)))
+    if hubs is not None:
+        step = step.where(via.c.label_id.not_in(select(hubs.c.label_id)))
+    return reach.union(step), hubs
+
+@service_tracing.traced()
+async def stream_relations(
+    db: AsyncSession,
+    seed_label_ids: List[uuid.UUID],
+    options: service_label.TraversalOptions = service_label.TraversalOptions(),
+    batch_size: int = 500,
+    after: Optional[service_label.Position] = None
+) -> AsyncIterator[Tuple[model_document.Document, int]]:
+    """
+    Documents related to the seed labels with their depth, nearest first then
+    by id, streamed from the database; ``after`` resumes past a ``(depth, id)``.
+    """
+    if not seed_label_ids:
+        return
+    reach, _ = _relations_query(list(dict.fromkeys(seed_label_ids)), options)
+    nearest = select(reach.c.document_id, func.min(reach.c.depth).label("depth")).group_by(reach.c.document_id).subquery()
+    query = select(model_document.Document, nearest.c.depth).join(nearest, nearest.c.document_id == model_document.Document.id)
+    if after is not None:
+        query = query.where(or_(
+            nearest.c.depth > after[0],
+            and_(nearest.c.depth == after[0], model_document.Document.id > after[1])
+        ))
+    result = await db.stream(
+        query
+        .options(selectinload(model_document.Document.labels), joinedload(model_document.Document.type))
+        .order_by(nearest.c.depth, model_document.Document.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for document, depth in result:
+        yield document, depth
+
+@service_tracing.traced()
+async def relation_hubs(
+    db: AsyncSession,
+    seed_label_ids: List[uuid.UUID],
+    options: service_label.TraversalOptions = service_label.TraversalOptions()
+) -> List[model_label.Label]:
+    """Hub labels carried by the documents ``stream_relations`` reaches, i.e. the ones it did not follow."""
+    if not seed_label_ids or not options.skip_hubs:
+        return []
+    reach, hubs = _relations_query(list(dict.fromkeys(seed_label_ids)), options)
+    result = await db.execute(
+        select(model_label.Label)
+        .where(model_label.Label.id.in_(
+            select(document_label.c.label_id)
+            .where(document_label.c.document_id.in_(select(reach.c.document_id)))
+            .where(document_label.c.label_id.in_(select(hubs.c.label_id)))
+        ))
+        .order_by(model_label.Label.key, model_label.Label.value)
+    )
+    return result.scalars().all()
+
+@service_tracing.traced()
 async def create_or_update_documents(db: AsyncSession, documents_data: list):
+    written = []
     for doc_data in documents_data:
         doc_type = await db.scalar(select(DocumentType).filter_by(name=doc_data.type))
         if not doc_type:
@@ -88,31 +318,42 @@ async def create_or_update_documents(db: AsyncSession, documents_data: list):
         if existing_doc:
             existing_doc.type_id = doc_type.id
             existing_doc.created_by = doc_data.created_by
-            existing_doc.document = json.dumps(doc_data.document or {})
+            existing_doc.document = doc_data.document or {}
             existing_doc.labels.clear()
             existing_doc.labels.extend(label_objs)
+            written.append((existing_doc, label_objs))
         else:
             new_doc = model_document.Document(
                 hash=doc_data.hash,
                 type_id=doc_type.id,
                 created_by=doc_data.created_by,
-                document=json.dumps(doc_data.document or {}),
+                document=doc_data.document or {},
                 labels=label_objs,
             )
             db.add(new_doc)
+            written.append((new_doc, label_objs))
 
     await db.commit()
+    service_generations.bump(service_generations.DOCUMENTS, service_generations.LABELS, service_generations.DOCUMENT_TYPES)
+    service_events.publish(service_events.DOCUMENTS_UPSERTED, [
+        (document.id, [(label.id, label.key, label.value) for label in label_objs]) for document, label_objs in written
+    ])
 
     response = await list_all(db)
     return response
 
+@service_tracing.traced()
 async def delete(db: AsyncSession, id: uuid.UUID):
+    await db.execute(sa_delete(document_label).where(document_label.c.document_id == id))
     await db.execute(
         sa_delete(model_document.Document).where(model_document.Document.id == id)
     )
     await db.commit()
+    service_generations.bump(service_generations.DOCUMENTS)
+    service_events.publish(service_events.DOCUMENTS_DELETED, [id])
 
 
+@service_tracing.traced()
 async def delete_by_uuids(db: AsyncSession, uuids_to_delete: List[uuid.UUID]):
     if not uuids_to_delete:
         return 0
@@ -126,8 +367,11 @@ async def delete_by_uuids(db: AsyncSession, uuids_to_delete: List[uuid.UUID]):
     if not valid_uuids:
         return 0
     
+    await db.execute(sa_delete(document_label).where(document_label.c.document_id.in_(valid_uuids)))
     delete_stmt = sa_delete(model_document.Document).where(model_document.Document.id.in_(valid_uuids))
     result = await db.execute(delete_stmt)
     await db.commit()
+    service_generations.bump(service_generations.DOCUMENTS)
+    service_events.publish(service_events.DOCUMENTS_DELETED, valid_uuids)
     
     return result.rowcount
\ No newline at end of file
@@ -6,8 +6,10 @@ from typing import List, Tuple
 import api.schemas.schema_document_type as schema_document_type
 import models.model_document_type as model_document_type
 from sqlalchemy import func
+from services import service_generations, service_tracing
 
 
+@service_tracing.traced()
 async def list_all(
     db: AsyncSession,
     skip: int = 0,
@@ -28,6 +30,7 @@ async def list_all(
     
     return items, total
 
+@service_tracing.traced()
 async def get_or_create(
         db: AsyncSession, 
         document_types: List[schema_document_type.DocumentTypeCreate]
@@ -51,11 +54,13 @@ async def get_or_create(
 
     if new_document_types:
         await db.commit()
+        service_generations.bump(service_generations.DOCUMENT_TYPES)
         for document_type in new_document_types:
             await db.refresh(document_type)
 
     return existing_document_types + new_document_types
 
+@service_tracing.traced()
 async def delete(db: AsyncSession, document_type_id: UUID4):
     result = await db.execute(
         select(model_document_type.DocumentType)
@@ -68,4 +73,5 @@ async def delete(db: AsyncSession, document_type_id: UUID4):
     
     await db.delete(existing_document_type)
     await db.commit()
+    service_generations.bump(service_generations.DOCUMENT_TYPES, service_generations.DOCUMENTS)
     return existing_document_type
\ No newline at end of file
@@ -1,16 +1,36 @@
 from fastapi import HTTPException
+from sqlalchemy import and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
 import models.model_label as model_label
+from models.model_relationship import document_label
+from repository import repository_document
 import api.schemas.schema_label as schema_label
+from services import service_tracing, service_events, service_generations
 
+@service_tracing.traced()
 async def list_all(db: AsyncSession):
     result = await db.execute(
         select(model_label.Label).order_by(model_label.Label.key)
     )
     return result.scalars().all()
 
+@service_tracing.traced()
+async def list_by_pairs(db: AsyncSession, labels: List[schema_label.LabelBase]):
+    """The existing labels with exactly these ``(key, value)`` pairs; unknown pairs are left out, nothing is created."""
+    pairs = sorted({(label.key, label.value) for label in labels})
+    if not pairs:
+        return []
+    # One equality pair per term, so each is a lookup on the (key, value) unique index; SQLite scans for a row-value IN.
+    result = await db.execute(
+        select(model_label.Label).where(or_(*(
+            and_(model_label.Label.key == key, model_label.Label.value == value) for key, value in pairs
+        )))
+    )
+    return result.scalars().all()
+
+@service_tracing.traced()
 async def get_or_create(db: AsyncSession, labels: List[schema_label.LabelCreate]):
     input_keys = [label.key for label in labels]
 
@@ -29,11 +49,13 @@ async def get_or_create(db: AsyncSession, labels: List[schema_label.LabelCreate]
 
     if new_labels:
         await db.commit()
+        service_generations.bump(service_generations.LABELS)
         for label in new_labels:
             await db.refresh(label)
 
     return existing_labels + new_labels
 
+@service_tracing.traced()
 async def delete(db: AsyncSession, label_id: int):
     result = await db.execute(
         select(model_label.Label).where(model_label.Label.id == label_id)
@@ -43,6 +65,13 @@ async def delete(db: AsyncSession, label_id: int):
     if not existing_label:
         raise HTTPException(status_code=404, detail="Label not found")
 
+    linked = await db.execute(select(document_label.c.document_id).where(document_label.c.label_id == existing_label.id))
+    document_ids = linked.scalars().all()
     await db.delete(existing_label)
+    await db.flush()
+    # The links go with the label; the documents themselves are not flushed, so refresh their label columns here.
+    await repository_document.refresh_label_columns(db, document_ids)
     await db.commit()
+    service_generations.bump(service_generations.LABELS, service_generations.DOCUMENTS)
+    service_events.publish(service_events.LABELS_DELETED, [existing_label.id])
     return existing_label
@@ -1,11 +1,14 @@
+import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from models import model_user
 from api.schemas import schema_user
 from utils import security
+from services import service_generations, service_tracing
 
+@service_tracing.traced()
 async def create_user(db: AsyncSession, user: schema_user.UserCreate) -> model_user.User:
     security.validate_password(user.password, user.confirm_password)
-    encrypted_password = security.hash_password(user.password)
+    encrypted_password = await asyncio.to_thread(security.hash_password, user.password)
     user = model_user.User(
         username=user.username,
         email=user.email, 
@@ -14,9 +17,11 @@ async def create_user(db: AsyncSession, user: schema_user.UserCreate) -> model_u
     )
     db.add(user)
     await db.commit()
+    service_generations.bump(service_generations.USERS)
     await db.refresh(user)
     return user
 
+@service_tracing.traced()
 async def update_user_profile(
     db: AsyncSession,
     user: model_user.User,
@@ -30,13 +35,15 @@ async def update_user_profile(
 
     if password and password.strip():
         security.validate_password(password, confirm_password)
-        user.password_hash = security.hash_password(password)
+        user.password_hash = await asyncio.to_thread(security.hash_password, password)
 
     await db.commit()
+    service_generations.bump(service_generations.USERS)
     await db.refresh(user)
 
     return user
 
 
+@service_tracing.traced()
 async def get_user(db: AsyncSession, user_uuid: str) -> model_user.User:
     return await db.get(model_user.User, user_uuid)
\ No newline at end of file
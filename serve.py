@@ -0,0 +1,161 @@
+"""
+Production launcher: sets up the schema once, then serves ``main:app`` from a
+pool of uvicorn worker processes sharing one listening socket.
+
+    python serve.py --host 0.0.0.0 --port 8080
+    kill -HUP <launcher pid>    # rolling reload, e.g. after a deploy
+    kill -TERM <launcher pid>   # graceful stop
+
+Workers default to the CPU count (``WEB_CONCURRENCY`` overrides it). After
+``--max-requests`` requests plus a random share of ``--max-requests-jitter``
+a worker asks to retire, which bounds memory creep without all workers
+recycling at once. Retiring workers and, on SIGHUP, every worker are replaced
+one at a time: the old worker keeps serving until its replacement finished
+starting up, then stops accepting and finishes its in-flight requests. The
+pool never serves with fewer workers than configured. A worker that dies is
+replaced too.
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import random
+import sys
+from typing import Optional
+import uvicorn
+from uvicorn.supervisors.multiprocess import Multiprocess, Process
+import database
+
+READY_TIMEOUT = 120
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def setup_schema() -> None:
+    # Importing the app registers every model, and fails here rather than in every worker.
+    import main  # noqa: F401
+    asyncio.run(database.create_schema())
+    os.environ[database.SCHEMA_READY] = "1"
+
+
+class Worker(uvicorn.Server):
+    """
+    A uvicorn server telling the launcher once the application finished
+    starting up, and once it served ``max_requests`` requests; unlike
+    uvicorn's own limit, it keeps serving until the launcher stops it.
+    """
+
+    def __init__(self, config: uvicorn.Config, max_requests: Optional[int], ready, retiring):
+        super().__init__(config)
+        self.max_requests = max_requests
+        self.ready = ready
+        self.retiring = retiring
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets)
+        if self.started:
+            self.ready.set()
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.max_requests and not self.retiring.is_set() and self.server_state.total_requests >= self.max_requests:
+            logger.info("Served %d requests; asking to be replaced", self.server_state.total_requests)
+            self.retiring.set()
+        return await super().on_tick(counter)
+
+
+def serve_worker(config: uvicorn.Config, max_requests: Optional[int], ready, retiring, sockets=None) -> None:
+    Worker(config, max_requests, ready, retiring).run(sockets=sockets)
+
+
+class Launcher(Multiprocess):
+    """``uvicorn``'s worker supervisor with jittered recycling and a rolling SIGHUP reload."""
+
+    def __init__(self, config: uvicorn.Config, sockets, max_requests: Optional[int] = None, max_requests_jitter: int = 0):
+        super().__init__(config, target=None, sockets=sockets)
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+
+    def spawn(self) -> Process:
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+        context = multiprocessing.get_context("spawn")
+        ready, retiring = context.Event(), context.Event()
+        process = Process(self.config, functools.partial(serve_worker, self.config, max_requests, ready, retiring), self.sockets)
+        process.ready, process.retiring = ready, retiring
+        process.start()
+        return process
+
+    def replace(self, index: int) -> None:
+        """Start a replacement for worker ``index`` and stop the old one once the new one is serving."""
+        process = self.processes[index]
+        replacement = self.spawn()
+        if not replacement.ready.wait(READY_TIMEOUT):
+            logger.error("Replacement worker [%s] did not start; keeping [%s]", replacement.pid, process.pid)
+            replacement.terminate()
+            replacement.join()
+            return
+        self.processes[index] = replacement
+        process.terminate()
+        process.join()
+        logger.info("Replaced worker [%s] with [%s]", process.pid, replacement.pid)
+
+    def init_processes(self) -> None:
+        self.processes = [self.spawn() for _ in range(self.processes_num)]
+
+    def keep_subprocess_alive(self) -> None:
+        if self.should_exit.is_set():
+            return
+        for index, process in enumerate(self.processes):
+            if process.retiring.is_set() and not self.should_exit.is_set():
+                self.replace(index)
+                continue
+            if process.is_alive():
+                continue
+            process.kill()
+            process.join()
+            if self.should_exit.is_set():
+                return
+            logger.info("Worker [%s] exited; starting a replacement", process.pid)
+            self.processes[index] = self.spawn()
+
+    def restart_all(self) -> None:
+        for index in range(len(self.processes)):
+            self.replace(index)
+
+    def handle_ttin(self) -> None:
+        self.processes_num += 1
+        self.processes.append(self.spawn())
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", "10000")),
+                        help="Recycle a worker after this many requests (0 never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=int(os.getenv("MAX_REQUESTS_JITTER", "1000")))
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="Seconds a stopping worker waits for in-flight requests")
+    parser.add_argument("--log-level", default="info")
+    arguments = parser.parse_args(argv)
+
+    setup_schema()
+    config = uvicorn.Config(
+        "main:app",
+        host=arguments.host,
+        port=arguments.port,
+        workers=arguments.workers,
+        timeout_graceful_shutdown=arguments.graceful_timeout,
+        log_level=arguments.log_level,
+        proxy_headers=True
+    )
+    socket = config.bind_socket()
+    Launcher(config, [socket], arguments.max_requests or None, arguments.max_requests_jitter).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import asyncio
+import datetime
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+import database
+import models.model_document as model_document
+import models.model_document_type as model_document_type
+import models.model_label as model_label
+from models.model_relationship import document_label
+from services import service_events, service_generations, service_log
+from services.service_components import BUILD_PARTITION
+
+TYPE = "type"
+
+logger = service_log.get_logger("analytics")
+
+
+def _interned(values: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """Distinct values (sorted) and every value's position among them."""
+    names, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return names.tolist(), codes.astype(np.int32)
+
+
+class LabelMatrix:
+    """
+    The documents x labels incidence matrix in CSR form over interned ids:
+    ``indices[indptr[d]:indptr[d + 1]]`` are the labels of document ``d`` and
+    ``rows`` repeats each document once per label (the COO row of every
+    link). Documents carry a type code, labels a key code. Every aggregation
+    is a mask over documents, gathered onto links through ``rows`` and
+    counted with ``np.bincount``, so it runs in C over all links at once.
+    """
+
+    def __init__(
+        self,
+        documents: List[str],
+        types: List[str],
+        labels: List[Tuple[str, str, str]],
+        edges: Tuple[List[str], List[str]]
+    ):
+        self.generated_at = datetime.datetime.now()
+        self.type_names, self.document_types = _interned(types)
+        self.documents = np.asarray(documents, dtype="U32")
+        order = np.argsort(self.documents)
+        self.documents, self.document_types = self.documents[order], self.document_types[order]
+
+        label_ids = np.asarray([label_id for label_id, _, _ in labels], dtype="U32")
+        order = np.argsort(label_ids)
+        label_ids = label_ids[order]
+        labels = [labels[index] for index in order]
+        self.key_names, self.label_keys = _interned([key for _, key, _ in labels])
+        self.label_pairs = [(key, value) for _, key, value in labels]
+        self.label_index: Dict[Tuple[str, str], int] = {pair: index for index, pair in enumerate(self.label_pairs)}
+        # Position of every label in (key, value) order, to break ties alphabetically.
+        self.sorted_labels = sorted(range(len(self.label_pairs)), key=self.label_pairs.__getitem__)
+        self.label_rank = np.empty(len(self.label_pairs), dtype=np.int32)
+        self.label_rank[self.sorted_labels] = np.arange(len(self.label_pairs), dtype=np.int32)
+
+        rows = self._locate(self.documents, np.asarray(edges[0], dtype="U32"))
+        indices = self._locate(label_ids, np.asarray(edges[1], dtype="U32"))
+        known = (rows >= 0) & (indices >= 0)
+        rows, indices = rows[known], indices[known]
+        order = np.lexsort((indices, rows))
+        self.rows, self.indices = rows[order].astype(np.int32), indices[order].astype(np.int32)
+        self.indptr = np.zeros(len(self.documents) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.rows, minlength=len(self.documents)), out=self.indptr[1:])
+
+    @staticmethod
+    def _locate(sorted_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Position of every id in ``sorted_ids``, -1 for the ones missing."""
+        if not len(sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        positions = np.searchsorted(sorted_ids, ids)
+        positions[positions == len(sorted_ids)] = 0
+        return np.where(sorted_ids[positions] == ids, positions, -1)
+
+    @property
+    def document_count(self) -> int:
+        return len(self.documents)
+
+    @property
+    def link_count(self) -> int:
+        return len(self.indices)
+
+    def _key_code(self, key: str) -> int:
+        try:
+            return self.key_names.index(key)
+        except ValueError:
+            return -1
+
+    def _documents_with(self, link_mask: np.ndarray) -> np.ndarray:
+        documents = np.zeros(self.document_count, dtype=bool)
+        documents[self.rows[link_mask]] = True
+        return documents
+
+    def documents_with_label(self, key: str, value: Optional[str] = None) -> np.ndarray:
+        """Mask of the documents carrying ``key=value``, or any label with ``key`` when no value is given."""
+        if value is None:
+            return self._documents_with(self.label_keys[self.indices] == self._key_code(key))
+        label = self.label_index.get((key, value))
+        if label is None:
+            return np.zeros(self.document_count, dtype=bool)
+        return self._documents_with(self.indices == label)
+
+    def select(self, type: Optional[str] = None, labels: Iterable[Tuple[str, Optional[str]]] = ()) -> np.ndarray:
+        """Mask of the documents of ``type`` (if given) carrying every one of ``labels``."""
+        mask = np.ones(self.document_count, dtype=bool)
+        if type is not None:
+            code = self.type_names.index(type) if type in self.type_names else -1
+            mask &= self.document_types == code
+        for key, value in labels:
+            mask &= self.documents_with_label(key, value)
+        return mask
+
+    def _top(self, counts: np.ndarray, limit: int, ranks: Optional[np.ndarray] = None) -> List[Tuple[int, int]]:
+        """Indices of the ``limit`` largest non-zero counts with their count, ties in ``ranks`` (else index) order."""
+        nonzero = np.flatnonzero(counts)
+        if len(nonzero) > limit:
+            kth = len(nonzero) - limit
+            nonzero = nonzero[counts[nonzero] >= np.partition(counts[nonzero], kth)[kth]]
+        order = nonzero[np.lexsort((nonzero if ranks is None else ranks[nonzero], -counts[nonzero]))][:limit]
+        return [(int(index), int(counts[index])) for index in order]
+
+    def facets(self, mask: np.ndarray, key: Optional[str] = None, limit: int = 100) -> List[Tuple[str, str, int]]:
+        """Documents of ``mask`` per label (of ``key`` only, if given), most common first."""
+        links = mask[self.rows]
+        if key is not None:
+            links &= self.label_keys[self.indices] == self._key_code(key)
+        counts = np.bincount(self.indices[links], minlength=len(self.label_pairs))
+        return [self.label_pairs[label] + (count,) for label, count in self._top(counts, limit, self.label_rank)]
+
+    def _dimension(self, mask: np.ndarray, dimension: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """``(documents, codes, names)`` of a group-by dimension over ``mask``: the type, or the values of a label key."""
+        if dimension == TYPE:
+            documents = np.flatnonzero(mask)
+            return documents, self.document_types[documents], self.type_names
+        links = mask[self.rows] & (self.label_keys[self.indices] == self._key_code(dimension))
+        ranks, codes = np.unique(self.label_rank[self.indices[links]], return_inverse=True)
+        return self.rows[links], codes, [self.label_pairs[self.sorted_labels[rank]][1] for rank in ranks]
+
+    def group_by(self, mask: np.ndarray, dimensions: Sequence[str], limit: int = 100) -> List[Tuple[Tuple[str, ...], int]]:
+        """
+        Documents of ``mask`` per combination of values of one or two
+        dimensions, most common first. A document with several values for a
+        key counts once per value. Two dimensions are joined on the document:
+        every entry of the first is repeated once per entry of the second on
+        the same document.
+        """
+        documents, codes, names = self._dimension(mask, dimensions[0])
+        if len(dimensions) == 1:
+            counts = np.bincount(codes, minlength=len(names))
+            return [((names[code],), count) for code, count in self._top(counts, limit)]
+
+        other_documents, other_codes, other_names = self._dimension(mask, dimensions[1])
+        per_document = np.bincount(other_documents, minlength=self.document_count)
+        starts = np.zeros(self.document_count + 1, dtype=np.int64)
+        np.cumsum(per_document, out=starts[1:])
+        repeats = per_document[documents]
+        first = np.repeat(np.arange(len(documents)), repeats)
+        offsets = np.arange(len(first)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        second = starts[documents[first]] + offsets
+        pairs = codes[first].astype(np.int64) * len(other_names) + other_codes[second]
+        if len(names) * len(other_names) <= max(len(pairs), 1 << 20):
+            top = self._top(np.bincount(pairs, minlength=len(names) * len(other_names)), limit)
+        else:
+            # Two high-cardinality keys: count only the combinations present.
+            combinations, counts = np.unique(pairs, return_counts=True)
+            top = [(int(combinations[index]), count) for index, count in self._top(counts, limit)]
+        return [((names[pair // len(other_names)], other_names[pair % len(other_names)]), count) for pair, count in top]
+
+    def co_occurrence(self, mask: np.ndarray, key: str, value: Optional[str] = None, limit: int = 100) -> Tuple[int, List[Tuple[str, str, int]]]:
+        """
+        Documents carrying the anchor (``key=value``, or any label with ``key``)
+        among ``mask``, and the other labels most often carried alongside it.
+        """
+        anchored = mask & self.documents_with_label(key, value)
+        links = anchored[self.rows]
+        if value is None:
+            links &= self.label_keys[self.indices] != self._key_code(key)
+        else:
+            links &= self.indices != self.label_index.get((key, value), -1)
+        counts = np.bincount(self.indices[links], minlength=len(self.label_pairs))
+        return int(anchored.sum()), [self.label_pairs[label] + (count,) for label, count in self._top(counts, limit, self.label_rank)]
+
+
+# Background refreshes start at most this often, however many writes arrive meanwhile.
+REBUILD_INTERVAL = float(os.getenv("ANALYTICS_REBUILD_INTERVAL", "30"))
+
+
+class AnalyticsService:
+    """
+    Process-wide ``LabelMatrix``, refreshed from the database in the
+    background after writes published on ``service_events``. Refreshes are
+    coalesced: one starts at most every ``REBUILD_INTERVAL`` seconds and
+    takes in every write made until it starts. Queries read the last
+    complete matrix (its ``generated_at`` tells how fresh it is) unless they
+    ask to wait for the refresh.
+    """
+
+    def __init__(self):
+        self.matrix: Optional[LabelMatrix] = None
+        self.bind: Optional[AsyncEngine] = None
+        self.generation = 0
+        self.built_generation = -1
+        self.built_at = float("-inf")
+        self._lock: Optional[asyncio.Lock] = None
+        self._rebuild: Optional[asyncio.Task] = None
+        self.tracker = service_generations.Tracker(
+            (service_generations.DOCUMENTS, service_generations.LABELS, service_generations.DOCUMENT_TYPES)
+        )
+
+    def reset(self) -> None:
+        if self._rebuild is not None:
+            self._rebuild.cancel()
+        self.__init__()
+
+    async def _stream(self, session: AsyncSession, query) -> List[tuple]:
+        rows = []
+        result = await session.stream(query.execution_options(yield_per=BUILD_PARTITION))
+        async for partition in result.partitions():
+            rows.extend(partition)
+        return rows
+
+    async def _load(self, bind: AsyncEngine) -> LabelMatrix:
+        async with AsyncSession(bind) as session:
+            documents = await self._stream(session, (
+                select(type_coerce(model_document.Document.id, String), model_document_type.DocumentType.name)
+                .join(model_document_type.DocumentType, model_document_type.DocumentType.id == model_document.Document.type_id)
+            ))
+            labels = await self._stream(session, select(
+                type_coerce(model_label.Label.id, String), model_label.Label.key, model_label.Label.value
+            ))
+            edges = await self._stream(session, select(
+                type_coerce(document_label.c.document_id, String), type_coerce(document_label.c.label_id, String)
+            ))
+        return await asyncio.to_thread(
+            LabelMatrix,
+            [document_id for document_id, _ in documents],
+            [name for _, name in documents],
+            [tuple(label) for label in labels],
+            ([document_id for document_id, _ in edges], [label_id for _, label_id in edges])
+        )
+
+    async def build(self, bind: AsyncEngine) -> LabelMatrix:
+        """The matrix including every write published before the call, loaded unless already built."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        target = self.generation
+        async with self._lock:
+            # Writes published during a load are left to the next refresh rather than looping under steady ingest.
+            while self.matrix is None or not database.same_database(self.bind, bind) or self.built_generation < target:
+                generation = self.generation
+                self.built_at = time.monotonic()
+                matrix = await self._load(bind)
+                self.matrix, self.bind, self.built_generation = matrix, bind, generation
+                logger.info("Built label matrix of %d documents and %d links", matrix.document_count, matrix.link_count)
+            return self.matrix
+
+    async def get(self, db: AsyncSession, fresh: bool = False) -> LabelMatrix:
+        if self.tracker.changed_elsewhere():
+            # Another worker wrote; its events never reach this process.
+            self.invalidate(None)
+        matrix = self.matrix
+        if matrix is None or not database.same_database(self.bind, db.bind) or (fresh and self.built_generation != self.generation):
+            matrix = await self.build(db.bind)
+        return matrix
+
+    def invalidate(self, _) -> None:
+        self.generation += 1
+        if self.bind is None or (self._rebuild is not None and not self._rebuild.done()):
+            return
+        try:
+            self._rebuild = asyncio.get_running_loop().create_task(self._refresh())
+        except RuntimeError:
+            self.matrix = None
+
+    async def _refresh(self) -> None:
+        while self.bind is not None and self.built_generation != self.generation:
+            await asyncio.sleep(max(0.0, self.built_at + REBUILD_INTERVAL - time.monotonic()))
+            if self.bind is not None:
+                await self.build(self.bind)
+
+
+analytics = AnalyticsService()
+service_events.subscribe(service_events.DOCUMENTS_UPSERTED, analytics.invalidate)
+service_events.subscribe(service_events.DOCUMENTS_DELETED, analytics.invalidate)
+service_events.subscribe(service_events.LABELS_DELETED, analytics.invalidate)
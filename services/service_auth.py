@@ -8,6 +8,8 @@ from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import make_transient_to_detached
+from services import service_generations, service_tracing
 
 load_dotenv()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -15,6 +17,10 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "FIXED_SECRET_KEY_NOT_FOR_PRODUCTION")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 
+# Column values of authenticated users by uuid, dropped whenever any worker writes a user.
+users = service_generations.GenerationCache("auth_users", (service_generations.USERS,))
+
+@service_tracing.traced()
 def create_access_token(user_uuid: str, remember: bool = False) -> dict[str, str]:
     if remember:
         expire=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=30)
@@ -49,8 +55,20 @@ def verify_token(token:str = Depends(oauth2_scheme)) -> str:
         raise HTTPException(status_code=401, detail="Invalid token: {}".format(e))
 
 
+@service_tracing.traced()
 async def get_user_by_token(db: AsyncSession, access_token: str) -> model_user.User:
     user_uuid = verify_token(access_token)
+    values = users.get(user_uuid)
+    if values is not None:
+        # Attach a copy to this session without a query, as if it had been loaded.
+        user = model_user.User(**values)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    stamp = users.stamp()
     stmt = select(model_user.User).where(model_user.User.uuid == user_uuid)
     result = await db.execute(stmt)
-    return result.scalar_one_or_none()
\ No newline at end of file
+    user = result.scalar_one_or_none()
+    if user is not None:
+        users.put(user_uuid, {column.key: getattr(user, column.key) for column in model_user.User.__table__.columns}, stamp)
+    return user
\ No newline at end of file
@@ -0,0 +1,219 @@
+import asyncio
+import uuid
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+import database
+import models.model_document as model_document
+import models.model_label as model_label
+from models.model_relationship import document_label
+from services import service_events, service_log
+
+BUILD_PARTITION = 5000
+HUB_MIN_DEGREE = 8
+
+LabelEdge = Tuple[uuid.UUID, str, str]
+
+logger = service_log.get_logger("components")
+
+
+class ComponentIndex:
+    """
+    Connected components of the bipartite document/label graph in a union-find
+    (union by size, path halving). Every root keeps the documents of its
+    component, merged smaller into larger, so finding a document's component
+    is near O(1) and listing it is O(component size).
+
+    Union-find cannot split, so a change that removes an edge (a deleted
+    document or label, or a document losing labels) only marks the index
+    ``stale``; it must then be rebuilt.
+
+    The label to documents inverted index kept alongside gives every label's
+    degree, used to recognise hub labels during traversals.
+    """
+
+    def __init__(self):
+        self.parent: List[int] = []
+        self.size: List[int] = []
+        self.members: Dict[int, List[uuid.UUID]] = {}
+        self.document_nodes: Dict[uuid.UUID, int] = {}
+        self.label_nodes: Dict[uuid.UUID, int] = {}
+        self.document_labels: Dict[uuid.UUID, FrozenSet[uuid.UUID]] = {}
+        self.label_documents: Dict[uuid.UUID, List[uuid.UUID]] = {}
+        self.labels: Dict[uuid.UUID, Tuple[str, str]] = {}
+        self.label_ids: Dict[Tuple[str, str], uuid.UUID] = {}
+        self.stale = False
+
+    def _node(self) -> int:
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        return len(self.parent) - 1
+
+    def find(self, node: int) -> int:
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, first: int, second: int) -> int:
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return first
+        if self.size[first] < self.size[second]:
+            first, second = second, first
+        self.parent[second] = first
+        self.size[first] += self.size[second]
+        moved = self.members.pop(second, None)
+        if moved:
+            self.members.setdefault(first, []).extend(moved)
+        return first
+
+    def add(self, document_id: uuid.UUID, labels: Iterable[LabelEdge]) -> bool:
+        """Insert or update a document's ``(label id, key, value)`` edges; returns False (and goes stale) when edges were removed."""
+        labels = {label_id: (key, value) for label_id, key, value in labels}
+        label_ids = frozenset(labels)
+        previous = self.document_labels.get(document_id)
+        if previous is not None and not previous <= label_ids:
+            self.stale = True
+            return False
+        self.document_labels[document_id] = label_ids
+        for label_id in label_ids - (previous or frozenset()):
+            self.label_documents.setdefault(label_id, []).append(document_id)
+        for label_id, pair in labels.items():
+            self.labels[label_id] = pair
+            self.label_ids[pair] = label_id
+
+        node = self.document_nodes.get(document_id)
+        if node is None:
+            node = self.document_nodes[document_id] = self._node()
+            self.members[node] = [document_id]
+        for label_id in label_ids:
+            label_node = self.label_nodes.get(label_id)
+            if label_node is None:
+                label_node = self.label_nodes[label_id] = self._node()
+            node = self.union(node, label_node)
+        return True
+
+    def related(self, document_id: uuid.UUID) -> Optional[List[uuid.UUID]]:
+        """Every document connected to ``document_id`` through shared labels, itself included."""
+        node = self.document_nodes.get(document_id)
+        if node is None:
+            return None
+        return self.members[self.find(node)]
+
+    def component_count(self) -> int:
+        return len(self.members)
+
+    def degree(self, label_id: uuid.UUID) -> int:
+        return len(self.label_documents.get(label_id, ()))
+
+    def hub_degree(self, hub_ratio: float) -> float:
+        """Labels on more documents than this are hubs: a share of all documents, but never fewer than HUB_MIN_DEGREE."""
+        return max(HUB_MIN_DEGREE, hub_ratio * len(self.document_labels))
+
+
+class ComponentService:
+    """
+    Process-wide index kept current from ``service_events``: inserts are
+    applied incrementally, removals schedule a rebuild in a background task.
+    Other workers' changes arrive the same way through ``catch_up``. Until a
+    rebuild finishes, lookups use the stale index, so a component may still
+    include deleted documents or be joined through one; callers load the
+    documents afterwards, which drops the deleted ones.
+    """
+
+    def __init__(self):
+        self.index: Optional[ComponentIndex] = None
+        self.bind: Optional[AsyncEngine] = None
+        self.generation = 0
+        self._pending: Optional[List[Tuple[uuid.UUID, List[LabelEdge]]]] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._rebuild: Optional[asyncio.Task] = None
+
+    async def _load(self, bind: AsyncEngine) -> ComponentIndex:
+        index = ComponentIndex()
+        labels: Dict[uuid.UUID, List[LabelEdge]] = {}
+        async with AsyncSession(bind) as session:
+            rows = await session.stream(
+                select(model_document.Document.id, model_label.Label.id, model_label.Label.key, model_label.Label.value)
+                .outerjoin(document_label, document_label.c.document_id == model_document.Document.id)
+                .outerjoin(model_label.Label, model_label.Label.id == document_label.c.label_id)
+                .execution_options(yield_per=BUILD_PARTITION)
+            )
+            async for partition in rows.partitions():
+                for document_id, label_id, key, value in partition:
+                    document_labels = labels.setdefault(document_id, [])
+                    if label_id is not None:
+                        document_labels.append((label_id, key, value))
+        for count, (document_id, document_labels) in enumerate(labels.items(), 1):
+            index.add(document_id, document_labels)
+            if count % BUILD_PARTITION == 0:
+                await asyncio.sleep(0)
+        return index
+
+    async def build(self, bind: AsyncEngine) -> ComponentIndex:
+        """Rebuild from the database, replaying inserts published meanwhile; retries if a removal raced it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self.index is None or self.index.stale or not database.same_database(self.bind, bind):
+                # Other workers' writes logged before the load are in the database already.
+                service_events.catch_up()
+                generation = self.generation
+                self._pending = []
+                try:
+                    index = await self._load(bind)
+                    for document_id, document_labels in self._pending:
+                        index.add(document_id, document_labels)
+                finally:
+                    pending, self._pending = self._pending, None
+                if generation == self.generation and not index.stale:
+                    self.index, self.bind = index, bind
+                    logger.info(
+                        "Built %d components over %d documents and %d labels",
+                        index.component_count(), len(index.document_nodes), len(index.label_nodes)
+                    )
+            return self.index
+
+    async def get(self, db: AsyncSession) -> ComponentIndex:
+        """The index of ``db``'s database, built on first use."""
+        service_events.catch_up()
+        index = self.index
+        if index is None or not database.same_database(self.bind, db.bind):
+            index = await self.build(db.bind)
+        return index
+
+    async def related(self, db: AsyncSession, document_id: uuid.UUID) -> Optional[List[uuid.UUID]]:
+        return (await self.get(db)).related(document_id)
+
+    def _schedule_rebuild(self) -> None:
+        if self.bind is None or (self._rebuild is not None and not self._rebuild.done()):
+            return
+        try:
+            self._rebuild = asyncio.get_running_loop().create_task(self.build(self.bind))
+        except RuntimeError:
+            self.index = None
+
+    def on_upserted(self, documents: List[Tuple[uuid.UUID, List[LabelEdge]]]) -> None:
+        if self._pending is not None:
+            self._pending.extend(documents)
+        if self.index is None:
+            return
+        for document_id, document_labels in documents:
+            if not self.index.add(document_id, document_labels):
+                self.on_removed(None)
+                return
+
+    def on_removed(self, _) -> None:
+        self.generation += 1
+        if self.index is not None:
+            self.index.stale = True
+            self._schedule_rebuild()
+
+
+components = ComponentService()
+service_events.subscribe(service_events.DOCUMENTS_UPSERTED, components.on_upserted, remote=True)
+service_events.subscribe(service_events.DOCUMENTS_DELETED, components.on_removed, remote=True)
+service_events.subscribe(service_events.LABELS_DELETED, components.on_removed, remote=True)
+service_events.subscribe(service_events.MISSED, components.on_removed)
@@ -0,0 +1,153 @@
+import os
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+import database
+from services import service_generations, service_index_store, service_log
+
+DOCUMENTS_UPSERTED = "documents.upserted"
+DOCUMENTS_DELETED = "documents.deleted"
+LABELS_DELETED = "labels.deleted"
+# Published in process when writes made by other workers could not be replayed.
+MISSED = "events.missed"
+
+# Shared by every worker on the same database, like the generations file next to it.
+JOURNAL_FILE = database.shared_file(database.async_engine, "-events")
+# Records kept for workers that have not caught up yet; one that falls further behind gets MISSED.
+JOURNAL_RECORDS = int(os.getenv("EVENTS_JOURNAL_RECORDS", "10000"))
+
+logger = service_log.get_logger("events")
+
+_subscribers: Dict[str, List[Callable]] = defaultdict(list)
+_remote: Dict[str, List[Callable]] = defaultdict(list)
+
+
+def subscribe(topic: str, callback: Callable, remote: bool = False) -> Callable:
+    """
+    Call ``callback(payload)`` after every committed change published on
+    ``topic`` in this process; with ``remote``, also for the changes other
+    workers published, once ``catch_up`` reads them from the journal.
+    """
+    if callback not in _subscribers[topic]:
+        _subscribers[topic].append(callback)
+    if remote and callback not in _remote[topic]:
+        _remote[topic].append(callback)
+    return callback
+
+
+def unsubscribe(topic: str, callback: Callable) -> None:
+    for subscribers in (_subscribers, _remote):
+        if callback in subscribers[topic]:
+            subscribers[topic].remove(callback)
+
+
+def _dispatch(subscribers: Dict[str, List[Callable]], topic: str, payload) -> None:
+    for callback in list(subscribers[topic]):
+        try:
+            callback(payload)
+        except Exception:
+            logger.exception("Subscriber %s of %s failed", getattr(callback, "__qualname__", callback), topic)
+
+
+def _encode(topic: str, payload):
+    if topic == DOCUMENTS_UPSERTED:
+        return [
+            [document_id.hex, [[label_id.hex, key, value] for label_id, key, value in labels]]
+            for document_id, labels in payload
+        ]
+    return [identifier.hex for identifier in payload]
+
+
+def _decode(topic: str, payload):
+    if topic == DOCUMENTS_UPSERTED:
+        return [
+            (uuid.UUID(document_id), [(uuid.UUID(label_id), key, value) for label_id, key, value in labels])
+            for document_id, labels in payload
+        ]
+    return [uuid.UUID(identifier) for identifier in payload]
+
+
+class Journal:
+    """
+    Every published change, appended to a ``WriteAheadLog`` shared by the
+    workers so each can replay the others' writes into its in-memory indexes
+    instead of rebuilding them. A worker reads on from where it stopped and
+    skips its own records; it starts at the end, since whatever was logged
+    before is already in the database it loads from. Every ``JOURNAL_RECORDS``
+    appends the older half is dropped; a worker that had not read that far
+    gets ``MISSED``, as does every worker when there is no journal file and
+    only the shared generations tell that someone else wrote.
+    """
+
+    def __init__(self, path: Optional[str] = JOURNAL_FILE):
+        self.wal: Optional[service_index_store.WriteAheadLog] = None
+        self.tracker = service_generations.Tracker((service_generations.DOCUMENTS, service_generations.LABELS))
+        if path:
+            try:
+                self.wal = service_index_store.WriteAheadLog(path)
+                with self.wal.locked():
+                    self.wal.read()
+            except OSError:
+                logger.exception("Cannot share events through %s; other workers' writes are not replayed", path)
+                self.wal = None
+        self.seen = self.wal.sequence if self.wal is not None else 0
+
+    def _others(self, records) -> Optional[List[dict]]:
+        """The other workers' records among those read, or None if some were dropped before this worker read them."""
+        unseen = [(sequence, record) for sequence, record in records if sequence > self.seen]
+        if not unseen:
+            return []
+        missed = unseen[0][0] != self.seen + 1 or unseen[0][1].get("op") == self.wal.CHECKPOINT
+        self.seen = unseen[-1][0]
+        if missed:
+            return None
+        return [record for _, record in unseen if record.get("pid") != os.getpid() and record.get("topic") in _remote]
+
+    def _replay(self, records: Optional[List[dict]]) -> None:
+        if records is None:
+            logger.warning("Missed writes of other workers; rebuilding from the database")
+            _dispatch(_subscribers, MISSED, None)
+            return
+        for record in records:
+            _dispatch(_remote, record["topic"], _decode(record["topic"], record["payload"]))
+
+    def catch_up(self) -> None:
+        if self.wal is None:
+            if self.tracker.changed_elsewhere():
+                self._replay(None)
+            return
+        try:
+            records = self._others(self.wal.read())
+        except OSError:
+            logger.exception("Cannot read the events journal")
+            return
+        self._replay(records)
+
+    def append(self, topic: str, payload) -> None:
+        """Log a change this worker published; records others logged first are replayed before it returns."""
+        if self.wal is None:
+            return
+        try:
+            with self.wal.locked():
+                records = self._others(self.wal.read())
+                self.seen = self.wal.append({"pid": os.getpid(), "topic": topic, "payload": _encode(topic, payload)})
+                if self.seen % JOURNAL_RECORDS == 0:
+                    self.wal.truncate(self.seen - JOURNAL_RECORDS // 2)
+        except OSError:
+            logger.exception("Cannot append to the events journal; other workers will rebuild")
+            return
+        self._replay(records)
+
+
+journal = Journal()
+
+
+def catch_up() -> None:
+    """Replay the changes other workers published since the last call to this process's remote subscribers."""
+    journal.catch_up()
+
+
+def publish(topic: str, payload) -> None:
+    """Notify the subscribers of ``topic`` and log the change for other workers; a failing subscriber is logged and never fails the write."""
+    _dispatch(_subscribers, topic, payload)
+    journal.append(topic, payload)
@@ -0,0 +1,146 @@
+import fcntl
+import mmap
+import os
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, Sequence, Tuple, TypeVar
+import database
+from services import service_log, service_metrics
+
+DOCUMENTS = "documents"
+LABELS = "labels"
+DOCUMENT_TYPES = "document_types"
+USERS = "users"
+NAMESPACES = (DOCUMENTS, LABELS, DOCUMENT_TYPES, USERS)
+
+# Shared by every worker on the same database; none for an in-memory one, which no other process sees.
+GENERATIONS_FILE = database.shared_file(database.async_engine, "-generations")
+_SIZE = mmap.PAGESIZE
+
+logger = service_log.get_logger("generations")
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+Stamp = Tuple[int, ...]
+
+
+class Generations:
+    """
+    One counter per namespace in a small memory-mapped file, bumped after
+    every committed write to that namespace by whichever worker made it.
+    Bumps take an ``flock`` on the file; reads are a plain load from the
+    shared page, so checking whether anything changed costs nanoseconds.
+    Without a file the counters are private to the process.
+
+    Each process also counts its own bumps, so a ``Tracker`` can tell writes
+    made elsewhere (which it must invalidate on) from its own (which
+    ``service_events`` already delivered in process).
+    """
+
+    def __init__(self, path: Optional[str] = GENERATIONS_FILE):
+        self._descriptor: Optional[int] = None
+        if path:
+            try:
+                self._descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+                if os.fstat(self._descriptor).st_size < _SIZE:
+                    os.ftruncate(self._descriptor, _SIZE)
+                self.map = mmap.mmap(self._descriptor, _SIZE)
+            except OSError:
+                logger.exception("Cannot share generations through %s; invalidation stays within this process", path)
+                self._descriptor = None
+        if self._descriptor is None:
+            self.map = mmap.mmap(-1, _SIZE)
+        self.counters = memoryview(self.map).cast("Q")
+        self.local = [0] * len(NAMESPACES)
+
+    @staticmethod
+    def _slot(namespace: str) -> int:
+        return NAMESPACES.index(namespace)
+
+    def current(self, namespace: str) -> int:
+        return self.counters[self._slot(namespace)]
+
+    def stamp(self, namespaces: Sequence[str]) -> Stamp:
+        return tuple(self.counters[self._slot(namespace)] for namespace in namespaces)
+
+    def bump(self, *namespaces: str) -> None:
+        if self._descriptor is not None:
+            fcntl.flock(self._descriptor, fcntl.LOCK_EX)
+        try:
+            for namespace in namespaces:
+                slot = self._slot(namespace)
+                self.counters[slot] += 1
+                self.local[slot] += 1
+        finally:
+            if self._descriptor is not None:
+                fcntl.flock(self._descriptor, fcntl.LOCK_UN)
+
+
+class Tracker:
+    """Tells whether another process wrote to ``namespaces`` since the last check."""
+
+    def __init__(self, namespaces: Sequence[str]):
+        self.slots = [Generations._slot(namespace) for namespace in namespaces]
+        self.seen = self._observe()
+
+    def _observe(self) -> Tuple[Tuple[int, int], ...]:
+        return tuple((generations.counters[slot], generations.local[slot]) for slot in self.slots)
+
+    def changed_elsewhere(self) -> bool:
+        now = self._observe()
+        changed = any(
+            shared - seen_shared != local - seen_local
+            for (shared, local), (seen_shared, seen_local) in zip(now, self.seen)
+        )
+        self.seen = now
+        return changed
+
+
+class GenerationCache(Generic[K, V]):
+    """
+    Per-process LRU cache whose entries hold while the generations of its
+    ``namespaces`` are unchanged, i.e. until any worker writes to them. Take
+    the ``stamp`` before reading what is cached, so a write racing the read
+    leaves the entry already stale:
+
+        stamp = cache.stamp()
+        value = await load(key)
+        cache.put(key, value, stamp)
+    """
+
+    def __init__(self, name: str, namespaces: Sequence[str], maxsize: int = 1024):
+        self.name = name
+        self.namespaces = tuple(namespaces)
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[K, Tuple[Stamp, V]]" = OrderedDict()
+
+    def stamp(self) -> Stamp:
+        return generations.stamp(self.namespaces)
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self.entries.get(key)
+        hit = entry is not None and entry[0] == self.stamp()
+        service_metrics.record_cache(self.name, hit)
+        if not hit:
+            if entry is not None:
+                del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: K, value: V, stamp: Stamp) -> None:
+        self.entries[key] = (stamp, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+generations = Generations()
+
+
+def bump(*namespaces: str) -> None:
+    """Record committed writes to ``namespaces``; call after the commit, for every worker's caches."""
+    generations.bump(*namespaces)
@@ -0,0 +1,690 @@
+import asyncio
+import bisect
+import copy
+import os
+import uuid
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import String, func, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+import database
+import models.model_document as model_document
+import models.model_label as model_label
+from models.model_relationship import document_label
+from services import service_events, service_index_store, service_log, service_label
+from services.service_components import BUILD_PARTITION, HUB_MIN_DEGREE
+
+INDEX_DIR = os.getenv("GRAPH_INDEX_DIR")
+CHECKPOINT_RECORDS = int(os.getenv("GRAPH_CHECKPOINT_RECORDS", "1000"))
+SNAPSHOT_FILE = "graph.{:012d}.idx"
+WAL_FILE = "graph.wal"
+CHECKPOINT_LOCK = "graph.checkpoint.lock"
+# Ids are stored as their 32-character hex form.
+ID_WIDTH = 32
+
+logger = service_log.get_logger("graph")
+
+# Previous document and the label shared with it, (-1, -1) at either end.
+Parent = Tuple[int, int]
+
+
+def _csr(sources: array, targets: array, nodes: int) -> Tuple[array, array]:
+    """Counting sort of ``(source, target)`` edges into offsets/targets arrays."""
+    offsets = array("q", bytes(8 * (nodes + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for node in range(nodes):
+        offsets[node + 1] += offsets[node]
+    cursor = offsets[:-1]
+    adjacent = array("i", bytes(4 * len(sources)))
+    for source, target in zip(sources, targets):
+        adjacent[cursor[source]] = target
+        cursor[source] += 1
+    return offsets, adjacent
+
+
+class LabelGraph:
+    """
+    The bipartite document/label graph in compressed sparse row form:
+    documents and labels are numbered densely in order of their hex id, and
+    ``document_labels[document_offsets[d]:document_offsets[d + 1]]`` are the
+    labels of document ``d`` (likewise ``label_documents`` for the documents
+    of a label). Two shared ``array`` pairs instead of a Python set per node
+    keep a large inventory in a few bytes per edge, and are exactly what
+    ``save`` writes to disk and ``open`` maps back without copying.
+
+    The CSR base is never modified. Writes go to a small overlay on top of it
+    (new documents and labels numbered after the base ones, the current labels
+    of every changed document, deleted labels) until ``compact`` folds them
+    into a new base.
+    """
+
+    def __init__(
+        self,
+        documents: Sequence[str],
+        label_ids: Sequence[str],
+        label_keys: Sequence[str],
+        label_values: Sequence[str],
+        document_csr: Tuple[Sequence[int], Sequence[int]],
+        label_csr: Tuple[Sequence[int], Sequence[int]]
+    ):
+        self.documents, self.label_ids = documents, label_ids
+        self.label_keys, self.label_values = label_keys, label_values
+        self.document_offsets, self.document_labels = document_csr
+        self.label_offsets, self.label_documents = label_csr
+        self.base_documents, self.base_labels = len(documents), len(label_ids)
+        self.new_documents: List[str] = []
+        self.new_document_index: Dict[str, int] = {}
+        self.new_labels: List[Tuple[str, str, str]] = []
+        self.new_label_index: Dict[str, int] = {}
+        # Current labels of every document written since the base, () once deleted.
+        self.changed: Dict[int, Tuple[int, ...]] = {}
+        # Changed documents carrying each label; they are left out of the base postings.
+        self.added: Dict[int, Set[int]] = {}
+        # Base documents left out of each base label's postings, so only those postings need filtering.
+        self.removed: Dict[int, int] = {}
+        self.deleted_documents = 0
+        self.deleted_labels: Set[int] = set()
+
+    @classmethod
+    def from_edges(cls, documents: List[str], labels: List[Tuple[str, str, str]], edges: Tuple[array, array]) -> "LabelGraph":
+        """Graph of ``documents`` and ``(id, key, value)`` labels, both sorted by hex id, and ``(document, label)`` edges by position."""
+        return cls(
+            documents,
+            [label_id for label_id, _, _ in labels],
+            [key for _, key, _ in labels],
+            [value for _, _, value in labels],
+            _csr(edges[0], edges[1], len(documents)),
+            _csr(edges[1], edges[0], len(labels))
+        )
+
+    @staticmethod
+    def _find(ids: Sequence[str], identifier: str) -> Optional[int]:
+        position = bisect.bisect_left(ids, identifier)
+        return position if position < len(ids) and ids[position] == identifier else None
+
+    def _document(self, identifier: str) -> Optional[int]:
+        document = self._find(self.documents, identifier)
+        return document if document is not None else self.new_document_index.get(identifier)
+
+    def _label(self, identifier: str) -> Optional[int]:
+        label = self._find(self.label_ids, identifier)
+        return label if label is not None else self.new_label_index.get(identifier)
+
+    def index_of(self, document_id: uuid.UUID) -> Optional[int]:
+        document = self._document(document_id.hex)
+        if document is None or self.changed.get(document) == ():
+            return None
+        return document
+
+    def document_id(self, document: int) -> uuid.UUID:
+        return uuid.UUID(self._document_hex(document))
+
+    def _document_hex(self, document: int) -> str:
+        if document < self.base_documents:
+            return self.documents[document]
+        return self.new_documents[document - self.base_documents]
+
+    def label_pair(self, label: int) -> Tuple[str, str]:
+        if label < self.base_labels:
+            return self.label_keys[label], self.label_values[label]
+        _, key, value = self.new_labels[label - self.base_labels]
+        return key, value
+
+    @property
+    def document_count(self) -> int:
+        return self.base_documents + len(self.new_documents) - self.deleted_documents
+
+    @property
+    def label_count(self) -> int:
+        return self.base_labels + len(self.new_labels) - len(self.deleted_labels)
+
+    def edge_count(self) -> int:
+        if not self.changed:
+            return len(self.document_labels)
+        return sum(len(self.labels_of(document)) for document in range(self.base_documents + len(self.new_documents)))
+
+    def labels_of(self, document: int) -> Sequence[int]:
+        labels = self.changed.get(document)
+        if labels is not None:
+            return labels
+        return self.document_labels[self.document_offsets[document]:self.document_offsets[document + 1]]
+
+    def documents_of(self, label: int) -> Sequence[int]:
+        if label < self.base_labels:
+            documents = self.label_documents[self.label_offsets[label]:self.label_offsets[label + 1]]
+            if self.removed.get(label):
+                documents = [document for document in documents if document not in self.changed]
+        else:
+            documents = []
+        added = self.added.get(label)
+        return documents if not added else list(documents) + sorted(added)
+
+    def degree(self, label: int) -> int:
+        degree = len(self.added.get(label, ()))
+        if label < self.base_labels:
+            degree += self.label_offsets[label + 1] - self.label_offsets[label] - self.removed.get(label, 0)
+        return degree
+
+    def upsert(self, document_id: str, labels: Iterable[Tuple[str, str, str]]) -> None:
+        """Replace the labels of a document (hex id), adding it if it is new; labels are ``(hex id, key, value)``."""
+        document = self._document(document_id)
+        if document is None:
+            document = self.new_document_index[document_id] = self.base_documents + len(self.new_documents)
+            self.new_documents.append(document_id)
+        elif self.changed.get(document) == ():
+            self.deleted_documents -= 1
+        indices = []
+        for label_id, key, value in labels:
+            label = self._label(label_id)
+            if label is None:
+                label = self.new_label_index[label_id] = self.base_labels + len(self.new_labels)
+                self.new_labels.append((label_id, key, value))
+            indices.append(label)
+        self._change(document, tuple(indices))
+
+    def delete(self, document_id: str) -> None:
+        document = self._document(document_id)
+        if document is not None and self.changed.get(document) != ():
+            self._change(document, ())
+            self.deleted_documents += 1
+
+    def delete_label(self, label_id: str) -> None:
+        label = self._label(label_id)
+        if label is not None:
+            self.deleted_labels.add(label)
+
+    def _change(self, document: int, labels: Tuple[int, ...]) -> None:
+        if document < self.base_documents and document not in self.changed:
+            for label in self.document_labels[self.document_offsets[document]:self.document_offsets[document + 1]]:
+                self.removed[label] = self.removed.get(label, 0) + 1
+        for label in self.changed.get(document, ()):
+            self.added[label].discard(document)
+        self.changed[document] = labels
+        for label in labels:
+            self.added.setdefault(label, set()).add(document)
+
+    def copy(self) -> "LabelGraph":
+        """Same base, own overlay: a snapshot ``compact`` can read in a thread while writes go on."""
+        graph = copy.copy(self)
+        graph.new_documents, graph.new_document_index = list(self.new_documents), dict(self.new_document_index)
+        graph.new_labels, graph.new_label_index = list(self.new_labels), dict(self.new_label_index)
+        graph.changed = dict(self.changed)
+        graph.added = {label: set(documents) for label, documents in self.added.items()}
+        graph.removed = dict(self.removed)
+        graph.deleted_labels = set(self.deleted_labels)
+        return graph
+
+    def compact(self) -> "LabelGraph":
+        """A new graph holding base and overlay in CSR form, renumbered by hex id."""
+        documents = sorted(
+            (self._document_hex(document), document)
+            for document in range(self.base_documents + len(self.new_documents))
+            if self.changed.get(document) != ()
+        )
+        labels = sorted(
+            (self.label_ids[label] if label < self.base_labels else self.new_labels[label - self.base_labels][0], label)
+            for label in range(self.base_labels + len(self.new_labels))
+            if label not in self.deleted_labels
+        )
+        label_positions = {label: position for position, (_, label) in enumerate(labels)}
+        sources, targets = array("i"), array("i")
+        for position, (_, document) in enumerate(documents):
+            for label in self.labels_of(document):
+                target = label_positions.get(label)
+                if target is not None:
+                    sources.append(position)
+                    targets.append(target)
+        return LabelGraph.from_edges(
+            [document_id for document_id, _ in documents],
+            [(label_id,) + self.label_pair(label) for label_id, label in labels],
+            (sources, targets)
+        )
+
+    def save(self, path: str, wal_sequence: int) -> None:
+        """Write the base (call on a compacted graph) as an index file including the WAL up to ``wal_sequence``."""
+        key_offsets, keys = service_index_store.pack_strings(self.label_keys)
+        value_offsets, values = service_index_store.pack_strings(self.label_values)
+        service_index_store.write(path, [
+            service_index_store.pack_fixed(self.documents),
+            service_index_store.pack_fixed(self.label_ids),
+            key_offsets, keys, value_offsets, values,
+            self.document_offsets.tobytes(), self.document_labels.tobytes(),
+            self.label_offsets.tobytes(), self.label_documents.tobytes()
+        ], wal_sequence)
+
+    @classmethod
+    def open(cls, path: str) -> Tuple["LabelGraph", int]:
+        """Map an index file written by ``save``; returns the graph and the last WAL sequence it includes."""
+        index = service_index_store.MappedIndex(path)
+        return cls(
+            service_index_store.FixedStrings(index.sections[0], ID_WIDTH),
+            service_index_store.FixedStrings(index.sections[1], ID_WIDTH),
+            service_index_store.Strings(index.longs(2), index.sections[3]),
+            service_index_store.Strings(index.longs(4), index.sections[5]),
+            (index.longs(6), index.ints(7)),
+            (index.longs(8), index.ints(9))
+        ), index.wal_sequence
+
+    def _follows(self, options: service_label.TraversalOptions, skipped_hubs: Optional[Set[int]]):
+        """A cached predicate telling whether a label may be followed under ``options``."""
+        hub_degree = max(HUB_MIN_DEGREE, options.hub_ratio * self.document_count)
+        decided: Dict[int, bool] = {}
+
+        def follows(label: int) -> bool:
+            allowed = decided.get(label)
+            if allowed is None:
+                key = self.label_pair(label)[0]
+                allowed = label not in self.deleted_labels and key not in options.deny_keys and (options.allow_keys is None or key in options.allow_keys)
+                if allowed and options.skip_hubs and self.degree(label) > hub_degree:
+                    allowed = False
+                    if skipped_hubs is not None:
+                        skipped_hubs.add(label)
+                decided[label] = allowed
+            return allowed
+        return follows
+
+    def _expand(self, frontier: List[int], parents: Dict[int, Parent], followed: Set[int], follows) -> List[int]:
+        expanded = []
+        for document in frontier:
+            for label in self.labels_of(document):
+                if label in followed or not follows(label):
+                    continue
+                followed.add(label)
+                for related in self.documents_of(label):
+                    if related not in parents:
+                        parents[related] = (document, label)
+                        expanded.append(related)
+        return expanded
+
+    def shortest_path(
+        self,
+        source: int,
+        target: int,
+        options: service_label.TraversalOptions = service_label.TraversalOptions()
+    ) -> Optional[List[Tuple[int, int]]]:
+        """
+        Fewest-hop path from ``source`` to ``target`` as ``(document, label)``
+        steps, the label being the one shared with the previous document (-1
+        for the source), or None if there is none within ``max_depth`` hops.
+
+        Bidirectional breadth-first search: each round expands whichever side
+        has the smaller frontier by one full hop, so the explored area grows
+        from both ends and stays around the square root of a one-sided search.
+        """
+        if source == target:
+            return [(source, -1)]
+        follows = self._follows(options, None)
+        forward: Dict[int, Parent] = {source: (-1, -1)}
+        backward: Dict[int, Parent] = {target: (-1, -1)}
+        forward_frontier, backward_frontier = [source], [target]
+        forward_followed, backward_followed = set(), set()
+        depth = 0
+        while forward_frontier and backward_frontier and depth < options.max_depth:
+            depth += 1
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier = self._expand(forward_frontier, forward, forward_followed, follows)
+                meeting = [document for document in forward_frontier if document in backward]
+            else:
+                backward_frontier = self._expand(backward_frontier, backward, backward_followed, follows)
+                meeting = [document for document in backward_frontier if document in forward]
+            if meeting:
+                return min((self._join(document, forward, backward) for document in meeting), key=len)
+        return None
+
+    @staticmethod
+    def _join(meeting: int, forward: Dict[int, Parent], backward: Dict[int, Parent]) -> List[Tuple[int, int]]:
+        path = []
+        document = meeting
+        while document != -1:
+            parent, via = forward[document]
+            path.append((document, via))
+            document = parent
+        path.reverse()
+        document = meeting
+        while True:
+            parent, via = backward[document]
+            if parent == -1:
+                return path
+            path.append((parent, via))
+            document = parent
+
+    def neighbourhood(
+        self,
+        source: int,
+        hops: int,
+        options: service_label.TraversalOptions = service_label.TraversalOptions(),
+        skipped_hubs: Optional[Set[int]] = None
+    ) -> List[Tuple[List[int], int]]:
+        """Documents first reached at each hop up to ``hops`` away, with the number of labels followed to reach them."""
+        follows = self._follows(options, skipped_hubs)
+        visited = {source}
+        followed = set()
+        frontier = [source]
+        result = [(frontier, 0)]
+        for _ in range(hops):
+            labels = 0
+            expanded = []
+            for document in frontier:
+                for label in self.labels_of(document):
+                    if label in followed:
+                        continue
+                    followed.add(label)
+                    if not follows(label):
+                        continue
+                    labels += 1
+                    for related in self.documents_of(label):
+                        if related not in visited:
+                            visited.add(related)
+                            expanded.append(related)
+            if not expanded:
+                break
+            frontier = expanded
+            result.append((frontier, labels))
+        return result
+
+
+class GraphService:
+    """
+    Process-wide ``LabelGraph`` kept current from ``service_events``: every
+    write is applied to the graph's overlay as it is published, so queries
+    always see the latest write without a rebuild. Without a shared
+    directory, other workers' writes are replayed from the events journal
+    the same way; if some were missed, the graph is reloaded in the
+    background while queries keep using the current one.
+
+    With ``GRAPH_INDEX_DIR`` set, every worker process shares one graph
+    there. Snapshots are versioned index files (``graph.<sequence>.idx``)
+    named by the ``CURRENT`` file; workers map the current one read-only, so
+    the CSR arrays live once in the page cache however many workers there are,
+    and each keeps only its overlay. Writes from any worker are appended to
+    the shared write-ahead log, and every worker tails it before answering.
+    Whichever worker sees ``CHECKPOINT_RECORDS`` logged writes first takes
+    the checkpoint lock, compacts, writes the next snapshot and repoints
+    ``CURRENT``; the others notice the new pointer and swap to it between
+    requests. A snapshot is trusted at startup only if it holds as many
+    documents as the database; otherwise it is rebuilt from the database.
+    """
+
+    def __init__(self, directory: Optional[str] = INDEX_DIR):
+        self.graph: Optional[LabelGraph] = None
+        self.bind: Optional[AsyncEngine] = None
+        self.directory = directory
+        self.wal = service_index_store.WriteAheadLog(os.path.join(directory, WAL_FILE)) if directory else None
+        # Sequence of the last write applied to the graph, and the writes applied since its snapshot.
+        self.applied = 0
+        self.unsaved: List[Tuple[int, dict]] = []
+        self._pointer: Optional[Tuple[int, int]] = None
+        self._pending: Optional[List[dict]] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._checkpoint: Optional[asyncio.Task] = None
+        self._reload: Optional[asyncio.Task] = None
+
+    def reset(self) -> None:
+        """Forget the graph and any checkpoint, e.g. when the event loop it was built on is gone."""
+        if self.wal is not None:
+            self.wal.close()
+        if self._reload is not None:
+            self._reload.cancel()
+        self.__init__(self.directory)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    async def _load(self, bind: AsyncEngine) -> LabelGraph:
+        # Ids are read as their stored hex text: building a uuid.UUID per
+        # edge endpoint is most of the load time on large inventories.
+        documents: List[str] = []
+        labels: List[Tuple[str, str, str]] = []
+        sources, targets = array("i"), array("i")
+        async with AsyncSession(bind) as session:
+            rows = await session.stream(
+                select(type_coerce(model_document.Document.id, String)).execution_options(yield_per=BUILD_PARTITION)
+            )
+            async for partition in rows.partitions():
+                documents.extend(document_id for document_id, in partition)
+            rows = await session.stream(
+                select(type_coerce(model_label.Label.id, String), model_label.Label.key, model_label.Label.value)
+                .execution_options(yield_per=BUILD_PARTITION)
+            )
+            async for partition in rows.partitions():
+                labels.extend(tuple(row) for row in partition)
+            documents.sort()
+            labels.sort()
+
+            document_index = {document_id: index for index, document_id in enumerate(documents)}
+            label_index = {label_id: index for index, (label_id, _, _) in enumerate(labels)}
+            rows = await session.stream(
+                select(type_coerce(document_label.c.document_id, String), type_coerce(document_label.c.label_id, String))
+                .execution_options(yield_per=BUILD_PARTITION)
+            )
+            async for partition in rows.partitions():
+                for document_id, label_id in partition:
+                    document, label = document_index.get(document_id), label_index.get(label_id)
+                    if document is not None and label is not None:
+                        sources.append(document)
+                        targets.append(label)
+        # Sorting the edges into CSR is pure Python; a thread keeps the loop responsive meanwhile.
+        return await asyncio.to_thread(LabelGraph.from_edges, documents, labels, (sources, targets))
+
+    def _attach(self) -> None:
+        """Map the snapshot ``CURRENT`` points at; the log is then replayed from the start."""
+        self._pointer = service_index_store.pointer(self.directory)
+        self.graph, self.applied = LabelGraph.open(self._path(service_index_store.current(self.directory)))
+        self.unsaved = []
+        self.wal.rewind()
+
+    def _refresh(self) -> None:
+        """Swap to a newer snapshot if one was published, then apply the writes other workers logged."""
+        if service_index_store.pointer(self.directory) != self._pointer:
+            self._attach()
+        records = [(sequence, record) for sequence, record in self.wal.read() if sequence > self.applied]
+        if records and (records[0][0] != self.applied + 1 or records[0][1]["op"] == self.wal.CHECKPOINT):
+            # A checkpoint landed between reading CURRENT and the log: its records are in the new snapshot.
+            self._attach()
+            records = [(sequence, record) for sequence, record in self.wal.read() if sequence > self.applied]
+        for sequence, record in records:
+            self._apply(self.graph, record)
+            self.applied = sequence
+            self.unsaved.append((sequence, record))
+        self._schedule_checkpoint()
+
+    async def _rebuild(self, bind: AsyncEngine) -> None:
+        """Under the checkpoint lock: snapshot the database as the next version; writes logged meanwhile stay in the log."""
+        with self.wal.locked():
+            self.wal.repair()
+            loaded = self.wal.sequence
+        graph = await self._load(bind)
+        name = SNAPSHOT_FILE.format(loaded)
+        await asyncio.to_thread(graph.save, self._path(name), loaded)
+        self._publish(name, loaded)
+
+    def _publish(self, name: str, sequence: int) -> None:
+        previous = service_index_store.current(self.directory)
+        service_index_store.publish(self.directory, name)
+        with self.wal.locked():
+            self.wal.truncate(sequence)
+        # Workers still on the previous version may be about to map it; older
+        # ones can go, and any still mapped stay readable until unmapped.
+        for file in os.listdir(self.directory):
+            if file.startswith("graph.") and file.endswith(".idx") and file not in (name, previous):
+                os.remove(self._path(file))
+
+    async def _count_documents(self, bind: AsyncEngine) -> int:
+        async with AsyncSession(bind) as session:
+            return await session.scalar(select(func.count()).select_from(model_document.Document))
+
+    async def _open(self, bind: AsyncEngine) -> LabelGraph:
+        """Attach to the shared snapshot, first building it from the database if it is missing or does not match."""
+        stale = None
+        while True:
+            pointer = service_index_store.pointer(self.directory)
+            if pointer is not None and pointer != stale:
+                try:
+                    self._attach()
+                    self._refresh()
+                except (service_index_store.CorruptIndex, ValueError, TypeError, OSError):
+                    logger.exception("Ignoring unreadable graph snapshot")
+                    self.graph = None
+                if self.graph is not None and (stale is not None or self.graph.document_count == await self._count_documents(bind)):
+                    return self.graph
+                logger.warning("Graph snapshot does not match the database; rebuilding")
+                stale = pointer
+            with service_index_store.exclusive(self._path(CHECKPOINT_LOCK)) as building:
+                if building:
+                    await self._rebuild(bind)
+                    stale = None
+                    self._pointer = None
+            if not building:
+                # Another worker is building; attach to whatever it publishes.
+                await asyncio.sleep(0.1)
+                continue
+            self._attach()
+            self._refresh()
+            return self.graph
+
+    async def build(self, bind: AsyncEngine) -> LabelGraph:
+        """Attach to the shared snapshot, or load from the database replaying writes published meanwhile."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.graph is not None and database.same_database(self.bind, bind):
+                return self.graph
+            graph = await (self._open(bind) if self.directory else self._load_replaying(bind))
+            self.graph, self.bind = graph, bind
+            logger.info(
+                "Loaded label graph of %d documents, %d labels and %d edges",
+                graph.document_count, graph.label_count, graph.edge_count()
+            )
+            return self.graph
+
+    async def _load_replaying(self, bind: AsyncEngine) -> LabelGraph:
+        # Other workers' writes logged before the load are in the database already.
+        service_events.catch_up()
+        self._pending = []
+        try:
+            graph = await self._load(bind)
+            for record in self._pending:
+                self._apply(graph, record)
+        finally:
+            self._pending = None
+        self.unsaved = []
+        return graph
+
+    async def _reload_graph(self, bind: AsyncEngine) -> None:
+        async with self._lock:
+            graph = await self._load_replaying(bind)
+            if database.same_database(self.bind, bind):
+                self.graph = graph
+                logger.info("Reloaded label graph of %d documents after missed writes", graph.document_count)
+
+    async def get(self, db: AsyncSession) -> LabelGraph:
+        if not self.directory:
+            service_events.catch_up()
+        if self.graph is None or not database.same_database(self.bind, db.bind):
+            return await self.build(db.bind)
+        if self.directory:
+            self._refresh()
+        return self.graph
+
+    async def checkpoint(self) -> None:
+        """Fold the overlay into a new CSR base, published as the next snapshot when shared."""
+        if not self.directory:
+            current, applied = self.graph, self.applied
+            if current is None:
+                return
+            compacted = await asyncio.to_thread(current.copy().compact)
+            if self.graph is not current:
+                # Reloaded meanwhile.
+                return
+            self.unsaved = [(sequence, record) for sequence, record in self.unsaved if sequence > applied]
+            for _, record in self.unsaved:
+                self._apply(compacted, record)
+            self.graph = compacted
+            return
+        with service_index_store.exclusive(self._path(CHECKPOINT_LOCK)) as checkpointing:
+            if not checkpointing:
+                return
+            self._refresh()
+            graph, applied = self.graph.copy(), self.applied
+            compacted = await asyncio.to_thread(graph.compact)
+            name = SNAPSHOT_FILE.format(applied)
+            await asyncio.to_thread(compacted.save, self._path(name), applied)
+            self._publish(name, applied)
+        self._refresh()
+        logger.info("Published label graph snapshot of %d documents at write %d", compacted.document_count, applied)
+
+    def _schedule_checkpoint(self) -> None:
+        if len(self.unsaved) < CHECKPOINT_RECORDS or (self._checkpoint is not None and not self._checkpoint.done()):
+            return
+        try:
+            self._checkpoint = asyncio.get_running_loop().create_task(self.checkpoint())
+        except RuntimeError:
+            pass
+
+    @staticmethod
+    def _apply(graph: LabelGraph, record: dict) -> None:
+        if record["op"] == "upsert":
+            for document_id, labels in record["documents"]:
+                graph.upsert(document_id, labels)
+        elif record["op"] == "delete":
+            for document_id in record["documents"]:
+                graph.delete(document_id)
+        elif record["op"] == "delete_labels":
+            for label_id in record["labels"]:
+                graph.delete_label(label_id)
+
+    def _record(self, record: dict) -> None:
+        if self.wal is None:
+            if self._pending is not None:
+                self._pending.append(record)
+            if self.graph is not None:
+                self._apply(self.graph, record)
+                self.applied += 1
+                self.unsaved.append((self.applied, record))
+                self._schedule_checkpoint()
+            return
+        with self.wal.locked():
+            # Catch up first, so this write lands after every write already logged.
+            if self.graph is not None:
+                self._refresh()
+            else:
+                self.wal.read()
+            sequence = self.wal.append(record)
+        if self.graph is not None and sequence == self.applied + 1:
+            self._apply(self.graph, record)
+            self.applied = sequence
+            self.unsaved.append((sequence, record))
+            self._schedule_checkpoint()
+
+    def on_upserted(self, documents) -> None:
+        self._record({
+            "op": "upsert",
+            "documents": [
+                [document_id.hex, [[label_id.hex, key, value] for label_id, key, value in labels]]
+                for document_id, labels in documents
+            ]
+        })
+
+    def on_deleted(self, document_ids) -> None:
+        self._record({"op": "delete", "documents": [document_id.hex for document_id in document_ids]})
+
+    def on_labels_deleted(self, label_ids) -> None:
+        self._record({"op": "delete_labels", "labels": [label_id.hex for label_id in label_ids]})
+
+    def on_missed(self, _) -> None:
+        """Other workers' writes were lost: reload in the background; a shared graph has its own log."""
+        if self.directory or self.graph is None or (self._reload is not None and not self._reload.done()):
+            return
+        try:
+            self._reload = asyncio.get_running_loop().create_task(self._reload_graph(self.bind))
+        except RuntimeError:
+            self.graph = None
+
+
+graph = GraphService()
+# A shared graph reads other workers' writes from its own log.
+service_events.subscribe(service_events.DOCUMENTS_UPSERTED, graph.on_upserted, remote=not graph.directory)
+service_events.subscribe(service_events.DOCUMENTS_DELETED, graph.on_deleted, remote=not graph.directory)
+service_events.subscribe(service_events.LABELS_DELETED, graph.on_labels_deleted, remote=not graph.directory)
+service_events.subscribe(service_events.MISSED, graph.on_missed)
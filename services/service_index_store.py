@@ -0,0 +1,295 @@
+import contextlib
+import fcntl
+import os
+import json
+import mmap
+import struct
+import zlib
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+MAGIC = b"ATHIDX01"
+CURRENT = "CURRENT"
+# magic, section count, WAL sequence the file includes, then per section (offset, length).
+_HEADER = struct.Struct("<8sIQ")
+_SECTION = struct.Struct("<QQ")
+_ALIGN = 8
+
+
+class CorruptIndex(Exception):
+    pass
+
+
+class FixedStrings(Sequence[str]):
+    """Read-only view of equal-width ASCII strings packed in a buffer, e.g. hex ids; bisectable when sorted."""
+
+    def __init__(self, buffer, width: int):
+        self.buffer = buffer
+        self.width = width
+
+    def __len__(self) -> int:
+        return len(self.buffer) // self.width
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return bytes(self.buffer[index * self.width:(index + 1) * self.width]).decode("ascii")
+
+
+class Strings(Sequence[str]):
+    """Read-only view of variable-length UTF-8 strings: ``offsets[i]:offsets[i + 1]`` of ``blob``."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+
+def pack_fixed(values: Sequence[str]) -> bytes:
+    return "".join(values).encode("ascii")
+
+
+def pack_strings(values: Sequence[str]) -> Tuple[bytes, bytes]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = array("q", [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def write(path: str, sections: List[bytes], wal_sequence: int) -> None:
+    """
+    Write ``sections`` to ``path`` atomically: a temporary file is written and
+    fsynced, then renamed over the old one, so a reader or a crash only ever
+    sees a complete file.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for section in sections:
+        offset += -offset % _ALIGN
+        table.append((offset, len(section)))
+        offset += len(section)
+    with open(temporary, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, len(sections), wal_sequence))
+        for entry in table:
+            file.write(_SECTION.pack(*entry))
+        for (start, _), section in zip(table, sections):
+            file.write(b"\0" * (start - file.tell()))
+            file.write(section)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class MappedIndex:
+    """An index file mapped read-only; ``sections`` are zero-copy memoryviews into the page cache."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        if len(view) < _HEADER.size:
+            raise CorruptIndex("{} is truncated".format(path))
+        magic, count, self.wal_sequence = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise CorruptIndex("{} is not an index file".format(path))
+        self.sections = []
+        for number in range(count):
+            start, length = _SECTION.unpack_from(view, _HEADER.size + number * _SECTION.size)
+            if start + length > len(view):
+                raise CorruptIndex("{} is truncated".format(path))
+            self.sections.append(view[start:start + length])
+
+    def ints(self, number: int) -> memoryview:
+        return self.sections[number].cast("i")
+
+    def longs(self, number: int) -> memoryview:
+        return self.sections[number].cast("q")
+
+
+def open_index(path: str) -> Optional[MappedIndex]:
+    if not os.path.exists(path):
+        return None
+    return MappedIndex(path)
+
+
+def publish(directory: str, name: str) -> None:
+    """Point ``CURRENT`` at the snapshot file ``name``; readers see the old or the new pointer, never a partial one."""
+    temporary = os.path.join(directory, "{}.{}.tmp".format(CURRENT, os.getpid()))
+    with open(temporary, "w") as file:
+        file.write(name)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, os.path.join(directory, CURRENT))
+
+
+def pointer(directory: str) -> Optional[Tuple[int, int]]:
+    """Identity of the ``CURRENT`` file (a new one on every ``publish``), None before the first snapshot."""
+    try:
+        stat = os.stat(os.path.join(directory, CURRENT))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def current(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, CURRENT)) as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+@contextlib.contextmanager
+def exclusive(path: str):
+    """Try to take an exclusive ``flock`` on ``path`` without waiting; yields whether this process holds it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(descriptor)
+
+
+def _parse(line: bytes) -> Optional[Tuple[int, dict]]:
+    """A log line as ``(sequence, record)``, or None if it is partial or its checksum does not match."""
+    try:
+        sequence, checksum, payload = line.rstrip(b"\n").split(b" ", 2)
+        if not line.endswith(b"\n") or int(checksum, 16) != zlib.crc32(payload):
+            return None
+        return int(sequence), json.loads(payload)
+    except ValueError:
+        return None
+
+
+def _format(sequence: int, record: dict) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return b"%d %08x %s\n" % (sequence, zlib.crc32(payload), payload)
+
+
+class WriteAheadLog:
+    """
+    Changes made after the last checkpoint, one line each:
+    ``<sequence> <crc32> <json>``, shared by every process using the
+    directory. Appends and rewrites happen under an exclusive ``flock`` on a
+    companion lock file, and an appender first reads what others appended so
+    sequences stay contiguous across processes. Readers tail the file from
+    where they stopped and start over when it was replaced; a line that is
+    partial or fails its checksum ends what can be read.
+
+    ``truncate`` starts the new file with a ``checkpoint`` marker carrying the
+    last dropped sequence, so numbering carries on and a reader that had not
+    caught up can tell it missed records.
+    """
+
+    CHECKPOINT = "checkpoint"
+
+    def __init__(self, path: str):
+        self.path = path
+        # Highest sequence read or written.
+        self.sequence = 0
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._lock_descriptor: Optional[int] = None
+
+    @contextlib.contextmanager
+    def locked(self):
+        if self._lock_descriptor is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._lock_descriptor = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_descriptor, fcntl.LOCK_EX)
+        try:
+            yield self
+        finally:
+            fcntl.flock(self._lock_descriptor, fcntl.LOCK_UN)
+
+    def rewind(self) -> None:
+        """Read the whole file again on the next ``read``."""
+        self._inode, self._offset = None, 0
+
+    def read(self) -> List[Tuple[int, dict]]:
+        """Intact records appended since the last read, or all of them if the file was replaced since."""
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        records = []
+        with file:
+            inode = os.fstat(file.fileno()).st_ino
+            if inode != self._inode:
+                self._inode, self._offset = inode, 0
+            file.seek(self._offset)
+            for line in file:
+                parsed = _parse(line)
+                if parsed is None:
+                    break
+                self._offset += len(line)
+                self.sequence = max(self.sequence, parsed[0])
+                records.append(parsed)
+        return records
+
+    def append(self, record: dict) -> int:
+        """Append under ``locked``, after a ``read``; returns the record's sequence."""
+        line = _format(self.sequence + 1, record)
+        descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(descriptor).st_ino != self._inode:
+                self._inode, self._offset = os.fstat(descriptor).st_ino, 0
+            os.write(descriptor, line)
+        finally:
+            os.close(descriptor)
+        self.sequence += 1
+        self._offset += len(line)
+        return self.sequence
+
+    def repair(self) -> None:
+        """Cut a torn tail left by a crashed writer; under ``locked``, where no append can be in flight."""
+        self.rewind()
+        self.read()
+        if os.path.exists(self.path) and os.path.getsize(self.path) != self._offset:
+            with open(self.path, "r+b") as file:
+                file.truncate(self._offset)
+
+    def truncate(self, through: int) -> None:
+        """Under ``locked``: drop the records up to ``through``, now part of a checkpoint."""
+        self.rewind()
+        kept = [(sequence, record) for sequence, record in self.read() if sequence > through]
+        temporary = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temporary, "wb") as file:
+            file.write(_format(through, {"op": self.CHECKPOINT}))
+            for sequence, record in kept:
+                file.write(_format(sequence, record))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        self.rewind()
+        self.read()
+
+    def close(self) -> None:
+        if self._lock_descriptor is not None:
+            os.close(self._lock_descriptor)
+            self._lock_descriptor = None
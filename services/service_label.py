@@ -1,6 +1,11 @@
 import datetime
+import hashlib
+import heapq
+import uuid
+import jwt
 from collections import defaultdict
-from typing import List, Dict, Union, Any
+from typing import List, Dict, Union, Any, FrozenSet, Iterable, Iterator, NamedTuple, Optional, Set, Tuple
+from services import service_auth, service_tracing
 
 Document = Dict[str, Any]
 Label = Dict[str, str]
@@ -8,50 +13,127 @@ DocumentsList = List[Document]
 LabelsList = List[Label]
 RelationsList = List[Dict[str, Union[str, List[str]]]]
 NetworkDict = Dict[str, List[Dict[str, str]]]
+Position = Tuple[int, uuid.UUID]
 
 
-def find_related_documents(documents, labels_to_find, visited=None, depth=0, max_depth=10) -> DocumentsList:
-    if visited is None:
-        visited = set()
-    if depth >= max_depth:
+class TraversalOptions(NamedTuple):
+    allow_keys: Optional[FrozenSet[str]] = None
+    deny_keys: FrozenSet[str] = frozenset()
+    max_fanout: Optional[int] = None
+    skip_hubs: bool = True
+    hub_ratio: float = 0.05
+    max_depth: int = 10
+
+
+def traverse(
+    index,
+    seed_label_ids: Iterable[uuid.UUID],
+    options: TraversalOptions = TraversalOptions(),
+    skipped_hubs: Optional[Set[uuid.UUID]] = None
+) -> Iterator[Tuple[int, List[uuid.UUID]]]:
+    """
+    Breadth-first walk of the document/label graph of a ``ComponentIndex``,
+    yielding ``(depth, documents)`` hop by hop. Depth 0 holds the documents
+    carrying every seed label; each further hop follows the labels of the
+    previous one, and every hop is sorted by document id so that a
+    ``(depth, document id)`` position identifies where a page stopped. Labels whose key is not allowed or is denied are not followed,
+    at most ``max_fanout`` documents are taken through any one label, and with
+    ``skip_hubs`` labels on more than ``index.hub_degree(hub_ratio)`` documents
+    are not followed either (they are added to ``skipped_hubs``).
+    """
+    seeds = list(dict.fromkeys(seed_label_ids))
+    if not seeds or any(label_id not in index.label_documents for label_id in seeds):
+        return
+    postings = sorted((index.label_documents[label_id] for label_id in seeds), key=len)
+    others = [set(posting) for posting in postings[1:]]
+    frontier = [document_id for document_id in postings[0] if all(document_id in other for other in others)]
+
+    visited = set(frontier)
+    followed = set()
+    hub_degree = index.hub_degree(options.hub_ratio)
+    depth = 0
+    while frontier:
+        frontier.sort()
+        yield depth, frontier
+        if depth >= options.max_depth:
+            return
+        depth += 1
+        next_frontier = []
+        for document_id in frontier:
+            for label_id in index.document_labels.get(document_id, ()):
+                if label_id in followed:
+                    continue
+                followed.add(label_id)
+                key = index.labels[label_id][0]
+                if key in options.deny_keys or (options.allow_keys is not None and key not in options.allow_keys):
+                    continue
+                documents = index.label_documents[label_id]
+                if options.skip_hubs and len(documents) > hub_degree:
+                    if skipped_hubs is not None:
+                        skipped_hubs.add(label_id)
+                    continue
+                if options.max_fanout is not None:
+                    # The lowest ids, as the database strategy takes them; postings are in insertion order.
+                    documents = heapq.nsmallest(options.max_fanout, documents)
+                for related_id in documents:
+                    if related_id not in visited:
+                        visited.add(related_id)
+                        next_frontier.append(related_id)
+        frontier = next_frontier
+
+
+def after_position(depth: int, documents: List[uuid.UUID], after: Optional[Position]) -> List[uuid.UUID]:
+    """The part of a sorted hop that comes after a cursor position."""
+    if after is None or depth > after[0]:
+        return documents
+    if depth < after[0]:
         return []
-    related_docs = []
-    new_labels_to_find = []
-
-    for doc in documents:
-        has_all_labels = all(
-            any(label == l for l in doc.get("labels", []))
-            for label in labels_to_find
-        )
-        
-        if has_all_labels and doc["hash"] not in visited:
-            related_docs.append(doc)
-            visited.add(doc["hash"])
-            new_labels_to_find.extend(doc.get("labels", []))
-
-    if new_labels_to_find and depth < max_depth:
-        deeper_docs = find_related_documents(
-            documents, 
-            new_labels_to_find, 
-            visited, 
-            depth + 1, 
-            max_depth
-        )
-        related_docs.extend(deeper_docs)
-    
-    return related_docs
+    return [document_id for document_id in documents if document_id > after[1]]
 
 
-def generate_relations_json(documents, initial_labels, by_type=False) -> Dict[str, Any]:
-    related_docs = find_related_documents(documents, initial_labels)
-    
-    result = {
-        "metadata": {
-            "initial_labels": initial_labels,
-            "total_documents": len(related_docs),
-            "timestamp": datetime.datetime.now().isoformat()
-        }
+def search_fingerprint(parameters: str) -> str:
+    return hashlib.sha256(parameters.encode()).hexdigest()[:16]
+
+
+def encode_cursor(fingerprint: str, position: Position) -> str:
+    """Signed token resuming a search after ``position``; only valid for the same search parameters."""
+    depth, document_id = position
+    return jwt.encode({"q": fingerprint, "d": depth, "id": document_id.hex}, service_auth.SECRET_KEY, algorithm=service_auth.ALGORITHM)
+
+
+def decode_cursor(cursor: str, fingerprint: str) -> Position:
+    try:
+        payload = jwt.decode(cursor, service_auth.SECRET_KEY, algorithms=[service_auth.ALGORITHM])
+        if payload["q"] != fingerprint:
+            raise ValueError("cursor belongs to another search")
+        return int(payload["d"]), uuid.UUID(payload["id"])
+    except (jwt.PyJWTError, KeyError, TypeError, ValueError) as error:
+        raise ValueError("Invalid cursor") from error
+
+
+def document_item(document) -> Document:
+    return {
+        "hash": document.hash,
+        "type": document.type.name,
+        "created_by": document.created_by,
+        "labels": [{"key": label.key, "value": label.value} for label in document.labels],
+        "document": document.document,
     }
+
+
+def relations_metadata(initial_labels, total_documents, skipped_hubs=(), next_cursor=None) -> Dict[str, Any]:
+    return {
+        "initial_labels": initial_labels,
+        "total_documents": total_documents,
+        "skipped_hubs": list(skipped_hubs),
+        "next_cursor": next_cursor,
+        "timestamp": datetime.datetime.now().isoformat()
+    }
+
+
+@service_tracing.traced()
+def generate_relations_json(related_docs, initial_labels, by_type=False, skipped_hubs=(), next_cursor=None) -> Dict[str, Any]:
+    result = {"metadata": relations_metadata(initial_labels, len(related_docs), skipped_hubs, next_cursor)}
     
     if by_type:
         docs_by_type = defaultdict(list)
@@ -63,4 +145,3 @@ def generate_relations_json(documents, initial_labels, by_type=False) -> Dict[st
         result["documents"] = related_docs
     
     return result
-
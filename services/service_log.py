@@ -1,43 +1,170 @@
 import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import random
 import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from services import service_metrics
 
+ROOT_LOGGER = "athross"
+QUEUE_SIZE = 10000
 
-class TestLogger:
-    def __init__(self, tag: str):
-        self.tag = tag.split(".")[0]
-        self.logger = logging.getLogger(tag)
-        self.logger.setLevel(logging.INFO)
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
 
-        self._create_dir()
+log_records_dropped = service_metrics.registry.register(service_metrics.Counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full."
+))
 
-        log_path = os.path.join("test_logs", "{}.log".format(self.tag))
-        if os.path.exists(log_path):
-            os.remove(log_path)
-            
-        if not self.logger.handlers:
-            formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id", "sample_rate"}
 
-            file_handler = logging.FileHandler(log_path, mode='a')
-            file_handler.setFormatter(formatter)
 
-            stream_handler = logging.StreamHandler()
-            stream_handler.setFormatter(formatter)
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra`` fields are written as top-level keys."""
 
-            self.logger.addHandler(file_handler)
-            self.logger.addHandler(stream_handler)
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
 
-    def _create_dir(self):
-        if not os.path.exists("test_logs"):
-            os.makedirs("test_logs")
 
-    def info(self, message: str):
-        self.logger.info(f"{self.tag} {message}")
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records below WARNING of high-volume loggers.
 
-    def warning(self, message: str):
-        self.logger.warning(f"{self.tag} {message}")
+    ``rates`` maps a logger name (children included) to the fraction kept; a
+    record can override it with ``extra={"sample_rate": ...}``.
+    """
 
-    def error(self, message: str):
-        self.logger.error(f"{self.tag} {message}")
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = rates or {}
 
-    def debug(self, message: str):
-        self.logger.debug(f"{self.tag} {message}")
\ No newline at end of file
+    def rate(self, record: logging.LogRecord) -> float:
+        rate = getattr(record, "sample_rate", None)
+        if rate is not None:
+            return rate
+        name = record.name
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread; drops (and counts) them instead of waiting when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+
+def parse_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+def configure(
+    level: Optional[str] = None,
+    path: Optional[str] = None,
+    sample_rates: Optional[Dict[str, float]] = None,
+    stream=None
+) -> logging.Logger:
+    """
+    Route the ``athross`` loggers through a bounded queue to a background writer
+    thread emitting JSON lines on stderr (and to ``path`` when given). Settings
+    default to the LOG_LEVEL, LOG_FILE and LOG_SAMPLING environment variables.
+    Calling it again replaces the previous configuration.
+    """
+    global _listener
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    path = path if path is not None else os.getenv("LOG_FILE")
+    if sample_rates is None:
+        sample_rates = parse_rates(os.getenv("LOG_SAMPLING", ""))
+
+    formatter = JsonFormatter()
+    handlers = [logging.StreamHandler(stream or sys.stderr)]
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handlers.append(logging.FileHandler(path, mode="a"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    with _lock:
+        shutdown()
+        logger = logging.getLogger(ROOT_LOGGER)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+        logger.setLevel(level.upper())
+        logger.propagate = False
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    return logger
+
+
+def shutdown() -> None:
+    """Flush the queue and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+def get_logger(tag: str) -> logging.Logger:
+    if _listener is None:
+        configure()
+    return logging.getLogger("{}.{}".format(ROOT_LOGGER, tag.split(".")[0]))
@@ -0,0 +1,166 @@
+import os
+import linecache
+import threading
+import tracemalloc
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_FRAMES = int(os.getenv("MEMORY_PROFILING_FRAMES", "10"))
+GROUP_BY = ("lineno", "filename", "traceback")
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class RequestMemory:
+    __slots__ = ("start", "identity_map")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.identity_map = 0
+
+
+class EndpointMemory:
+    def __init__(self):
+        self.requests = 0
+        self.allocated = 0
+        self.peak_total = 0
+        self.peak_max = 0
+        self.identity_map_max = 0
+
+    def record(self, allocated: int, peak: int, identity_map: int) -> None:
+        self.requests += 1
+        self.allocated += allocated
+        self.peak_total += peak
+        self.peak_max = max(self.peak_max, peak)
+        self.identity_map_max = max(self.identity_map_max, identity_map)
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "allocated_bytes_mean": self.allocated // self.requests,
+            "peak_bytes_mean": self.peak_total // self.requests,
+            "peak_bytes_max": self.peak_max,
+            "identity_map_max": self.identity_map_max,
+        }
+
+
+_current: ContextVar[Optional[RequestMemory]] = ContextVar("request_memory", default=None)
+endpoints: Dict[str, EndpointMemory] = {}
+_baseline: Optional[tracemalloc.Snapshot] = None
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def _track_identity_map(session, instance) -> None:
+    request = _current.get()
+    if request is not None:
+        size = len(session.identity_map)
+        if size > request.identity_map:
+            request.identity_map = size
+
+
+def start(frames: int = DEFAULT_FRAMES) -> None:
+    """Start tracing allocations; costs CPU and memory on every allocation, so only while investigating."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    if not event.contains(Session, "loaded_as_persistent", _track_identity_map):
+        event.listen(Session, "loaded_as_persistent", _track_identity_map)
+        event.listen(Session, "pending_to_persistent", _track_identity_map)
+
+
+def stop() -> None:
+    global _baseline
+    tracemalloc.stop()
+    _baseline = None
+    endpoints.clear()
+    if event.contains(Session, "loaded_as_persistent", _track_identity_map):
+        event.remove(Session, "loaded_as_persistent", _track_identity_map)
+        event.remove(Session, "pending_to_persistent", _track_identity_map)
+
+
+def start_request():
+    """Begin accounting a request; returns None when profiling is off."""
+    if not tracemalloc.is_tracing():
+        return None
+    tracemalloc.reset_peak()
+    request = RequestMemory(tracemalloc.get_traced_memory()[0])
+    return request, _current.set(request)
+
+
+def end_request(state, route: str) -> None:
+    """
+    Record what the request retained (``allocated``) and the most it held at
+    once (``peak``), both relative to its start. The peak is process wide, so
+    overlapping requests inflate each other's figures.
+    """
+    request, token = state
+    _current.reset(token)
+    if not tracemalloc.is_tracing():
+        return
+    current, peak = tracemalloc.get_traced_memory()
+    with _lock:
+        stats = endpoints.get(route)
+        if stats is None:
+            stats = endpoints[route] = EndpointMemory()
+        stats.record(max(0, current - request.start), max(0, peak - request.start), request.identity_map)
+
+
+def summary() -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "enabled": enabled(),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "frames": tracemalloc.get_traceback_limit(),
+        "endpoints": {route: stats.to_dict() for route, stats in sorted(endpoints.items())},
+    }
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+def _frames(traceback: tracemalloc.Traceback) -> List[str]:
+    return ["{}:{}".format(frame.filename, frame.lineno) for frame in traceback]
+
+
+def snapshot(limit: int, group_by: str) -> List[dict]:
+    """Top ``limit`` allocation sites now; the snapshot becomes the baseline of ``diff``."""
+    global _baseline
+    taken = _snapshot()
+    _baseline = taken
+    return [
+        {"size_bytes": stat.size, "count": stat.count, "traceback": _frames(stat.traceback)}
+        for stat in taken.statistics(group_by)[:limit]
+    ]
+
+
+def diff(limit: int, group_by: str) -> Optional[List[dict]]:
+    """Top ``limit`` growth since the last ``snapshot``, or None without one."""
+    if _baseline is None:
+        return None
+    return [
+        {
+            "size_bytes": stat.size,
+            "size_diff_bytes": stat.size_diff,
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+            "traceback": _frames(stat.traceback),
+        }
+        for stat in _snapshot().compare_to(_baseline, group_by)[:limit]
+    ]
+
+
+if os.getenv("MEMORY_PROFILING", "false").lower() in ("1", "true"):
+    start()
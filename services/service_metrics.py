@@ -0,0 +1,227 @@
+import time
+import weakref
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from utils.histogram import Histogram as HdrHistogram
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = ['{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values: Dict[Tuple, object] = {}
+
+    def header(self) -> List[str]:
+        return ["# HELP {} {}".format(self.name, self.help), "# TYPE {} {}".format(self.name, self.type)]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self.values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            "{}{} {}".format(self.name, _format_labels(self.label_names, labels), _format_number(value))
+            for labels, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, *labels, value: float) -> None:
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def count(self, *labels) -> int:
+        state = self.values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                lines.append("{}_bucket{} {}".format(
+                    self.name, _format_labels(self.label_names, labels, 'le="{}"'.format(le)), cumulative
+                ))
+            lines.append("{}_sum{} {}".format(self.name, _format_labels(self.label_names, labels), repr(total)))
+            lines.append("{}_count{} {}".format(self.name, _format_labels(self.label_names, labels), cumulative))
+        return lines
+
+
+class Summary(Metric):
+    """Quantiles over the whole process lifetime, kept in an HDR histogram of microseconds."""
+    type = "summary"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), quantiles: Tuple[float, ...] = (0.5, 0.9, 0.99, 0.999)):
+        super().__init__(name, help, labels)
+        self.quantiles = tuple(quantiles)
+
+    def observe(self, value: float, *labels) -> None:
+        histogram = self.values.get(labels)
+        if histogram is None:
+            histogram = self.values[labels] = HdrHistogram()
+        histogram.record(int(value * 1_000_000))
+
+    def quantile(self, quantile: float, *labels) -> float:
+        histogram = self.values.get(labels)
+        return histogram.percentile(quantile * 100) / 1_000_000 if histogram else 0.0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, histogram in self.values.items():
+            for quantile in self.quantiles:
+                lines.append("{}{} {}".format(
+                    self.name,
+                    _format_labels(self.label_names, labels, 'quantile="{}"'.format(quantile)),
+                    repr(histogram.percentile(quantile * 100) / 1_000_000)
+                ))
+            lines.append("{}_sum{} {}".format(self.name, _format_labels(self.label_names, labels), repr(histogram.sum / 1_000_000)))
+            lines.append("{}_count{} {}".format(self.name, _format_labels(self.label_names, labels), histogram.total))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        refresh_cache_ratios()
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", ("method",)
+))
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL statements executed, by statement type.", ("operation",)
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by statement type.", ("operation",), QUERY_BUCKETS
+))
+db_pool_checkout_duration = registry.register(Histogram(
+    "db_pool_checkout_seconds", "Time a request waited to get a database connection.", (), QUERY_BUCKETS
+))
+db_pool_connections_in_use = registry.register(Gauge(
+    "db_pool_connections_in_use", "Database connections currently checked out of the pool."
+))
+cache_requests = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result")
+))
+cache_hit_ratio = registry.register(Gauge(
+    "cache_hit_ratio", "Hits over lookups since start, per cache.", ("cache",)
+))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def refresh_cache_ratios() -> None:
+    caches = {cache for cache, _ in cache_requests.values}
+    for cache in caches:
+        hits = cache_requests.get(cache, "hit")
+        total = hits + cache_requests.get(cache, "miss")
+        cache_hit_ratio.set(cache, value=hits / total if total else 0.0)
+
+
+def _operation(statement: str) -> str:
+    return statement.lstrip()[:8].split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+
+
+_instrumented_engines = weakref.WeakSet()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time every statement and pool checkout of ``engine`` (the sync engine of an AsyncEngine)."""
+    if engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        operation = _operation(statement)
+        db_queries.inc(operation)
+        db_query_duration.observe(elapsed, operation)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("metrics_query_start"):
+            connection.info["metrics_query_start"].pop()
+
+    @event.listens_for(engine.pool, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        db_pool_connections_in_use.inc()
+
+    @event.listens_for(engine.pool, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        db_pool_connections_in_use.dec()
@@ -0,0 +1,116 @@
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Dict, Tuple
+
+Frame = Tuple[str, str, int]
+Stack = Tuple[Frame, ...]
+
+IDLE_FUNCTIONS = {("select", "selectors.py"), ("poll", "selectors.py"), ("wait", "threading.py"), ("_worker", "thread.py")}
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: every ``interval`` seconds a background thread reads
+    the stack of every other thread through ``sys._current_frames()``. Nothing
+    is installed in the profiled threads, so the cost is the sampler's own CPU
+    time (well under 1% of a core at the default 100 Hz).
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples: Counter = Counter()
+        self.duration = 0.0
+        self._frames: Dict[object, Frame] = {}
+
+    def _frame(self, code) -> Frame:
+        frame = self._frames.get(code)
+        if frame is None:
+            frame = self._frames[code] = (code.co_name, code.co_filename, code.co_firstlineno)
+        return frame
+
+    def _stack(self, frame) -> Stack:
+        stack = []
+        while frame is not None:
+            stack.append(self._frame(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _is_idle(self, stack: Stack) -> bool:
+        name, filename, _ = stack[-1]
+        return (name, filename.rsplit("/", 1)[-1]) in IDLE_FUNCTIONS
+
+    def run(self, seconds: float) -> Counter:
+        """Sample for ``seconds`` from the calling thread; only one profile runs at a time per process."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            own = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            start = time.perf_counter()
+            deadline = start + seconds
+            next_sample = start
+            while next_sample < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = self._stack(frame)
+                    if stack and (self.include_idle or not self._is_idle(stack)):
+                        if ident not in names:
+                            names = {thread.ident: thread.name for thread in threading.enumerate()}
+                        self.samples[(names.get(ident, str(ident)), stack)] += 1
+                next_sample += self.interval
+                delay = next_sample - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.duration = time.perf_counter() - start
+            return self.samples
+        finally:
+            self._lock.release()
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed stack format, one ``thread;outer;...;inner count`` line per stack."""
+        lines = []
+        for (thread, stack), count in self.samples.most_common():
+            frames = ["{} ({}:{})".format(name, filename, line) for name, filename, line in stack]
+            lines.append("{} {}".format(";".join([thread] + frames), count))
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def speedscope(self, name: str = "athross") -> dict:
+        """A speedscope (https://www.speedscope.app) file with one sampled profile per thread."""
+        frames, index = [], {}
+        profiles = {}
+        for (thread, stack), count in self.samples.items():
+            indices = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indices.append(index[frame])
+            profile = profiles.setdefault(thread, {
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": [],
+                "weights": [],
+            })
+            profile["samples"].append(indices)
+            profile["weights"].append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "athross",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
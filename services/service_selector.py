@@ -0,0 +1,139 @@
+import re
+from typing import List, NamedTuple, Tuple
+from fastapi import HTTPException, status
+
+EQUALS = "="
+NOT_EQUALS = "!="
+IN = "in"
+NOT_IN = "notin"
+EXISTS = "exists"
+NOT_EXISTS = "!"
+
+POSITIVE_OPERATORS = (EQUALS, IN, EXISTS)
+
+_TOKEN_RE = re.compile(r"\s*(==|!=|=|!|\(|\)|,|[^\s,()=!]+)")
+
+
+class Requirement(NamedTuple):
+    key: str
+    operator: str
+    values: Tuple[str, ...] = ()
+
+    @property
+    def positive(self) -> bool:
+        return self.operator in POSITIVE_OPERATORS
+
+
+def _invalid(message: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid selector: {}".format(message)
+    )
+
+
+def _tokenize(selector: str) -> List[str]:
+    tokens = []
+    position = 0
+    selector = selector.rstrip()
+    while position < len(selector):
+        match = _TOKEN_RE.match(selector, position)
+        if not match:
+            raise _invalid("unexpected character at position {}".format(position))
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+def _is_word(token: str | None) -> bool:
+    return token is not None and token not in ("==", "!=", "=", "!", "(", ")", ",")
+
+
+def parse(selector: str) -> List[Requirement]:
+    """
+    Parse a label selector such as ``type in (a,b),port!=5432,!deprecated``.
+
+    Supported requirements: ``key=value``, ``key==value``, ``key!=value``,
+    ``key in (v1,v2)``, ``key notin (v1,v2)``, ``key`` and ``!key``.
+    """
+    tokens = _tokenize(selector or "")
+    requirements = []
+    index = 0
+
+    def peek(offset: int = 0) -> str | None:
+        return tokens[index + offset] if index + offset < len(tokens) else None
+
+    while index < len(tokens):
+        if peek() == "!":
+            if not _is_word(peek(1)):
+                raise _invalid("expected a key after '!'")
+            requirements.append(Requirement(peek(1), NOT_EXISTS))
+            index += 2
+        elif _is_word(peek()):
+            key = peek()
+            operator = peek(1)
+            if operator in ("=", "==", "!="):
+                if not _is_word(peek(2)):
+                    raise _invalid("expected a value for key '{}'".format(key))
+                requirements.append(
+                    Requirement(key, NOT_EQUALS if operator == "!=" else EQUALS, (peek(2),))
+                )
+                index += 3
+            elif operator in (IN, NOT_IN):
+                if peek(2) != "(":
+                    raise _invalid("expected '(' after '{}'".format(operator))
+                index += 3
+                values = []
+                while True:
+                    if not _is_word(peek()):
+                        raise _invalid("expected a value in the '{}' set of '{}'".format(operator, key))
+                    values.append(peek())
+                    index += 1
+                    if peek() == ",":
+                        index += 1
+                    elif peek() == ")":
+                        index += 1
+                        break
+                    else:
+                        raise _invalid("unterminated value set for key '{}'".format(key))
+                requirements.append(Requirement(key, operator, tuple(dict.fromkeys(values))))
+            else:
+                requirements.append(Requirement(key, EXISTS))
+                index += 1
+        else:
+            raise _invalid("unexpected token '{}'".format(peek()))
+
+        if index < len(tokens):
+            if peek() != ",":
+                raise _invalid("expected ',' between requirements, found '{}'".format(peek()))
+            index += 1
+            if index == len(tokens):
+                raise _invalid("trailing ','")
+
+    return requirements
+
+
+def estimate_matches(requirement: Requirement, counts: dict) -> int:
+    """
+    Upper bound of documents matching the label part of a requirement, from a
+    ``{(key, value): document_count}`` map of the keys involved in the selector.
+    """
+    if requirement.operator in (EXISTS, NOT_EXISTS):
+        return sum(count for (key, _), count in counts.items() if key == requirement.key)
+    return sum(counts.get((requirement.key, value), 0) for value in requirement.values)
+
+
+def plan(requirements: List[Requirement], counts: dict) -> Tuple[List[Requirement], List[Requirement]]:
+    """
+    Order requirements by selectivity: positive terms from the fewest matching
+    documents up, so the smallest posting list drives the query, followed by the
+    negative terms that exclude the most documents first.
+    """
+    positive = sorted(
+        (requirement for requirement in requirements if requirement.positive),
+        key=lambda requirement: estimate_matches(requirement, counts)
+    )
+    negative = sorted(
+        (requirement for requirement in requirements if not requirement.positive),
+        key=lambda requirement: -estimate_matches(requirement, counts)
+    )
+    return positive, negative
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+import database
+import models.model_document as model_document
+import models.model_label as model_label
+from models.model_relationship import document_label
+from services import service_events, service_log
+from services.service_components import BUILD_PARTITION
+
+NUM_PERM = int(os.getenv("SIMILARITY_PERMUTATIONS", "64"))
+BANDS = int(os.getenv("SIMILARITY_BANDS", "16"))
+MAX_BUCKET = int(os.getenv("SIMILARITY_MAX_BUCKET", "1000"))
+
+LabelPair = Tuple[str, str]
+
+logger = service_log.get_logger("similarity")
+
+
+def features(labels: Iterable[LabelPair]) -> FrozenSet[str]:
+    """
+    What similarity compares: every ``key=value`` plus every bare ``key``, so
+    documents with the same shape in different environments (same keys, other
+    values) still share part of their features.
+    """
+    tokens = set()
+    for key, value in labels:
+        tokens.add(key)
+        tokens.add("{}={}".format(key, value))
+    return frozenset(tokens)
+
+
+@lru_cache(maxsize=4096)
+def _token_hashes(token: str) -> Tuple[int, ...]:
+    # NUM_PERM independent 32-bit hashes from one SHAKE digest: a single C call
+    # instead of NUM_PERM modular multiplications per token.
+    return tuple(memoryview(hashlib.shake_128(token.encode()).digest(4 * NUM_PERM)).cast("I"))
+
+
+def signature(tokens: Iterable[str]) -> Tuple[int, ...]:
+    """MinHash signature: per hash function, the least hash of any token (equal at a position with probability Jaccard)."""
+    return tuple(map(min, zip(*map(_token_hashes, tokens))))
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    if not first and not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class SimilarityIndex:
+    """
+    MinHash signatures of every document's label features in LSH buckets:
+    the signature is cut into ``bands`` bands and two documents become
+    candidates when any band matches, which happens with probability
+    ``1 - (1 - J**rows)**bands`` for Jaccard similarity ``J`` (about even at
+    ``J = (1 / bands) ** (1 / rows)``, 0.5 by default). A lookup reads one
+    bucket per band instead of every document, and candidates are reranked by
+    exact Jaccard. Buckets shared by more than ``max_bucket`` documents say
+    little (every server document carries ``ipv4``) and are not read.
+    """
+
+    def __init__(self, bands: int = BANDS, max_bucket: int = MAX_BUCKET):
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.max_bucket = max_bucket
+        self.features: Dict[uuid.UUID, FrozenSet[str]] = {}
+        self.band_keys: Dict[uuid.UUID, Tuple[int, ...]] = {}
+        self.buckets: List[Dict[int, Set[uuid.UUID]]] = [{} for _ in range(bands)]
+        self.stale = False
+
+    def _keys(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        values = signature(tokens)
+        rows = self.rows
+        return tuple(hash(values[band * rows:(band + 1) * rows]) for band in range(self.bands))
+
+    def add(self, document_id: uuid.UUID, labels: Iterable[LabelPair]) -> None:
+        """Insert or replace a document's label set."""
+        tokens = features(labels)
+        if self.features.get(document_id) == tokens:
+            return
+        self.remove(document_id)
+        self.features[document_id] = tokens
+        if not tokens:
+            return
+        keys = self.band_keys[document_id] = self._keys(tokens)
+        for buckets, key in zip(self.buckets, keys):
+            buckets.setdefault(key, set()).add(document_id)
+
+    def remove(self, document_id: uuid.UUID) -> None:
+        self.features.pop(document_id, None)
+        keys = self.band_keys.pop(document_id, None)
+        if keys is None:
+            return
+        for buckets, key in zip(self.buckets, keys):
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(document_id)
+                if not bucket:
+                    del buckets[key]
+
+    def candidates(self, document_id: uuid.UUID) -> Set[uuid.UUID]:
+        found = set()
+        for buckets, key in zip(self.buckets, self.band_keys.get(document_id, ())):
+            bucket = buckets.get(key, ())
+            if len(bucket) <= self.max_bucket:
+                found.update(bucket)
+        found.discard(document_id)
+        return found
+
+    def similar(self, document_id: uuid.UUID, k: int, min_similarity: float = 0.0) -> Optional[List[Tuple[uuid.UUID, float]]]:
+        """Up to ``k`` documents most similar to ``document_id`` by exact Jaccard among the LSH candidates, or None if it is unknown."""
+        tokens = self.features.get(document_id)
+        if tokens is None:
+            return None
+        scored = [
+            (candidate, jaccard(tokens, self.features[candidate]))
+            for candidate in self.candidates(document_id)
+        ]
+        scored = [(candidate, score) for candidate, score in scored if score >= min_similarity]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:k]
+
+
+class SimilarityService:
+    """
+    Process-wide index kept current from ``service_events``, every worker's
+    writes included: upserted and deleted documents are applied in place;
+    deleted labels change the label sets of documents the event does not
+    name, so they schedule a rebuild.
+    """
+
+    def __init__(self):
+        self.index: Optional[SimilarityIndex] = None
+        self.bind: Optional[AsyncEngine] = None
+        self.generation = 0
+        self._pending: Optional[List[Tuple[str, object]]] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._rebuild: Optional[asyncio.Task] = None
+
+    async def _load(self, bind: AsyncEngine) -> SimilarityIndex:
+        index = SimilarityIndex()
+        labels: Dict[str, List[LabelPair]] = {}
+        async with AsyncSession(bind) as session:
+            rows = await session.stream(
+                select(type_coerce(model_document.Document.id, String), model_label.Label.key, model_label.Label.value)
+                .outerjoin(document_label, document_label.c.document_id == model_document.Document.id)
+                .outerjoin(model_label.Label, model_label.Label.id == document_label.c.label_id)
+                .execution_options(yield_per=BUILD_PARTITION)
+            )
+            async for partition in rows.partitions():
+                for document_id, key, value in partition:
+                    document_labels = labels.setdefault(document_id, [])
+                    if key is not None:
+                        document_labels.append((key, value))
+        # Signatures cost about 0.1ms a document; yield to the loop often.
+        for count, (document_id, document_labels) in enumerate(labels.items(), 1):
+            index.add(uuid.UUID(document_id), document_labels)
+            if count % 500 == 0:
+                await asyncio.sleep(0)
+        return index
+
+    async def build(self, bind: AsyncEngine) -> SimilarityIndex:
+        """Rebuild from the database, replaying changes published meanwhile; retries if a label deletion raced it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self.index is None or self.index.stale or not database.same_database(self.bind, bind):
+                # Other workers' writes logged before the load are in the database already.
+                service_events.catch_up()
+                generation = self.generation
+                self._pending = []
+                try:
+                    index = await self._load(bind)
+                    for topic, payload in self._pending:
+                        self._apply(index, topic, payload)
+                finally:
+                    self._pending = None
+                if generation == self.generation:
+                    self.index, self.bind = index, bind
+                    logger.info("Indexed %d documents in %d LSH bands", len(index.features), index.bands)
+            return self.index
+
+    async def get(self, db: AsyncSession) -> SimilarityIndex:
+        service_events.catch_up()
+        index = self.index
+        if index is None or not database.same_database(self.bind, db.bind):
+            index = await self.build(db.bind)
+        return index
+
+    @staticmethod
+    def _apply(index: SimilarityIndex, topic: str, payload) -> None:
+        if topic == service_events.DOCUMENTS_UPSERTED:
+            for document_id, document_labels in payload:
+                index.add(document_id, ((key, value) for _, key, value in document_labels))
+        else:
+            for document_id in payload:
+                index.remove(document_id)
+
+    def _record(self, topic: str, payload) -> None:
+        if self._pending is not None:
+            self._pending.append((topic, payload))
+        if self.index is not None:
+            self._apply(self.index, topic, payload)
+
+    def on_upserted(self, documents) -> None:
+        self._record(service_events.DOCUMENTS_UPSERTED, documents)
+
+    def on_deleted(self, document_ids) -> None:
+        self._record(service_events.DOCUMENTS_DELETED, document_ids)
+
+    def on_labels_deleted(self, _) -> None:
+        self.generation += 1
+        if self.index is None:
+            return
+        self.index.stale = True
+        if self.bind is None or (self._rebuild is not None and not self._rebuild.done()):
+            return
+        try:
+            self._rebuild = asyncio.get_running_loop().create_task(self.build(self.bind))
+        except RuntimeError:
+            self.index = None
+
+
+similarity = SimilarityService()
+service_events.subscribe(service_events.DOCUMENTS_UPSERTED, similarity.on_upserted, remote=True)
+service_events.subscribe(service_events.DOCUMENTS_DELETED, similarity.on_deleted, remote=True)
+service_events.subscribe(service_events.LABELS_DELETED, similarity.on_labels_deleted, remote=True)
+service_events.subscribe(service_events.MISSED, similarity.on_labels_deleted)
@@ -0,0 +1,106 @@
+import os
+import re
+import time
+import weakref
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from services import service_log
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+logger = service_log.get_logger("sql")
+
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so calls differing only by parameters or IN-list size compare equal."""
+    shape = _LITERAL_RE.sub("?", statement)
+    shape = _PLACEHOLDER_LIST_RE.sub("(?)", shape)
+    return _SPACES_RE.sub(" ", shape).strip()
+
+
+class RequestQueries:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def server_timing(self, total: float) -> str:
+        entries = [
+            'db;dur={:.3f};desc="{} queries"'.format(self.duration * 1000, self.count),
+            "app;dur={:.3f}".format(total * 1000),
+        ]
+        repeated = self.repeated()
+        if repeated:
+            entries.append('n-plus-one;desc="{} statements repeated, worst x{}"'.format(len(repeated), repeated[0][1]))
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def start_request() -> Tuple[RequestQueries, object]:
+    queries = RequestQueries()
+    return queries, _current.set(queries)
+
+
+def end_request(token) -> None:
+    _current.reset(token)
+
+
+def current() -> Optional[RequestQueries]:
+    return _current.get()
+
+
+def log_request(method: str, path: str, queries: RequestQueries, total: float) -> None:
+    repeated = queries.repeated()
+    for shape, count in repeated:
+        logger.warning("N+1 on %s %s: statement executed %d times: %s", method, path, count, shape[:300])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "%s %s: %d queries in %.3fms of %.3fms, %d distinct statements",
+            method, path, queries.count, queries.duration * 1000, total * 1000, len(queries.shapes)
+        )
+
+
+_instrumented_engines = weakref.WeakSet()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attribute every statement executed on ``engine`` to the request running it."""
+    if engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("accounting_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries = _current.get()
+        starts = conn.info.get("accounting_query_start")
+        if queries is not None and starts:
+            queries.record(statement, time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("accounting_query_start"):
+            connection.info["accounting_query_start"].pop()
@@ -0,0 +1,336 @@
+import os
+import json
+import queue
+import atexit
+import random
+import inspect
+import functools
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SERVICE_NAME = "athross"
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+QUEUE_SIZE = 10000
+BATCH_SIZE = 512
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "kind", "start", "end", "attributes", "events", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None, kind: int = KIND_INTERNAL):
+        self.trace_id = trace_id
+        self.span_id = "{:016x}".format(random.getrandbits(64))
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes: Dict[str, object] = {}
+        self.events: List[dict] = []
+        self.status = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = (STATUS_ERROR, str(error))
+        self.events.append({
+            "timeUnixNano": str(time.time_ns()),
+            "name": "exception",
+            "attributes": _attributes({"exception.type": type(error).__name__, "exception.message": str(error)}),
+        })
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": _attributes(self.attributes),
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.events:
+            span["events"] = self.events
+        if self.status:
+            span["status"] = {"code": self.status[0], "message": self.status[1]}
+        return span
+
+
+def _value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: Dict[str, object]) -> List[dict]:
+    return [{"key": key, "value": _value(value)} for key, value in attributes.items()]
+
+
+class FileExporter:
+    """
+    Writes finished spans from a background thread, one OTLP/JSON
+    ``ExportTraceServiceRequest`` per line (the OpenTelemetry file exporter
+    format), so the files load into any OTLP-aware tool. Spans are dropped when
+    the queue is full rather than blocking the caller.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self.thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            spans = [span for span in batch if span is not None]
+            if spans:
+                self._write(spans)
+            for _ in batch:
+                self.queue.task_done()
+            if len(spans) < len(batch):
+                return
+
+    def _write(self, spans: List[Span]) -> None:
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": SERVICE_NAME, "process.pid": os.getpid()})},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as output:
+            output.write(json.dumps(request, separators=(",", ":")) + "\n")
+
+    def flush(self) -> None:
+        self.queue.join()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+
+_NOT_SAMPLED = object()
+_current_span: ContextVar[Optional[object]] = ContextVar("current_span", default=None)
+
+sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+trace_path = os.getenv("TRACE_FILE", os.path.join("traces", "spans.jsonl"))
+_exporter: Optional[FileExporter] = None
+_lock = threading.Lock()
+
+
+def configure(rate: Optional[float] = None, path: Optional[str] = None) -> None:
+    """Change the sampling rate (0 disables tracing) and the export file."""
+    global sample_rate, trace_path
+    shutdown()
+    if rate is not None:
+        sample_rate = rate
+    if path is not None:
+        trace_path = path
+
+
+def _get_exporter() -> FileExporter:
+    global _exporter
+    if _exporter is None:
+        with _lock:
+            if _exporter is None:
+                _exporter = FileExporter(trace_path)
+    return _exporter
+
+
+def flush() -> None:
+    if _exporter is not None:
+        _exporter.flush()
+
+
+def shutdown() -> None:
+    global _exporter
+    with _lock:
+        if _exporter is not None:
+            _exporter.close()
+            _exporter = None
+
+
+atexit.register(shutdown)
+
+
+def current_span() -> Optional[Span]:
+    span = _current_span.get()
+    return span if isinstance(span, Span) else None
+
+
+def parse_traceparent(header: str):
+    """``(trace_id, parent_span_id, sampled)`` of a W3C ``traceparent`` header, or None."""
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+
+def start_span(name: str, kind: int = KIND_INTERNAL, parent=None, remote=None) -> Optional[Span]:
+    """
+    Start a span under ``parent`` (default: the current span), or a new trace
+    subject to sampling when there is none. ``remote`` continues an incoming
+    ``parse_traceparent`` context. Returns None when the trace is not sampled.
+    """
+    if parent is None:
+        parent = _current_span.get()
+    if parent is _NOT_SAMPLED:
+        return None
+    if isinstance(parent, Span):
+        return Span(name, parent.trace_id, parent.span_id, kind)
+    if remote is not None:
+        trace_id, parent_span_id, sampled = remote
+        return Span(name, trace_id, parent_span_id, kind) if sampled and sample_rate > 0 else None
+    if sample_rate > 0 and random.random() < sample_rate:
+        return Span(name, "{:032x}".format(random.getrandbits(128)), None, kind)
+    return None
+
+
+def end_span(span: Span) -> None:
+    span.end = time.time_ns()
+    _get_exporter().export(span)
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, object]] = None, remote=None):
+    """Run the block inside a child span of the current one; yields None when not sampled."""
+    parent = _current_span.get()
+    if parent is _NOT_SAMPLED or (parent is None and remote is None and not sample_rate):
+        yield None
+        return
+    current = start_span(name, kind, parent, remote)
+    token = _current_span.set(current if current is not None else _NOT_SAMPLED)
+    try:
+        if current is not None and attributes:
+            current.attributes.update(attributes)
+        yield current
+    except BaseException as error:
+        if current is not None:
+            current.record_exception(error)
+        raise
+    finally:
+        _current_span.reset(token)
+        if current is not None:
+            end_span(current)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorate a sync or async function so each call runs in a span named
+    ``module.function``. An async generator's span lasts from the call to its
+    last item, and is the current span only while the generator itself runs.
+    """
+    def decorator(function):
+        span_name = name or "{}.{}".format(function.__module__.rpartition(".")[2], function.__qualname__)
+
+        if inspect.isasyncgenfunction(function):
+            @functools.wraps(function)
+            async def generator_wrapper(*args, **kwargs):
+                parent = _current_span.get()
+                items = function(*args, **kwargs)
+                if parent is _NOT_SAMPLED or (parent is None and not sample_rate):
+                    async for item in items:
+                        yield item
+                    return
+                current = start_span(span_name, KIND_INTERNAL, parent)
+                state = current if current is not None else _NOT_SAMPLED
+                try:
+                    while True:
+                        # Set around each step only: between items the consumer runs under its own span.
+                        token = _current_span.set(state)
+                        try:
+                            item = await items.__anext__()
+                        except StopAsyncIteration:
+                            return
+                        finally:
+                            _current_span.reset(token)
+                        yield item
+                except Exception as error:
+                    if current is not None:
+                        current.record_exception(error)
+                    raise
+                finally:
+                    await items.aclose()
+                    if current is not None:
+                        end_span(current)
+            return generator_wrapper
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_instrumented_engines = weakref.WeakSet()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record a client span for every statement executed on ``engine`` inside a sampled trace."""
+    if engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = _current_span.get()
+        if isinstance(parent, Span):
+            operation = statement.split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+            statement_span = Span(operation, parent.trace_id, parent.span_id, KIND_CLIENT)
+            statement_span.attributes.update({"db.system": "sqlite", "db.statement": statement[:2000]})
+            if executemany:
+                statement_span.attributes["db.executemany"] = True
+            conn.info.setdefault("tracing_spans", []).append(statement_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if isinstance(_current_span.get(), Span) and conn.info.get("tracing_spans"):
+            end_span(conn.info["tracing_spans"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("tracing_spans"):
+            statement_span = connection.info["tracing_spans"].pop()
+            statement_span.record_exception(exception_context.original_exception)
+            end_span(statement_span)
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from typing import Deque, List, Optional
+from services import service_log, service_metrics
+
+INTERVAL = float(os.getenv("WATCHDOG_INTERVAL_MS", "20")) / 1000
+THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD_MS", "100")) / 1000
+RECENT_BLOCKS = 50
+
+logger = service_log.get_logger("watchdog")
+
+event_loop_lag = service_metrics.registry.register(service_metrics.Summary(
+    "event_loop_lag_seconds", "How late the event loop ran a timer scheduled every WATCHDOG_INTERVAL_MS."
+))
+event_loop_blocks = service_metrics.registry.register(service_metrics.Counter(
+    "event_loop_blocks_total", "Times the event loop was blocked for longer than WATCHDOG_THRESHOLD_MS."
+))
+
+
+class LoopWatchdog:
+    """
+    A heartbeat task sleeps ``interval`` at a time on the event loop and records
+    how late it wakes up (the lag every other callback suffers). A monitor
+    thread checks the heartbeat; when it is older than ``threshold`` the loop is
+    stuck in synchronous code, so the thread captures the loop thread's stack
+    right then, logs it and keeps it in ``blocks``.
+    """
+
+    def __init__(self, interval: float = INTERVAL, threshold: float = THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.blocks: Deque[dict] = deque(maxlen=RECENT_BLOCKS)
+        self.heartbeat = time.perf_counter()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> "LoopWatchdog":
+        self._loop_thread = threading.get_ident()
+        self.heartbeat = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._beat(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+
+    async def _beat(self) -> None:
+        while True:
+            scheduled = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.heartbeat = now = time.perf_counter()
+            event_loop_lag.observe(max(0.0, now - scheduled - self.interval))
+
+    def _monitor(self) -> None:
+        reported = None
+        while not self._stopped.wait(self.interval / 2):
+            heartbeat = self.heartbeat
+            stalled = time.perf_counter() - heartbeat
+            if stalled > self.threshold + self.interval and heartbeat != reported:
+                reported = heartbeat
+                self._report(stalled)
+
+    def _report(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        event_loop_blocks.inc()
+        self.blocks.append({"timestamp": time.time(), "blocked_ms": round(stalled * 1000, 1), "stack": stack})
+        logger.warning(
+            "Event loop blocked for %.0fms so far, at:\n%s", stalled * 1000, "".join(stack[-15:]),
+            extra={"blocked_ms": round(stalled * 1000, 1)}
+        )
+
+    def recent(self) -> List[dict]:
+        return list(self.blocks)
+
+
+watchdog: Optional[LoopWatchdog] = None
+
+
+def start() -> Optional[LoopWatchdog]:
+    """Start the process watchdog on the running loop; WATCHDOG_THRESHOLD_MS=0 disables it."""
+    global watchdog
+    if THRESHOLD <= 0:
+        return None
+    watchdog = LoopWatchdog().start()
+    return watchdog
+
+
+async def stop() -> None:
+    global watchdog
+    if watchdog is not None:
+        await watchdog.stop()
+        watchdog = None
@@ -1,9 +1,16 @@
+import os
+import tempfile
+
+# Before the app is imported: its database, and the files workers share beside it, go to a scratch directory.
+os.environ["DATABASE_FILE"] = os.path.join(tempfile.mkdtemp(prefix="athross-tests-"), "app.db")
+
 import pytest
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
-from database import Base, get_async_db
+from database import Base, get_async_db, get_read_db
 from main import app
+from api.routes import route_debug
 from fastapi.testclient import TestClient
 from httpx import AsyncClient, ASGITransport
 
@@ -37,6 +44,7 @@ async def override_get_async_db():
         yield session
 
 app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_read_db] = override_get_async_db
 
 @pytest.fixture
 def client():
@@ -55,3 +63,27 @@ async def async_client():
 async def async_session():
     async with TestSessionLocal() as session:
         yield session
+
+
+@pytest.fixture
+async def authenticated_client(async_client):
+    credentials = {
+        "username": "fixtureuser",
+        "email": "fixtureuser@example.com",
+        "password": "Fixture@password123",
+        "confirm_password": "Fixture@password123"
+    }
+    await async_client.post("/user/register", json=credentials)
+    response = await async_client.post("/user/login", json={
+        "email": credentials["email"],
+        "password": credentials["password"],
+        "remember": False
+    })
+    access_token = response.headers["set-cookie"].split("access_token=")[1].split(";")[0]
+    async_client.cookies.set("access_token", access_token)
+    yield async_client
+
+
+@pytest.fixture
+def debug_endpoints(monkeypatch):
+    monkeypatch.setattr(route_debug, "DEBUG_ENDPOINTS", True)
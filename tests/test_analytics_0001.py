@@ -0,0 +1,98 @@
+import pytest
+from services import service_analytics
+from factory import factory_documents
+
+ENVIRONMENTS = 3
+
+
+@pytest.fixture
+async def inventory(authenticated_client):
+    service_analytics.analytics.reset()
+    documents = list(factory_documents.generate_documents(ENVIRONMENTS * factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+    response = await authenticated_client.post("/documents/", json=documents)
+    assert response.status_code == 201
+    yield documents
+    service_analytics.analytics.reset()
+
+
+async def get(client, path, **params):
+    response = await client.get(path, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_facets(authenticated_client, inventory):
+    result = await get(authenticated_client, "/analytics/facets", key="port")
+    assert result["total_documents"] == len(inventory)
+    assert result["facets"] == [
+        {"key": "port", "value": "5432", "count": ENVIRONMENTS},
+        {"key": "port", "value": "5672", "count": ENVIRONMENTS},
+    ]
+
+    result = await get(authenticated_client, "/analytics/facets", type="app", label="domain=app-dev.example.com")
+    assert result["total_documents"] == 1
+    assert {"key": "queue", "value": "queue-dev.example.com", "count": 1} in result["facets"]
+
+
+async def test_group_by(authenticated_client, inventory):
+    result = await get(authenticated_client, "/analytics/group-by", by="type")
+    groups = {tuple(group["values"]): group["count"] for group in result["groups"]}
+    assert groups[("dns",)] == 4 * ENVIRONMENTS
+    assert groups[("server",)] == factory_documents.SERVERS * ENVIRONMENTS
+    assert sum(groups.values()) == len(inventory)
+
+    result = await get(authenticated_client, "/analytics/group-by", by=["type", "port"])
+    assert result["groups"] == [
+        {"values": ["database", "5432"], "count": ENVIRONMENTS},
+        {"values": ["queue", "5672"], "count": ENVIRONMENTS},
+    ]
+
+    result = await get(authenticated_client, "/analytics/group-by", by=["ipv4", "type"], type="balancer", label="ipv4=10.0.250.1")
+    assert len(result["groups"]) == 1 + factory_documents.SERVERS
+    assert all(group["values"][1] == "balancer" and group["count"] == 1 for group in result["groups"])
+
+    response = await authenticated_client.get("/analytics/group-by", params={"by": ["type", "port", "ipv4"]})
+    assert response.status_code == 400
+
+
+async def test_co_occurrence(authenticated_client, inventory):
+    result = await get(authenticated_client, "/analytics/co-occurrence", label="database")
+    assert result["total_documents"] == 3 * ENVIRONMENTS
+    assert {"key": "port", "value": "5432", "count": ENVIRONMENTS, "ratio": round(1 / 3, 4)} in result["labels"]
+    assert all(label["key"] != "database" for label in result["labels"])
+
+    result = await get(authenticated_client, "/analytics/co-occurrence", label="port=5432")
+    assert result["total_documents"] == ENVIRONMENTS
+    assert all(label["count"] == 1 for label in result["labels"])
+
+
+async def test_fresh_after_write(authenticated_client, inventory):
+    await get(authenticated_client, "/analytics/facets", key="port")
+    response = await authenticated_client.post("/documents/", json=[{
+        "hash": "analytics-0001", "type": "database", "created_by": "pytest",
+        "labels": [{"key": "port", "value": "5432"}], "document": {}
+    }])
+    assert response.status_code == 201
+
+    result = await get(authenticated_client, "/analytics/facets", key="port", fresh=True)
+    assert result["facets"][0] == {"key": "port", "value": "5432", "count": ENVIRONMENTS + 1}
+
+
+async def test_refreshes_are_coalesced(authenticated_client, async_session, inventory, monkeypatch):
+    monkeypatch.setattr(service_analytics, "REBUILD_INTERVAL", 0.3)
+    service = service_analytics.analytics
+    await service.get(async_session)
+    loads = []
+    load = service._load
+    monkeypatch.setattr(service, "_load", lambda bind: loads.append(bind) or load(bind))
+
+    for number in range(5):
+        response = await authenticated_client.post("/documents/", json=[{
+            "hash": "analytics-1{:03d}".format(number), "type": "database", "created_by": "pytest",
+            "labels": [{"key": "port", "value": "5432"}], "document": {}
+        }])
+        assert response.status_code == 201
+    await service._rebuild
+
+    assert len(loads) == 1
+    assert service.matrix.document_count == len(inventory) + 5
@@ -0,0 +1,84 @@
+import uuid
+import pytest
+from services import service_components, service_label
+from factory import factory_documents
+
+
+def test_union_find_components():
+    index = service_components.ComponentIndex()
+    documents = [uuid.uuid4() for _ in range(4)]
+    labels = [(uuid.uuid4(), "key", str(value)) for value in range(3)]
+    index.add(documents[0], [labels[0]])
+    index.add(documents[1], [labels[0], labels[1]])
+    index.add(documents[2], [labels[2]])
+    index.add(documents[3], [])
+    assert sorted(index.related(documents[0])) == sorted(documents[:2])
+    assert index.related(documents[2]) == [documents[2]]
+    assert index.related(documents[3]) == [documents[3]]
+    assert index.component_count() == 3
+    assert index.degree(labels[0][0]) == 2
+    assert index.label_ids[("key", "1")] == labels[1][0]
+
+    assert index.add(documents[2], [labels[2], labels[1]])
+    assert sorted(index.related(documents[0])) == sorted(documents[:3])
+    assert not index.stale
+
+    assert not index.add(documents[1], [labels[1]])
+    assert index.stale
+    assert index.related(uuid.uuid4()) is None
+
+
+def test_max_fanout_takes_the_lowest_ids():
+    index = service_components.ComponentIndex()
+    seed, shared = (uuid.uuid4(), "zone", "a"), (uuid.uuid4(), "port", "5432")
+    documents = sorted(uuid.uuid4() for _ in range(5))
+    index.add(documents[2], [seed, shared])
+    # Inserted highest first, the way a rebuild may order them.
+    for document_id in reversed(documents[:2] + documents[3:]):
+        index.add(document_id, [shared])
+
+    hops = list(service_label.traverse(index, [seed[0]], service_label.TraversalOptions(max_fanout=2)))
+    assert hops == [(0, [documents[2]]), (1, documents[:2])]
+
+
+@pytest.fixture
+def components():
+    service_components.components.index = None
+    yield service_components.components
+    service_components.components.index = None
+
+
+def hashes_of(response):
+    return {document["hash"] for document in response.json()}
+
+
+async def test_related_documents(authenticated_client, components):
+    first = factory_documents.generate_environment(0)
+    second = factory_documents.generate_environment(1)
+    response = await authenticated_client.post("/documents/", json=first)
+    ids = {document["hash"]: document["id"] for group in response.json().values() for document in group}
+    app, database = ids[first[8]["hash"]], ids[first[4]["hash"]]
+
+    related = await authenticated_client.get("/documents/{}/related".format(app))
+    assert related.status_code == 200
+    assert hashes_of(related) == {document["hash"] for document in first[8:13]}
+    assert components.index is not None
+
+    response = await authenticated_client.post("/documents/", json=second)
+    ids = {document["hash"]: document["id"] for group in response.json().values() for document in group}
+    assert not components.index.stale
+    related = await authenticated_client.get("/documents/{}/related".format(app))
+    assert hashes_of(related) == {document["hash"] for document in first[8:13]}
+    related = await authenticated_client.get("/documents/{}/related".format(database))
+    assert hashes_of(related) == {first[0]["hash"], first[4]["hash"], second[0]["hash"], second[4]["hash"]}
+
+    delete = await authenticated_client.request("DELETE", "/documents/", json=[ids[second[4]["hash"]]])
+    assert delete.status_code == 200
+    assert components.index.stale
+    await components._rebuild
+    assert not components.index.stale
+    related = await authenticated_client.get("/documents/{}/related".format(database))
+    assert hashes_of(related) == {first[0]["hash"], first[4]["hash"]}
+
+    missing = await authenticated_client.get("/documents/{}/related".format(uuid.uuid4()))
+    assert missing.status_code == 404
@@ -0,0 +1,78 @@
+from uuid import uuid4
+from sqlalchemy import create_engine, select
+from database import Base
+from models import model_document, model_label
+from models.model_relationship import document_label
+from api.schemas.schema_label import LabelBase
+
+
+def test_labels_fingerprint_is_order_independent():
+    labels = [LabelBase(key="ipv4", value="10.0.1.1"), LabelBase(key="domain", value="a.example.com")]
+    assert model_document.generate_labels_fingerprint(labels) == model_document.generate_labels_fingerprint(labels[::-1])
+    assert model_document.generate_labels_fingerprint(labels) != model_document.generate_labels_fingerprint(labels[:1])
+    assert model_document.generate_labels_fingerprint(labels + labels[:1]) == model_document.generate_labels_fingerprint(labels)
+
+
+async def test_match_and_group_label_sets(authenticated_client):
+    shared_labels = [{"key": "ipv4", "value": "10.0.1.1"}, {"key": "domain", "value": "a.example.com"}]
+    payload = [
+        {"hash": uuid4().hex, "type": "server", "created_by": "pytest", "labels": shared_labels},
+        {"hash": uuid4().hex, "type": "dns", "created_by": "pytest", "labels": shared_labels[::-1]},
+        {"hash": uuid4().hex, "type": "dns", "created_by": "pytest", "labels": shared_labels[:1]},
+    ]
+    create_resp = await authenticated_client.post("/documents/", json=payload)
+    assert create_resp.status_code == 201
+
+    match_resp = await authenticated_client.post("/documents/label-sets/match", json=shared_labels[::-1])
+    assert match_resp.status_code == 200
+    matched = match_resp.json()
+    assert sorted(document["hash"] for document in matched) == sorted(document["hash"] for document in payload[:2])
+    assert matched[0]["labels_fingerprint"] == matched[1]["labels_fingerprint"]
+
+    groups_resp = await authenticated_client.get("/documents/label-sets")
+    assert groups_resp.status_code == 200
+    groups = groups_resp.json()
+    assert groups["total"] == 2
+    assert [group["total"] for group in groups["items"]] == [2, 1]
+    assert groups["items"][0]["labels_fingerprint"] == matched[0]["labels_fingerprint"]
+
+    shared_resp = await authenticated_client.get("/documents/label-sets", params={"min_size": 2})
+    assert shared_resp.json()["total"] == 1
+
+    fingerprint = groups["items"][1]["labels_fingerprint"]
+    single_resp = await authenticated_client.get(f"/documents/label-sets/{fingerprint}")
+    assert [document["hash"] for document in single_resp.json()] == [payload[2]["hash"]]
+
+
+async def test_deleting_label_refreshes_fingerprints(authenticated_client):
+    labels = [{"key": "ipv4", "value": "10.0.9.9"}, {"key": "zone", "value": "z1"}]
+    payload = [{"hash": uuid4().hex, "type": "server", "created_by": "pytest", "labels": labels}]
+    assert (await authenticated_client.post("/documents/", json=payload)).status_code == 201
+
+    zone = next(label for label in (await authenticated_client.get("/labels/")).json() if label["key"] == "zone")
+    assert (await authenticated_client.delete(f"/labels/{zone['id']}")).status_code == 200
+
+    match_resp = await authenticated_client.post("/documents/label-sets/match", json=labels[:1])
+    assert [document["hash"] for document in match_resp.json()] == [payload[0]["hash"]]
+    assert match_resp.json()[0]["labels_string"] == "ipv4=10.0.9.9"
+
+
+def test_upgrade_fingerprints_existing_rows(tmp_path):
+    engine = create_engine("sqlite:///{}".format(tmp_path / "old.db"))
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        connection.exec_driver_sql("DROP INDEX ix_documents_labels_fingerprint")
+        connection.exec_driver_sql("ALTER TABLE documents DROP COLUMN labels_fingerprint")
+        document_id, label_id, type_id = uuid4(), uuid4(), uuid4()
+        connection.execute(model_label.Label.__table__.insert().values(id=label_id, key="ipv4", value="10.0.1.1"))
+        connection.exec_driver_sql(
+            "INSERT INTO documents (id, hash, type_id, created_by) VALUES (?, 'old', ?, 'pytest')",
+            (document_id.hex, type_id.hex)
+        )
+        connection.execute(document_label.insert().values(document_id=document_id, label_id=label_id))
+
+    with engine.begin() as connection:
+        model_document.add_labels_fingerprint(connection)
+        fingerprint = connection.execute(select(model_document.Document.labels_fingerprint)).scalar_one()
+    assert fingerprint == model_document.generate_labels_fingerprint([LabelBase(key="ipv4", value="10.0.1.1")])
+    engine.dispose()
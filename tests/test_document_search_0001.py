@@ -0,0 +1,161 @@
+import json
+import uuid
+import pytest
+from sqlalchemy import create_engine, func, select
+from database import Base
+from models import model_label
+from models.model_relationship import document_label
+from services import service_components
+from factory import factory_documents
+
+ENVIRONMENTS = 10
+
+
+@pytest.fixture
+async def inventory(authenticated_client):
+    service_components.components.index = None
+    documents = list(factory_documents.generate_documents(ENVIRONMENTS * factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+    response = await authenticated_client.post("/documents/", json=documents)
+    assert response.status_code == 201
+    ids = {document["hash"]: document["id"] for group in response.json().values() for document in group}
+    yield documents, ids
+    service_components.components.index = None
+
+
+async def search(client, document_id, **options):
+    response = await client.post("/documents/search", json=dict({"document_uuid": document_id, "labels": []}, **options))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture(params=["memory", "database"])
+def strategy(request):
+    return request.param
+
+
+async def test_search_skips_hub_labels(authenticated_client, inventory, strategy):
+    documents, ids = inventory
+    database = documents[4]
+
+    result = await search(authenticated_client, ids[database["hash"]], strategy=strategy)
+    assert result["metadata"]["skipped_hubs"] == [{"key": "port", "value": "5432"}]
+    assert {document["hash"] for document in result["documents"]} == {documents[0]["hash"], database["hash"]}
+    assert result["documents"][0]["hash"] == database["hash"]
+
+    result = await search(authenticated_client, ids[database["hash"]], strategy=strategy, skip_hubs=False)
+    assert result["metadata"]["skipped_hubs"] == []
+    assert result["metadata"]["total_documents"] == 2 * ENVIRONMENTS
+
+
+async def test_search_filters(authenticated_client, inventory, strategy):
+    documents, ids = inventory
+    database = documents[4]
+
+    result = await search(authenticated_client, ids[database["hash"]], strategy=strategy, skip_hubs=False, deny_keys=["port"])
+    assert result["metadata"]["total_documents"] == 2
+
+    result = await search(authenticated_client, ids[database["hash"]], strategy=strategy, skip_hubs=False, allow_keys=["port"])
+    assert result["metadata"]["total_documents"] == ENVIRONMENTS
+
+    result = await search(authenticated_client, ids[database["hash"]], strategy=strategy, skip_hubs=False, allow_keys=["port"], max_fanout=3)
+    assert 3 <= result["metadata"]["total_documents"] <= 4
+
+    result = await search(authenticated_client, ids[database["hash"]], strategy=strategy, max_depth=0, by_type=True)
+    assert result["metadata"]["document_types"] == ["database"]
+    assert [document["hash"] for document in result["documents_by_type"]["database"]] == [database["hash"]]
+
+
+async def test_label_degrees(authenticated_client, inventory):
+    response = await authenticated_client.get("/labels/degrees", params={"limit": 2})
+    assert response.status_code == 200
+    page = response.json()
+    assert page["items"][0]["degree"] >= page["items"][1]["degree"]
+    port = next(item for item in (await authenticated_client.get("/labels/degrees", params={"limit": 1000})).json()["items"]
+                if (item["key"], item["value"]) == ("port", "5432"))
+    assert port["degree"] == ENVIRONMENTS
+    assert port["hub"] is True
+
+
+async def test_search_pages_with_cursor(authenticated_client, inventory, strategy):
+    documents, ids = inventory
+    options = {"strategy": strategy, "skip_hubs": False, "allow_keys": ["port"]}
+    everything = await search(authenticated_client, ids[documents[4]["hash"]], **options)
+
+    pages, cursor = [], None
+    while True:
+        page = await search(authenticated_client, ids[documents[4]["hash"]], limit=3, cursor=cursor, **options)
+        pages.extend(document["hash"] for document in page["documents"])
+        cursor = page["metadata"]["next_cursor"]
+        if cursor is None:
+            break
+        assert page["metadata"]["total_documents"] == 3
+    assert pages == [document["hash"] for document in everything["documents"]]
+
+    first = await search(authenticated_client, ids[documents[4]["hash"]], limit=3, **options)
+    response = await authenticated_client.post(
+        "/documents/search",
+        json={"document_uuid": ids[documents[4]["hash"]], "labels": [], "cursor": first["metadata"]["next_cursor"]}
+    )
+    assert response.status_code == 400
+
+
+async def test_search_streams_ndjson(authenticated_client, inventory, strategy):
+    documents, ids = inventory
+    response = await authenticated_client.post(
+        "/documents/search",
+        json={"document_uuid": ids[documents[4]["hash"]], "labels": [], "strategy": strategy, "skip_hubs": False, "limit": 5},
+        headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    *items, last = lines
+    assert len(items) == 5
+    assert items[0]["hash"] == documents[4]["hash"] and items[0]["depth"] == 0
+    assert [item["depth"] for item in items] == sorted(item["depth"] for item in items)
+    assert last["metadata"]["total_documents"] == 5
+    assert last["metadata"]["next_cursor"]
+
+
+async def test_search_from_explicit_labels(authenticated_client, inventory, strategy):
+    documents, ids = inventory
+    labels_before = len((await authenticated_client.get("/labels/")).json())
+    options = {"strategy": strategy, "skip_hubs": False, "max_depth": 0}
+
+    result = await search(authenticated_client, ids[documents[0]["hash"]], labels=[{"key": "port", "value": "5432"}], **options)
+    assert result["metadata"]["total_documents"] == ENVIRONMENTS
+    assert {document["type"] for document in result["documents"]} == {"database"}
+    assert result["metadata"]["initial_labels"] == [{"key": "port", "value": "5432"}]
+
+    result = await search(authenticated_client, ids[documents[0]["hash"]], labels=[{"key": "port", "value": "1"}], **options)
+    assert result["metadata"]["total_documents"] == 0
+    assert len((await authenticated_client.get("/labels/")).json()) == labels_before
+
+
+async def test_label_degrees_follow_writes(authenticated_client, async_session, inventory):
+    documents, ids = inventory
+    deleted = [ids[document["hash"]] for document in documents[:factory_documents.DOCUMENTS_PER_ENVIRONMENT]]
+    assert (await authenticated_client.request("DELETE", "/documents/", json=deleted)).status_code == 200
+
+    linked = select(func.count()).where(document_label.c.label_id == model_label.Label.id).scalar_subquery()
+    rows = (await async_session.execute(select(model_label.Label.degree, linked))).all()
+    assert rows and all(degree == links for degree, links in rows)
+
+
+def test_upgrade_counts_existing_label_degrees(tmp_path):
+    engine = create_engine("sqlite:///{}".format(tmp_path / "old.db"))
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        for trigger in ("document_label_degree_insert", "document_label_degree_delete"):
+            connection.exec_driver_sql("DROP TRIGGER {}".format(trigger))
+        connection.exec_driver_sql("DROP INDEX ix_labels_degree")
+        connection.exec_driver_sql("ALTER TABLE labels DROP COLUMN degree")
+        label_id = uuid.uuid4()
+        connection.exec_driver_sql("INSERT INTO labels (id, key, value) VALUES (?, 'ipv4', '10.0.1.1')", (label_id.hex,))
+        connection.execute(document_label.insert().values(document_id=uuid.uuid4(), label_id=label_id))
+
+    with engine.begin() as connection:
+        model_label.add_label_degrees(connection)
+        connection.execute(document_label.insert().values(document_id=uuid.uuid4(), label_id=label_id))
+        assert connection.execute(select(model_label.Label.degree)).scalar_one() == 2
+    engine.dispose()
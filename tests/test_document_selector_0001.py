@@ -0,0 +1,76 @@
+import os
+import json
+import pytest
+from fastapi import HTTPException
+from services import service_selector
+
+DOCUMENTS_PATH = os.path.join(os.path.dirname(__file__), "..", "documents.json")
+
+
+def test_parse_selector():
+    requirements = service_selector.parse("type=app, port != 5432,ipv4 in (10.0.1.1, 10.0.1.2),queue notin (q),domain,!s3")
+    assert requirements == [
+        service_selector.Requirement("type", service_selector.EQUALS, ("app",)),
+        service_selector.Requirement("port", service_selector.NOT_EQUALS, ("5432",)),
+        service_selector.Requirement("ipv4", service_selector.IN, ("10.0.1.1", "10.0.1.2")),
+        service_selector.Requirement("queue", service_selector.NOT_IN, ("q",)),
+        service_selector.Requirement("domain", service_selector.EXISTS),
+        service_selector.Requirement("s3", service_selector.NOT_EXISTS),
+    ]
+    assert service_selector.parse("") == []
+
+
+@pytest.mark.parametrize("selector", ["port=", "port in 5432", "ipv4 in (a,b", "a b", "a,", "!"])
+def test_parse_invalid_selector(selector):
+    with pytest.raises(HTTPException) as error:
+        service_selector.parse(selector)
+    assert error.value.status_code == 400
+
+
+def test_plan_orders_by_selectivity():
+    requirements = service_selector.parse("ipv4,port=5432,!s3,database")
+    counts = {("ipv4", "a"): 30, ("ipv4", "b"): 9, ("port", "5432"): 3, ("database", "x"): 6, ("s3", "y"): 2}
+    positive, negative = service_selector.plan(requirements, counts)
+    assert [requirement.key for requirement in positive] == ["port", "database", "ipv4"]
+    assert [requirement.key for requirement in negative] == ["s3"]
+
+
+async def test_select_documents_by_labels(authenticated_client):
+    with open(DOCUMENTS_PATH) as documents_file:
+        documents = list({document["hash"]: document for document in json.load(documents_file)}.values())
+    # Every fixture document without a domain has an ipv4; this one has neither.
+    documents.append({
+        "hash": "selector-0001", "type": "backup", "created_by": "pytest",
+        "labels": [{"key": "port", "value": "5432"}], "document": {}
+    })
+    create_resp = await authenticated_client.post("/documents/", json=documents)
+    assert create_resp.status_code == 201
+
+    async def select(selector):
+        response = await authenticated_client.get("/documents/select", params={"selector": selector})
+        assert response.status_code == 200
+        return sorted(document["hash"] for document in response.json())
+
+    def expected(predicate):
+        return sorted(
+            document["hash"] for document in documents
+            if predicate({(label["key"], label["value"]) for label in document["labels"]})
+        )
+
+    assert await select("port=5432") == expected(lambda labels: ("port", "5432") in labels)
+    assert await select("port in (5432,5672),domain") == expected(
+        lambda labels: labels & {("port", "5432"), ("port", "5672")} and any(key == "domain" for key, _ in labels)
+    )
+    assert await select("ipv4,!domain") == expected(
+        lambda labels: any(key == "ipv4" for key, _ in labels) and not any(key == "domain" for key, _ in labels)
+    )
+    assert await select("domain,port!=5432,database notin (database-dev)") == expected(
+        lambda labels: any(key == "domain" for key, _ in labels)
+        and ("port", "5432") not in labels
+        and ("database", "database-dev") not in labels
+    )
+    assert await select("port=1") == []
+    assert len(await select("")) == len(documents)
+
+    invalid_resp = await authenticated_client.get("/documents/select", params={"selector": "port in 5432"})
+    assert invalid_resp.status_code == 400
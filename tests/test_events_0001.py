@@ -0,0 +1,93 @@
+import uuid
+import pytest
+from services import service_components, service_events, service_graph, service_index_store, service_similarity
+
+
+def other_worker_publishes(path: str, topic: str, payload) -> None:
+    """Log a change as another worker process would."""
+    wal = service_index_store.WriteAheadLog(path)
+    with wal.locked():
+        wal.read()
+        wal.append({"pid": 0, "topic": topic, "payload": service_events._encode(topic, payload)})
+    wal.close()
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Count the full loads of every index service, starting from none built."""
+    counted = {}
+    services = {
+        "components": service_components.components,
+        "similarity": service_similarity.similarity,
+        "graph": service_graph.graph,
+    }
+    for name, service in services.items():
+        load = service._load
+
+        async def counting(bind, name=name, load=load):
+            counted[name] = counted.get(name, 0) + 1
+            return await load(bind)
+
+        monkeypatch.setattr(service, "_load", counting)
+    service_components.components.index = None
+    service_similarity.similarity.index = None
+    service_graph.graph.reset()
+    yield counted
+    service_components.components.index = None
+    service_similarity.similarity.index = None
+    service_graph.graph.reset()
+
+
+async def test_other_workers_writes_are_replayed(async_session, loads):
+    components = await service_components.components.get(async_session)
+    similarity = await service_similarity.similarity.get(async_session)
+    graph = await service_graph.graph.get(async_session)
+    assert loads == {"components": 1, "similarity": 1, "graph": 1}
+
+    document_id, label_id = uuid.uuid4(), uuid.uuid4()
+    other_worker_publishes(service_events.JOURNAL_FILE, service_events.DOCUMENTS_UPSERTED, [(document_id, [(label_id, "ipv4", "10.0.0.1")])])
+
+    assert (await service_components.components.get(async_session)).related(document_id) == [document_id]
+    assert document_id in (await service_similarity.similarity.get(async_session)).features
+    graph = await service_graph.graph.get(async_session)
+    assert graph.index_of(document_id) is not None
+
+    other_worker_publishes(service_events.JOURNAL_FILE, service_events.DOCUMENTS_DELETED, [document_id])
+    assert document_id not in (await service_similarity.similarity.get(async_session)).features
+    assert graph.index_of(document_id) is None
+    assert components is service_components.components.index
+    assert loads == {"components": 1, "similarity": 1, "graph": 1}
+
+
+def test_own_records_are_skipped_and_missed_ones_reported(tmp_path):
+    path = str(tmp_path / "events")
+    replayed, missed = [], []
+    reader = service_events.Journal(path)
+    service_events.subscribe(service_events.LABELS_DELETED, replayed.extend, remote=True)
+    service_events.subscribe(service_events.MISSED, missed.append)
+    try:
+        label_id = uuid.uuid4()
+        reader.append(service_events.LABELS_DELETED, [uuid.uuid4()])
+        other_worker_publishes(path, service_events.LABELS_DELETED, [label_id])
+        reader.catch_up()
+        assert replayed == [label_id]
+        assert missed == []
+
+        # Another worker drops records this one never read.
+        for _ in range(3):
+            other_worker_publishes(path, service_events.LABELS_DELETED, [uuid.uuid4()])
+        wal = service_index_store.WriteAheadLog(path)
+        with wal.locked():
+            wal.read()
+            wal.truncate(wal.sequence - 1)
+        reader.catch_up()
+        assert len(replayed) == 1
+        assert missed == [None]
+
+        other_worker_publishes(path, service_events.LABELS_DELETED, [label_id])
+        reader.catch_up()
+        assert replayed == [label_id, label_id]
+        assert missed == [None]
+    finally:
+        service_events.unsubscribe(service_events.LABELS_DELETED, replayed.extend)
+        service_events.unsubscribe(service_events.MISSED, missed.append)
@@ -0,0 +1,35 @@
+import os
+import json
+from factory import factory_documents
+from repository import repository_document
+
+DOCUMENTS_PATH = os.path.join(os.path.dirname(__file__), "..", "documents.json")
+
+
+def test_generator_reproduces_fixture_topology():
+    with open(DOCUMENTS_PATH) as documents_file:
+        fixture = json.load(documents_file)
+
+    generated = list(factory_documents.generate_documents(len(fixture)))
+    assert [(document["type"], document["labels"], document["document"]) for document in generated] == [
+        (document["type"], document["labels"], document.get("document", {})) for document in fixture
+    ]
+
+
+def test_generator_scales_with_unique_hashes_and_addresses():
+    total = 50 * factory_documents.DOCUMENTS_PER_ENVIRONMENT
+    documents = list(factory_documents.generate_documents(total))
+    assert len(documents) == total
+    assert len({document["hash"] for document in documents}) == total
+    servers = [document["labels"][0]["value"] for document in documents if document["type"] == "server"]
+    assert len(set(servers)) == len(servers)
+
+
+async def test_seed_database(async_session):
+    documents = list(factory_documents.generate_documents(100))
+    await factory_documents.seed_database(async_session, documents, batch_size=30)
+
+    listed = await repository_document.list_all(async_session)
+    assert sum(len(items) for items in listed.values()) == 100
+    databases = await repository_document.list_by_selector(async_session, "port=5432")
+    assert len(databases) == sum(1 for document in documents if {"key": "port", "value": "5432"} in document["labels"])
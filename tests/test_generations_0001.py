@@ -0,0 +1,70 @@
+import os
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+import database
+from services import service_auth, service_generations
+
+
+@pytest.fixture
+def other_worker():
+    """A second mapping of the shared counters, standing in for another worker process."""
+    return service_generations.Generations(service_generations.GENERATIONS_FILE)
+
+
+def test_tracker_sees_only_other_workers_writes(other_worker):
+    tracker = service_generations.Tracker((service_generations.DOCUMENTS,))
+
+    service_generations.bump(service_generations.DOCUMENTS)
+    assert not tracker.changed_elsewhere()
+
+    other_worker.bump(service_generations.DOCUMENTS)
+    service_generations.bump(service_generations.DOCUMENTS)
+    assert tracker.changed_elsewhere()
+    assert not tracker.changed_elsewhere()
+
+    other_worker.bump(service_generations.USERS)
+    assert not tracker.changed_elsewhere()
+
+
+def test_cache_entries_expire_on_any_workers_write(other_worker):
+    cache = service_generations.GenerationCache("test-labels", (service_generations.LABELS,), maxsize=2)
+    cache.put("a", 1, cache.stamp())
+    assert cache.get("a") == 1
+
+    other_worker.bump(service_generations.LABELS)
+    assert cache.get("a") is None
+
+    # A stamp taken before a write makes what was read before it stale.
+    stamp = cache.stamp()
+    service_generations.bump(service_generations.LABELS)
+    cache.put("a", 2, stamp)
+    assert cache.get("a") is None
+
+    for key in "abc":
+        cache.put(key, key, cache.stamp())
+    assert list(cache.entries) == ["b", "c"]
+
+
+async def test_authenticated_user_is_cached(authenticated_client, other_worker):
+    service_auth.users.clear()
+    first = await authenticated_client.get("/user/profile")
+    assert first.status_code == 200
+    user_uuid = next(iter(service_auth.users.entries))
+    assert service_auth.users.get(user_uuid) is not None
+
+    second = await authenticated_client.get("/user/profile")
+    assert second.json() == first.json()
+
+    other_worker.bump(service_generations.USERS)
+    assert service_auth.users.get(user_uuid) is None
+    assert (await authenticated_client.get("/user/profile")).json() == first.json()
+
+
+def test_shared_files_follow_the_database(tmp_path):
+    path = str(tmp_path / "app.db")
+    writer = create_async_engine("sqlite+aiosqlite:///{}".format(path))
+    reader = create_async_engine(database.read_only_url(path))
+    assert database.shared_file(writer, "-generations") == database.shared_file(reader, "-generations") == path + "-generations"
+    assert database.shared_file(create_async_engine("sqlite+aiosqlite:///:memory:"), "-generations") is None
+    assert service_generations.GENERATIONS_FILE == database.shared_file(database.async_engine, "-generations")
+    assert os.path.dirname(service_generations.GENERATIONS_FILE) != os.getcwd()
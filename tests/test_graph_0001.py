@@ -0,0 +1,83 @@
+import pytest
+from services import service_graph
+from factory import factory_documents
+
+ENVIRONMENTS = 10
+
+
+@pytest.fixture
+async def inventory(authenticated_client):
+    service_graph.graph.reset()
+    documents = list(factory_documents.generate_documents(ENVIRONMENTS * factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+    response = await authenticated_client.post("/documents/", json=documents)
+    assert response.status_code == 201
+    ids = {document["hash"]: document["id"] for group in response.json().values() for document in group}
+    yield documents, ids
+    service_graph.graph.reset()
+
+
+async def test_shortest_path(authenticated_client, inventory):
+    documents, ids = inventory
+    server, app = documents[9], documents[8]
+
+    response = await authenticated_client.get("/graph/path", params={"source": ids[server["hash"]], "target": ids[app["hash"]]})
+    assert response.status_code == 200
+    path = response.json()
+    assert path["length"] == 2
+    assert [step["document"]["type"]["name"] for step in path["steps"]] == ["server", "balancer", "app"]
+    assert path["steps"][0]["via"] is None
+    assert path["steps"][1]["via"] == {"key": "ipv4", "value": server["labels"][0]["value"]}
+    assert path["steps"][2]["via"] == {"key": "ipv4", "value": app["labels"][0]["value"]}
+
+    response = await authenticated_client.get("/graph/path", params={
+        "source": ids[server["hash"]], "target": ids[app["hash"]], "max_depth": 1
+    })
+    assert response.status_code == 404
+
+    response = await authenticated_client.get("/graph/path", params={"source": ids[server["hash"]], "target": ids[documents[0]["hash"]]})
+    assert response.status_code == 404
+
+
+async def test_shortest_path_through_hubs(authenticated_client, inventory):
+    documents, ids = inventory
+    database, other = documents[4], documents[factory_documents.DOCUMENTS_PER_ENVIRONMENT + 4]
+    params = {"source": ids[database["hash"]], "target": ids[other["hash"]]}
+
+    assert (await authenticated_client.get("/graph/path", params=params)).status_code == 404
+    path = (await authenticated_client.get("/graph/path", params=dict(params, skip_hubs=False))).json()
+    assert path["length"] == 1
+    assert path["steps"][1]["via"] == {"key": "port", "value": "5432"}
+
+
+async def test_neighbourhood(authenticated_client, inventory):
+    documents, ids = inventory
+    server, database = documents[9], documents[4]
+
+    response = await authenticated_client.get("/graph/neighbourhood/{}".format(ids[server["hash"]]), params={"k": 3, "document_ids": True})
+    assert response.status_code == 200
+    result = response.json()
+    assert [(hop["depth"], hop["documents"]) for hop in result["hops"]] == [(0, 1), (1, 1), (2, 3)]
+    assert result["hops"][0]["document_ids"] == [ids[server["hash"]]]
+    assert result["hops"][1]["document_ids"] == [ids[documents[12]["hash"]]]
+    assert result["total_documents"] == 5
+
+    result = (await authenticated_client.get("/graph/neighbourhood/{}".format(ids[database["hash"]]), params={"k": 1})).json()
+    assert result["hops"][1]["documents"] == 1
+    assert result["skipped_hubs"] == [{"key": "port", "value": "5432"}]
+    result = (await authenticated_client.get("/graph/neighbourhood/{}".format(ids[database["hash"]]), params={"k": 1, "skip_hubs": False})).json()
+    assert result["hops"][1]["documents"] == ENVIRONMENTS
+
+
+async def test_graph_follows_writes(authenticated_client, inventory):
+    documents, ids = inventory
+    server = documents[9]
+    before = (await authenticated_client.get("/graph/neighbourhood/{}".format(ids[server["hash"]]), params={"k": 1})).json()
+
+    response = await authenticated_client.post("/documents/", json=[{
+        "hash": "graph-0001", "type": "backup", "created_by": "pytest",
+        "labels": [{"key": "ipv4", "value": server["labels"][0]["value"]}], "document": {}
+    }])
+    assert response.status_code == 201
+
+    after = (await authenticated_client.get("/graph/neighbourhood/{}".format(ids[server["hash"]]), params={"k": 1})).json()
+    assert after["hops"][1]["documents"] == before["hops"][1]["documents"] + 1
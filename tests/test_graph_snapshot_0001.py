@@ -0,0 +1,75 @@
+import os
+import uuid
+import pytest
+from services import service_events, service_graph, service_index_store
+from factory import factory_documents
+
+ENVIRONMENTS = 3
+
+
+@pytest.fixture
+async def workers(authenticated_client, tmp_path):
+    """Two graph services on one directory; only the first hears this process's writes, like the worker that served them."""
+    serving, other = service_graph.GraphService(str(tmp_path)), service_graph.GraphService(str(tmp_path))
+    service_events.subscribe(service_events.DOCUMENTS_UPSERTED, serving.on_upserted)
+    service_events.subscribe(service_events.DOCUMENTS_DELETED, serving.on_deleted)
+    documents = list(factory_documents.generate_documents(ENVIRONMENTS * factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+    response = await authenticated_client.post("/documents/", json=documents)
+    assert response.status_code == 201
+    yield serving, other, documents
+    service_events.unsubscribe(service_events.DOCUMENTS_UPSERTED, serving.on_upserted)
+    service_events.unsubscribe(service_events.DOCUMENTS_DELETED, serving.on_deleted)
+    serving.reset()
+    other.reset()
+
+
+async def test_workers_share_one_snapshot(async_session, workers):
+    serving, other, documents = workers
+    first = await serving.get(async_session)
+    second = await other.get(async_session)
+    assert isinstance(second.documents, service_index_store.FixedStrings)
+    assert second.document_count == first.document_count == len(documents)
+
+
+async def test_writes_reach_other_workers(authenticated_client, async_session, workers):
+    serving, other, documents = workers
+    await serving.get(async_session)
+    await other.get(async_session)
+
+    response = await authenticated_client.post("/documents/", json=[{
+        "hash": "snapshot-0001", "type": "backup", "created_by": "pytest",
+        "labels": [{"key": "ipv4", "value": documents[9]["labels"][0]["value"]}], "document": {}
+    }])
+    assert response.status_code == 201
+    document_id = uuid.UUID(response.json()["backup"][0]["id"])
+    graph = await other.get(async_session)
+    assert graph.index_of(document_id) is not None
+    assert graph.document_count == len(documents) + 1
+
+    # And the other way round: a write logged by the other worker.
+    other.on_deleted([document_id])
+    assert (await serving.get(async_session)).index_of(document_id) is None
+
+
+async def test_checkpoint_publishes_next_version(async_session, workers, tmp_path):
+    serving, other, documents = workers
+    await serving.get(async_session)
+    before = await other.get(async_session)
+    first_version = service_index_store.current(str(tmp_path))
+
+    other.on_deleted([before.document_id(0)])
+    await serving.checkpoint()
+    version = service_index_store.current(str(tmp_path))
+    assert version != first_version
+    assert sorted(file for file in os.listdir(tmp_path) if file.endswith(".idx")) == sorted([first_version, version])
+
+    after = await other.get(async_session)
+    assert after is not before
+    assert after.changed == {}
+    assert after.document_count == len(documents) - 1
+
+    # One checkpoint at a time: a worker finding the lock taken skips its own.
+    with service_index_store.exclusive(str(tmp_path / service_graph.CHECKPOINT_LOCK)) as held:
+        assert held
+        await other.checkpoint()
+    assert service_index_store.current(str(tmp_path)) == version
@@ -0,0 +1,36 @@
+import random
+import pytest
+from utils.histogram import Histogram
+
+
+def test_small_values_are_exact():
+    histogram = Histogram()
+    for value in range(100):
+        histogram.record(value)
+    assert histogram.total == 100
+    assert histogram.min == 0 and histogram.max == 99
+    assert histogram.percentile(50) == 49
+    assert histogram.percentile(100) == 99
+
+
+@pytest.mark.parametrize("percentile", [50, 90, 99, 99.9])
+def test_relative_error_is_bounded(percentile):
+    generator = random.Random(7)
+    values = sorted(int(generator.lognormvariate(8, 2)) for _ in range(20000))
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    exact = values[max(0, round(percentile / 100 * len(values)) - 1)]
+    assert abs(histogram.percentile(percentile) - exact) <= exact / 64 + 1
+
+
+def test_merge():
+    left, right, both = Histogram(), Histogram(), Histogram()
+    for value in range(0, 10000, 3):
+        left.record(value)
+        both.record(value)
+    for value in range(5, 50000, 7):
+        right.record(value)
+        both.record(value)
+    left.merge(right)
+    assert left.to_dict() == both.to_dict()
@@ -0,0 +1,137 @@
+import os
+import pytest
+from array import array
+from services import service_events, service_graph, service_index_store
+from factory import factory_documents
+
+HANDLERS = ("on_upserted", "on_deleted", "on_labels_deleted")
+TOPICS = (service_events.DOCUMENTS_UPSERTED, service_events.DOCUMENTS_DELETED, service_events.LABELS_DELETED)
+
+
+def small_graph() -> service_graph.LabelGraph:
+    documents = ["{:032x}".format(number) for number in range(4)]
+    labels = [("{:032x}".format(number), key, value) for number, (key, value) in enumerate([("ipv4", "10.0.0.1"), ("port", "5432"), ("zone", "é")])]
+    edges = (array("i", [0, 1, 1, 2, 3]), array("i", [0, 0, 1, 1, 2]))
+    return service_graph.LabelGraph.from_edges(documents, labels, edges)
+
+
+def shape(graph: service_graph.LabelGraph):
+    documents = sorted(graph.document_id(document).hex for document in range(graph.base_documents + len(graph.new_documents)) if graph.changed.get(document) != ())
+    return {
+        document_id: sorted(graph.label_pair(label) for label in graph.labels_of(graph._document(document_id)) if label not in graph.deleted_labels)
+        for document_id in documents
+    }
+
+
+@pytest.fixture
+def persistent(tmp_path):
+    service = service_graph.GraphService(str(tmp_path))
+    for topic, handler in zip(TOPICS, HANDLERS):
+        service_events.subscribe(topic, getattr(service, handler))
+    yield service
+    for topic, handler in zip(TOPICS, HANDLERS):
+        service_events.unsubscribe(topic, getattr(service, handler))
+    service.reset()
+
+
+def test_index_file_round_trip(tmp_path):
+    graph = small_graph()
+    path = str(tmp_path / "graph.idx")
+    graph.save(path, 7)
+
+    mapped, sequence = service_graph.LabelGraph.open(path)
+    assert sequence == 7
+    assert isinstance(mapped.documents, service_index_store.FixedStrings)
+    assert shape(mapped) == shape(graph)
+    assert mapped.label_pair(2) == ("zone", "é")
+    assert list(mapped.documents_of(1)) == [1, 2]
+    assert mapped.shortest_path(0, 2) == graph.shortest_path(0, 2)
+
+    with open(path, "r+b") as file:
+        file.write(b"garbage!")
+    with pytest.raises(service_index_store.CorruptIndex):
+        service_graph.LabelGraph.open(path)
+
+
+def test_overlay_compacts_to_same_graph(tmp_path):
+    graph = small_graph()
+    graph.upsert("{:032x}".format(9), [("{:032x}".format(0), "ipv4", "10.0.0.1"), ("{:032x}".format(8), "rack", "a")])
+    graph.upsert("{:032x}".format(1), [("{:032x}".format(8), "rack", "a")])
+    graph.delete("{:032x}".format(3))
+    graph.delete_label("{:032x}".format(1))
+    assert graph.document_count == 4
+    assert sorted(graph.documents_of(0)) == [0, 4]
+
+    labels = range(graph.base_labels + len(graph.new_labels))
+    assert [graph.degree(label) for label in labels] == [len(graph.documents_of(label)) for label in labels] == [2, 1, 0, 2]
+    assert list(graph.documents_of(1)) == [2] and list(graph.documents_of(2)) == []
+
+    compacted = graph.compact()
+    assert shape(compacted) == shape(graph)
+    assert compacted.changed == {}
+    assert compacted.document_count == 4
+
+
+def test_write_ahead_log_stops_at_torn_tail(tmp_path):
+    path = str(tmp_path / "graph.wal")
+    wal = service_index_store.WriteAheadLog(path)
+    with wal.locked():
+        for number in range(3):
+            wal.read()
+            wal.append({"op": "delete", "documents": [str(number)]})
+    with open(path, "ab") as file:
+        file.write(b'4 00000000 {"op":"del')
+
+    wal = service_index_store.WriteAheadLog(path)
+    assert [sequence for sequence, _ in wal.read()] == [1, 2, 3]
+    assert wal.sequence == 3
+    with wal.locked():
+        wal.repair()
+    assert open(path, "rb").read().endswith(b"\n")
+
+    with wal.locked():
+        wal.truncate(2)
+    assert service_index_store.WriteAheadLog(path).read() == [
+        (2, {"op": wal.CHECKPOINT}),
+        (3, {"op": "delete", "documents": ["2"]})
+    ]
+
+
+async def test_warm_start_from_index_file(authenticated_client, async_session, persistent, tmp_path):
+    documents = list(factory_documents.generate_documents(3 * factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+    response = await authenticated_client.post("/documents/", json=documents)
+    assert response.status_code == 201
+    graph = await persistent.get(async_session)
+    assert service_index_store.current(str(tmp_path)) == service_graph.SNAPSHOT_FILE.format(1)
+
+    response = await authenticated_client.post("/documents/", json=[{
+        "hash": "index-0001", "type": "backup", "created_by": "pytest",
+        "labels": [{"key": "ipv4", "value": documents[9]["labels"][0]["value"]}], "document": {}
+    }])
+    assert response.status_code == 201
+    assert graph.document_count == len(documents) + 1
+
+    warm = service_graph.GraphService(str(tmp_path))
+    opened = await warm.get(async_session)
+    assert isinstance(opened.documents, service_index_store.FixedStrings)
+    assert len(warm.unsaved) == 1
+    assert shape(opened) == shape(graph)
+    warm.reset()
+
+    await persistent.checkpoint()
+    assert [record["op"] for _, record in service_index_store.WriteAheadLog(str(tmp_path / service_graph.WAL_FILE)).read()] == ["checkpoint"]
+    warm = service_graph.GraphService(str(tmp_path))
+    opened = await warm.get(async_session)
+    assert opened.changed == {} and shape(opened) == shape(graph)
+    warm.reset()
+
+    # A write the log missed: the snapshot no longer matches the database and is rebuilt.
+    for topic, handler in zip(TOPICS, HANDLERS):
+        service_events.unsubscribe(topic, getattr(persistent, handler))
+    document_id = response.json()["backup"][0]["id"]
+    assert (await authenticated_client.request("DELETE", "/documents/", json=[document_id])).status_code == 200
+    warm = service_graph.GraphService(str(tmp_path))
+    opened = await warm.get(async_session)
+    assert opened.document_count == len(documents)
+    assert opened.changed == {}
+    warm.reset()
@@ -0,0 +1,59 @@
+import io
+import json
+import queue
+import logging
+from services import service_log
+
+
+def make_record(name="athross.test", level=logging.INFO, **extra):
+    record = logging.LogRecord(name, level, __file__, 1, "hello %s", ("world",), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter():
+    line = service_log.JsonFormatter().format(make_record(request_id="abc", status=200))
+    entry = json.loads(line)
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "athross.test"
+    assert entry["request_id"] == "abc"
+    assert entry["status"] == 200
+
+
+def test_sampling_filter():
+    sampling = service_log.SamplingFilter({"athross.http": 0.0})
+    assert not sampling.filter(make_record("athross.http"))
+    assert not sampling.filter(make_record("athross.http.access"))
+    assert sampling.filter(make_record("athross.http", logging.WARNING))
+    assert sampling.filter(make_record("athross.sql"))
+    assert sampling.filter(make_record("athross.http", sample_rate=1.0))
+    assert service_log.parse_rates("athross.http=0.1, athross.sql=1") == {"athross.http": 0.1, "athross.sql": 1.0}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = service_log.NonBlockingQueueHandler(queue.Queue(1))
+    dropped = service_log.log_records_dropped.get()
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.queue.qsize() == 1
+    assert service_log.log_records_dropped.get() == dropped + 1
+
+
+async def test_request_id_in_logs(async_client):
+    stream = io.StringIO()
+    service_log.configure(level="INFO", path="", sample_rates={}, stream=stream)
+    try:
+        response = await async_client.get("/user/profile", headers={"X-Request-ID": "req-123"})
+        assert response.headers["x-request-id"] == "req-123"
+
+        response = await async_client.get("/user/profile", headers={"X-Request-ID": "bad id\n"})
+        generated = response.headers["x-request-id"]
+        assert generated != "bad id\n" and len(generated) == 32
+    finally:
+        service_log.configure()
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    access = [entry for entry in entries if entry["logger"] == "athross.http"]
+    assert [entry["request_id"] for entry in access] == ["req-123", generated]
+    assert access[0]["status"] == 401
+    assert access[0]["path"] == "/user/profile"
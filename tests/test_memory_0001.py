@@ -0,0 +1,43 @@
+import pytest
+from services import service_memory
+from factory import factory_documents
+
+
+@pytest.fixture
+def memory_profiling():
+    yield
+    service_memory.stop()
+
+
+async def test_memory_profiling_is_opt_in(authenticated_client):
+    response = await authenticated_client.get("/debug/memory/snapshot")
+    assert response.status_code == 409
+
+
+async def test_per_endpoint_memory(authenticated_client, memory_profiling, debug_endpoints):
+    response = await authenticated_client.post("/debug/memory/start", params={"frames": 5})
+    assert response.status_code == 200
+    assert response.json()["enabled"] is True
+
+    assert (await authenticated_client.get("/debug/memory/diff")).status_code == 409
+    snapshot = await authenticated_client.get("/debug/memory/snapshot", params={"limit": 5})
+    assert snapshot.status_code == 200
+    assert 0 < len(snapshot.json()["statistics"]) <= 5
+
+    documents = factory_documents.generate_environment(0)
+    assert (await authenticated_client.post("/documents/", json=documents)).status_code == 201
+    assert (await authenticated_client.get("/documents/")).status_code == 200
+
+    summary = (await authenticated_client.get("/debug/memory")).json()
+    listing = summary["endpoints"]["GET /documents/"]
+    assert listing["requests"] == 1
+    assert listing["peak_bytes_max"] > 0
+    assert listing["identity_map_max"] >= len(documents)
+    assert summary["endpoints"]["POST /documents/"]["identity_map_max"] >= len(documents)
+
+    diff = await authenticated_client.get("/debug/memory/diff", params={"limit": 3, "group_by": "filename"})
+    assert diff.status_code == 200
+    assert {"size_diff_bytes", "count_diff", "traceback"} <= set(diff.json()["statistics"][0])
+
+    assert (await authenticated_client.post("/debug/memory/stop")).status_code == 200
+    assert not service_memory.enabled()
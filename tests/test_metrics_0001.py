@@ -0,0 +1,41 @@
+from services import service_metrics
+
+
+def test_histogram_render():
+    histogram = service_metrics.Histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{route="/a",le="0.1"} 1',
+        'test_seconds_bucket{route="/a",le="1"} 2',
+        'test_seconds_bucket{route="/a",le="+Inf"} 3',
+        'test_seconds_sum{route="/a"} 5.55',
+        'test_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_cache_hit_ratio():
+    service_metrics.record_cache("test-cache", True)
+    service_metrics.record_cache("test-cache", True)
+    service_metrics.record_cache("test-cache", False)
+    assert 'cache_hit_ratio{cache="test-cache"} 0.6666666666666666' in service_metrics.registry.render()
+
+
+async def test_metrics_endpoint(authenticated_client, async_session):
+    service_metrics.instrument_engine(async_session.bind.sync_engine)
+    queries_before = service_metrics.db_queries.get("SELECT")
+    requests_before = service_metrics.http_requests.get("GET", "/documents/label-sets/{fingerprint}", "200")
+
+    response = await authenticated_client.get("/documents/label-sets/unknown")
+    assert response.status_code == 200
+
+    metrics_resp = await authenticated_client.get("/metrics")
+    assert metrics_resp.status_code == 200
+    assert metrics_resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = metrics_resp.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_requests_in_flight{method="GET"} 1' in body
+    assert service_metrics.http_requests.get("GET", "/documents/label-sets/{fingerprint}", "200") == requests_before + 1
+    assert service_metrics.db_queries.get("SELECT") >= queries_before + 2
+    assert 'db_query_duration_seconds_bucket{operation="SELECT",le="+Inf"}' in body
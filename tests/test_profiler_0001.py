@@ -0,0 +1,67 @@
+import time
+import asyncio
+import threading
+from services import service_profiler
+
+
+def spin_for_profile(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+async def test_profile_collapsed(authenticated_client, debug_endpoints):
+    response, _ = await asyncio.gather(
+        authenticated_client.get("/debug/profile", params={"seconds": 0.3, "interval_ms": 2}),
+        asyncio.to_thread(spin_for_profile, 0.5),
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert any("spin_for_profile" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+
+async def test_profile_speedscope(authenticated_client, debug_endpoints):
+    response, _ = await asyncio.gather(
+        authenticated_client.get("/debug/profile", params={"seconds": 0.2, "format": "speedscope"}),
+        asyncio.to_thread(spin_for_profile, 0.4),
+    )
+    assert response.status_code == 200
+    document = response.json()
+    frames = document["shared"]["frames"]
+    assert any(frame["name"] == "spin_for_profile" for frame in frames)
+    for profile in document["profiles"]:
+        assert profile["type"] == "sampled"
+        assert len(profile["samples"]) == len(profile["weights"])
+        assert all(index < len(frames) for sample in profile["samples"] for index in sample)
+
+
+async def test_profile_is_exclusive_and_requires_auth(authenticated_client, debug_endpoints):
+    service_profiler.SamplingProfiler._lock.acquire()
+    try:
+        assert (await authenticated_client.get("/debug/profile", params={"seconds": 0.1})).status_code == 409
+    finally:
+        service_profiler.SamplingProfiler._lock.release()
+
+    authenticated_client.cookies.clear()
+    assert (await authenticated_client.get("/debug/profile")).status_code == 401
+
+
+def test_idle_threads_are_skipped():
+    event = threading.Event()
+    waiter = threading.Thread(target=event.wait, name="idle-waiter")
+    waiter.start()
+    try:
+        profiler = service_profiler.SamplingProfiler(0.005)
+        profiler.run(0.05)
+        assert not any(thread == "idle-waiter" for thread, _ in profiler.samples)
+    finally:
+        event.set()
+        waiter.join()
+
+
+async def test_profiling_endpoints_are_off_by_default(authenticated_client):
+    assert (await authenticated_client.get("/debug/profile", params={"seconds": 0.1})).status_code == 404
+    assert (await authenticated_client.post("/debug/memory/start")).status_code == 404
+    assert (await authenticated_client.get("/debug/loop")).status_code == 200
@@ -0,0 +1,120 @@
+import pytest
+from uuid import uuid4
+from database import Base
+from api.schemas import schema_document, schema_document_type, schema_label, schema_user
+from repository import repository_document, repository_document_type, repository_label, repository_user
+from services import service_auth, service_label
+from utils import query_plan
+
+TABLES = set(Base.metadata.tables)
+
+# Listings return every row of the table on purpose; everything else must be
+# answered through an index.
+ALLOWED_FULL_SCANS = {
+    "repository_document.list_all": {"documents"},
+    "repository_document.create_or_update_documents": {"documents"},
+    "repository_document.list_by_selector[negative]": {"documents"},
+}
+
+
+def make_documents(total):
+    return [
+        schema_document.DocumentCreate(
+            hash=uuid4().hex,
+            type="server" if index % 2 else "dns",
+            created_by="pytest",
+            labels=[
+                schema_label.LabelBase(key="ipv4", value="10.0.1.{}".format(index)),
+                schema_label.LabelBase(key="env", value="dev" if index % 3 else "prd"),
+            ],
+            document={"index": index}
+        )
+        for index in range(total)
+    ]
+
+
+async def consume(rows):
+    return [row async for row in rows]
+
+
+async def run_cases(session, client):
+    await repository_document.create_or_update_documents(session, make_documents(10))
+    document_id = (await repository_document.list_by_selector(session, "ipv4=10.0.1.1"))[0].id
+    token = service_auth.create_access_token(user_uuid=str(uuid4()))["access_token"]
+    fingerprint = (await repository_document.get_document_by_uuid(session, document_id)).labels_fingerprint
+    label_ids = [label.id for label in (await repository_document.get_document_by_uuid(session, document_id)).labels]
+    label_set = [schema_label.LabelBase(key="ipv4", value="10.0.1.1"), schema_label.LabelBase(key="env", value="dev")]
+    deleted_label_id = (await repository_label.list_by_pairs(session, [schema_label.LabelBase(key="env", value="prd")]))[0].id
+    unused_type_id = (await repository_document_type.get_or_create(session, [schema_document_type.DocumentTypeCreate(name="unused")]))[0].id
+    profile_user = await repository_user.create_user(session, schema_user.UserCreate(
+        username="planprofile", email="profile@example.com", password="Plan@password1", confirm_password="Plan@password1"
+    ))
+
+    yield "repository_document.create_or_update_documents", lambda: repository_document.create_or_update_documents(session, make_documents(3))
+    yield "repository_document.list_all", lambda: repository_document.list_all(session)
+    yield "repository_document.get_document_by_uuid", lambda: repository_document.get_document_by_uuid(session, document_id)
+    yield "repository_document.list_by_ids", lambda: repository_document.list_by_ids(session, [document_id, uuid4()])
+    yield "repository_document.stream_relations", lambda: consume(repository_document.stream_relations(session, label_ids))
+    yield "repository_document.stream_relations[filtered]", lambda: consume(repository_document.stream_relations(
+        session, label_ids, service_label.TraversalOptions(deny_keys=frozenset({"env"}), max_fanout=2)
+    ))
+    yield "repository_document.relation_hubs", lambda: repository_document.relation_hubs(session, label_ids)
+    yield "repository_document.list_by_selector", lambda: repository_document.list_by_selector(session, "ipv4 in (10.0.1.1,10.0.1.2),env=dev,!gone")
+    yield "repository_document.list_by_selector[negative]", lambda: repository_document.list_by_selector(session, "env!=dev")
+    yield "repository_document.list_by_labels_fingerprint", lambda: repository_document.list_by_labels_fingerprint(session, fingerprint)
+    yield "repository_document.list_by_label_set", lambda: repository_document.list_by_label_set(session, label_set)
+    yield "repository_document.refresh_label_columns", lambda: repository_document.refresh_label_columns(session, [document_id, uuid4()])
+    yield "repository_document.list_label_sets", lambda: repository_document.list_label_sets(session)
+    yield "repository_document.delete_by_uuids", lambda: repository_document.delete_by_uuids(session, [document_id, uuid4()])
+    yield "repository_document.delete", lambda: repository_document.delete(session, uuid4())
+    yield "repository_label.list_all", lambda: repository_label.list_all(session)
+    yield "repository_label.list_by_pairs", lambda: repository_label.list_by_pairs(session, label_set)
+    yield "repository_label.get_or_create", lambda: repository_label.get_or_create(session, [schema_label.LabelCreate(key="zone", value="a")])
+    yield "repository_label.delete", lambda: repository_label.delete(session, deleted_label_id)
+    yield "repository_document_type.list_all", lambda: repository_document_type.list_all(session)
+    yield "repository_document_type.get_or_create", lambda: repository_document_type.get_or_create(session, [schema_document_type.DocumentTypeCreate(name="app")])
+    yield "repository_user.create_user", lambda: repository_user.create_user(session, schema_user.UserCreate(
+        username="planuser", email="plan@example.com", password="Plan@password1", confirm_password="Plan@password1"
+    ))
+    yield "repository_document_type.delete", lambda: repository_document_type.delete(session, unused_type_id)
+    yield "repository_user.update_user_profile", lambda: repository_user.update_user_profile(
+        session, profile_user, "planprofile2", "profile2@example.com", None, None
+    )
+    yield "repository_user.get_user", lambda: repository_user.get_user(session, uuid4())
+    yield "service_auth.get_user_by_token", lambda: service_auth.get_user_by_token(session, token)
+    yield "route_user.login", lambda: client.post("/user/login", json={"email": "plan@example.com", "password": "x", "remember": False})
+    yield "route_user.register", lambda: client.post("/user/register", json={
+        "username": "planuser", "email": "plan@example.com", "password": "x", "confirm_password": "x"
+    })
+
+
+async def test_repository_queries_use_indexes(async_session, async_client):
+    engine = async_session.bind
+    offenders = {}
+
+    async for name, call in run_cases(async_session, async_client):
+        statements = []
+        with query_plan.capture_statements(engine.sync_engine, statements):
+            await call()
+        assert statements, "{} executed no statement".format(name)
+
+        tables = TABLES - ALLOWED_FULL_SCANS.get(name, set())
+        async with engine.connect() as connection:
+            for statement, plan in (await query_plan.explain_all(connection, statements, tables)).items():
+                offenders.setdefault(name, []).append("{}\n    {}".format(statement, "\n    ".join(plan)))
+
+    assert not offenders, "Full table scans:\n" + "\n".join(
+        "{}:\n  {}".format(name, "\n  ".join(plans)) for name, plans in offenders.items()
+    )
+
+
+@pytest.mark.parametrize("plan, expected", [
+    (["SCAN documents"], ["documents"]),
+    (["SCAN labels AS labels_1"], ["labels"]),
+    (["MATERIALIZE (join-1)", "SCAN document_label_1"], ["document_label"]),
+    (["SCAN documents USING INDEX ix_documents_type_id"], []),
+    (["SEARCH documents USING INDEX sqlite_autoindex_documents_1 (id=?)"], []),
+    (["SCAN anon_1", "SCAN CONSTANT ROW"], []),
+])
+def test_full_scans(plan, expected):
+    assert query_plan.full_scans(plan, TABLES) == expected
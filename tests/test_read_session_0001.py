@@ -0,0 +1,72 @@
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+import database
+from main import app
+from models import model_label
+from services import service_analytics, service_components, service_graph, service_similarity
+
+
+def test_get_routes_use_read_sessions():
+    for route in app.routes:
+        if isinstance(route, APIRoute) and "GET" in route.methods:
+            assert database.get_async_db not in [dependency.call for dependency in route.dependant.dependencies], route.path
+
+
+async def test_read_session_rejects_writes(tmp_path, monkeypatch):
+    path = str(tmp_path / "app.db")
+    writer = create_async_engine("sqlite+aiosqlite:///{}".format(path))
+    async with writer.begin() as connection:
+        await connection.run_sync(database.Base.metadata.create_all)
+    reader = create_async_engine(database.read_only_url(path))
+    monkeypatch.setitem(database.ReadSessionLocal.kw, "bind", reader)
+
+    sessions = database.get_read_db()
+    session = await anext(sessions)
+    assert (await session.execute(select(func.count()).select_from(model_label.Label))).scalar() == 0
+
+    session.add(model_label.Label(key="zone", value="a"))
+    with pytest.raises(OperationalError, match="readonly"):
+        await session.flush()
+    await sessions.aclose()
+    await reader.dispose()
+    await writer.dispose()
+
+
+def forget_indexes():
+    service_components.components.index = None
+    service_similarity.similarity.index = None
+    service_graph.graph.reset()
+    service_analytics.analytics.reset()
+
+
+async def test_indexes_load_once_for_both_sessionmakers(tmp_path, monkeypatch):
+    path = str(tmp_path / "app.db")
+    writer = create_async_engine("sqlite+aiosqlite:///{}".format(path))
+    async with writer.begin() as connection:
+        await connection.run_sync(database.Base.metadata.create_all)
+    reader = create_async_engine(database.read_only_url(path))
+    monkeypatch.setitem(database.AsyncSessionLocal.kw, "bind", writer)
+    monkeypatch.setitem(database.ReadSessionLocal.kw, "bind", reader)
+
+    services = [service_components.components, service_similarity.similarity, service_graph.graph, service_analytics.analytics]
+    loads = {}
+    forget_indexes()
+    for service in services:
+        async def counting(bind, service=service, load=service._load):
+            loads[service] = loads.get(service, 0) + 1
+            return await load(bind)
+
+        monkeypatch.setattr(service, "_load", counting)
+    try:
+        for sessionmaker in (database.AsyncSessionLocal, database.ReadSessionLocal, database.AsyncSessionLocal):
+            async with sessionmaker() as session:
+                for service in services:
+                    await service.get(session)
+        assert list(loads.values()) == [1] * len(services)
+    finally:
+        forget_indexes()
+        await reader.dispose()
+        await writer.dispose()
@@ -0,0 +1,15 @@
+import multiprocessing
+import uvicorn
+import serve
+
+
+async def test_worker_asks_to_retire_and_keeps_serving():
+    context = multiprocessing.get_context("spawn")
+    worker = serve.Worker(uvicorn.Config("main:app"), 3, context.Event(), context.Event())
+    worker.server_state.total_requests = 2
+    assert not await worker.on_tick(1)
+    assert not worker.retiring.is_set()
+
+    worker.server_state.total_requests = 3
+    assert not await worker.on_tick(2)
+    assert worker.retiring.is_set()
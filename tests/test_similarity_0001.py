@@ -0,0 +1,64 @@
+import uuid
+import pytest
+from services import service_similarity
+from factory import factory_documents
+
+ENVIRONMENTS = 3
+
+
+@pytest.fixture
+async def inventory(authenticated_client):
+    service_similarity.similarity.__init__()
+    documents = list(factory_documents.generate_documents(ENVIRONMENTS * factory_documents.DOCUMENTS_PER_ENVIRONMENT))
+    response = await authenticated_client.post("/documents/", json=documents)
+    assert response.status_code == 201
+    ids = {document["hash"]: document["id"] for group in response.json().values() for document in group}
+    yield documents, ids
+    service_similarity.similarity.__init__()
+
+
+def test_minhash_estimates_jaccard():
+    first = service_similarity.features([("key{}".format(index), "v") for index in range(40)])
+    second = service_similarity.features([("key{}".format(index), "v") for index in range(20, 60)])
+    estimate = sum(
+        a == b for a, b in zip(service_similarity.signature(first), service_similarity.signature(second))
+    ) / service_similarity.NUM_PERM
+    assert abs(estimate - service_similarity.jaccard(first, second)) < 0.2
+
+
+def test_index_add_remove():
+    index = service_similarity.SimilarityIndex()
+    first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    index.add(first, [("domain", "a.example.com"), ("port", "5432"), ("ipv4", "10.0.0.1")])
+    index.add(second, [("domain", "a.example.com"), ("port", "5432"), ("ipv4", "10.0.0.1")])
+    index.add(third, [("queue", "q")])
+    assert index.similar(first, 5) == [(second, 1.0)]
+
+    index.add(second, [("queue", "q")])
+    assert index.similar(first, 5) == []
+    assert index.similar(third, 5) == [(second, 1.0)]
+    index.remove(second)
+    assert index.similar(third, 5) == []
+    assert index.similar(second, 5) is None
+
+
+async def test_similar_documents(authenticated_client, inventory):
+    documents, ids = inventory
+    database = documents[4]
+
+    response = await authenticated_client.get("/documents/{}/similar".format(ids[database["hash"]]), params={"k": 3})
+    assert response.status_code == 200
+    similar = response.json()
+    assert similar[0]["document"]["hash"] == documents[0]["hash"]
+    assert similar[0]["similarity"] == 0.75
+    assert {item["document"]["type"]["name"] for item in similar} <= {"dns", "database"}
+    assert similar[0]["similarity"] >= similar[-1]["similarity"]
+
+    duplicate = dict(database, hash="similarity-0001", type="backup")
+    assert (await authenticated_client.post("/documents/", json=[duplicate])).status_code == 201
+    similar = (await authenticated_client.get("/documents/{}/similar".format(ids[database["hash"]]), params={"k": 1})).json()
+    assert similar[0]["document"]["hash"] == "similarity-0001"
+    assert similar[0]["similarity"] == 1.0
+
+    response = await authenticated_client.get("/documents/{}/similar".format(uuid.uuid4()))
+    assert response.status_code == 404
@@ -0,0 +1,42 @@
+import logging
+from services import service_sql_accounting
+from factory import factory_documents
+
+
+def test_statement_shape():
+    first = "SELECT labels.id FROM labels WHERE labels.key = ? AND labels.id IN (?, ?, ?) LIMIT 10"
+    second = "SELECT labels.id  FROM labels WHERE labels.key = ? AND labels.id IN (?) LIMIT 20"
+    assert service_sql_accounting.statement_shape(first) == service_sql_accounting.statement_shape(second)
+    assert service_sql_accounting.statement_shape("SELECT 'a' FROM labels_1") == "SELECT ? FROM labels_1"
+
+
+def test_repeated_statements():
+    queries = service_sql_accounting.RequestQueries()
+    for _ in range(5):
+        queries.record("SELECT * FROM labels WHERE key = ?", 0.001)
+    queries.record("SELECT * FROM documents", 0.001)
+    assert queries.count == 6
+    assert queries.repeated(threshold=5) == [("SELECT * FROM labels WHERE key = ?", 5)]
+    timing = queries.server_timing(0.01)
+    assert timing.startswith('db;dur=6.000;desc="6 queries", app;dur=10.000')
+    assert 'n-plus-one;desc="1 statements repeated, worst x5"' in timing
+
+
+async def test_server_timing_header(authenticated_client, async_session, caplog, monkeypatch):
+    monkeypatch.setattr(logging.getLogger("athross"), "propagate", True)
+    service_sql_accounting.instrument_engine(async_session.bind.sync_engine)
+    documents = factory_documents.generate_environment(0)[:3]
+
+    with caplog.at_level(logging.DEBUG, logger="athross.sql"):
+        response = await authenticated_client.post("/documents/", json=documents)
+
+    assert response.status_code == 201
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert "app;dur=" in timing
+    assert "n-plus-one" in timing
+    assert any(record.levelno == logging.WARNING and "N+1 on POST /documents/" in record.getMessage() for record in caplog.records)
+    assert any(record.levelno == logging.DEBUG and "queries in" in record.getMessage() for record in caplog.records)
+
+    response = await authenticated_client.get("/documents/label-sets/unknown")
+    assert "n-plus-one" not in response.headers["server-timing"]
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+import database
+from main import app, lifespan
+
+LAZY_MODULES = ("numpy", "passlib", "bcrypt")
+
+
+def test_heavy_modules_load_on_first_use():
+    script = "import sys, main; print(','.join(module for module in {!r} if module in sys.modules))".format(LAZY_MODULES)
+    output = subprocess.check_output([sys.executable, "-c", script], env=dict(os.environ, PYTHONPATH=os.getcwd()))
+    assert output.decode().strip() == ""
+
+
+async def test_lifespan_builds_openapi_schema(monkeypatch):
+    monkeypatch.setenv(database.SCHEMA_READY, "1")
+    monkeypatch.setattr(app, "openapi_schema", None)
+    async with lifespan(app):
+        assert app.openapi_schema is not None
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import pytest
+from services import service_tracing
+
+
+@pytest.fixture
+def trace_file(tmp_path, async_session):
+    path = str(tmp_path / "spans.jsonl")
+    service_tracing.instrument_engine(async_session.bind.sync_engine)
+    service_tracing.configure(rate=1.0, path=path)
+    yield path
+    service_tracing.configure(rate=0.0)
+
+
+def read_spans(path):
+    service_tracing.flush()
+    spans = []
+    with open(path) as trace:
+        for line in trace:
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    spans.extend(scope["spans"])
+    return spans
+
+
+def attribute(span, key):
+    for item in span["attributes"]:
+        if item["key"] == key:
+            return next(iter(item["value"].values()))
+
+
+async def test_request_spans(authenticated_client, trace_file):
+    response = await authenticated_client.get("/documents/label-sets/unknown")
+    assert response.status_code == 200
+
+    spans = read_spans(trace_file)
+    server = next(span for span in spans if span["name"] == "GET /documents/label-sets/{fingerprint}")
+    assert server["kind"] == service_tracing.KIND_SERVER
+    assert "parentSpanId" not in server
+    assert attribute(server, "http.response.status_code") == "200"
+
+    trace = [span for span in spans if span["traceId"] == server["traceId"]]
+    by_id = {span["spanId"]: span for span in trace}
+    auth = next(span for span in trace if span["name"] == "service_auth.get_user_by_token")
+    assert auth["parentSpanId"] == server["spanId"]
+    statements = [span for span in trace if span["kind"] == service_tracing.KIND_CLIENT]
+    assert any(by_id[span["parentSpanId"]]["name"] == "service_auth.get_user_by_token" for span in statements)
+    assert any(by_id[span["parentSpanId"]]["name"] == "repository_document.list_by_labels_fingerprint" for span in statements)
+    assert all(int(span["startTimeUnixNano"]) <= int(span["endTimeUnixNano"]) for span in trace)
+
+
+async def test_traceparent_and_sampling(async_client, trace_file):
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    await async_client.get("/user/profile", headers={"traceparent": "00-{}-00f067aa0ba902b7-01".format(trace_id)})
+    await async_client.get("/user/profile", headers={"traceparent": "00-{}-00f067aa0ba902b7-00".format("1" * 32)})
+
+    service_tracing.configure(rate=0.0)
+    await async_client.get("/user/profile")
+
+    spans = read_spans(trace_file)
+    servers = [span for span in spans if span["kind"] == service_tracing.KIND_SERVER]
+    assert len(servers) == 1
+    assert servers[0]["traceId"] == trace_id
+    assert servers[0]["parentSpanId"] == "00f067aa0ba902b7"
+
+
+async def test_traced_records_exceptions(trace_file):
+    @service_tracing.traced("failing")
+    async def failing():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await failing()
+
+    span = read_spans(trace_file)[0]
+    assert span["name"] == "failing"
+    assert span["status"] == {"code": service_tracing.STATUS_ERROR, "message": "boom"}
+    assert span["events"][0]["name"] == "exception"
+
+
+async def test_traced_async_generator_spans_the_iteration(trace_file):
+    @service_tracing.traced("rows")
+    async def rows():
+        for number in range(2):
+            with service_tracing.span("row"):
+                await asyncio.sleep(0.01)
+            yield number
+
+    with service_tracing.span("request"):
+        async for _ in rows():
+            with service_tracing.span("consumer"):
+                pass
+
+    spans = {span["name"]: span for span in read_spans(trace_file)}
+    generator, request = spans["rows"], spans["request"]
+    assert generator["parentSpanId"] == request["spanId"]
+    assert spans["row"]["parentSpanId"] == generator["spanId"]
+    assert spans["consumer"]["parentSpanId"] == request["spanId"]
+    assert int(generator["endTimeUnixNano"]) - int(generator["startTimeUnixNano"]) >= 20_000_000
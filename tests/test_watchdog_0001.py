@@ -0,0 +1,32 @@
+import time
+import asyncio
+from services import service_watchdog
+
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+
+async def test_watchdog_reports_blocking_stack():
+    watchdog = service_watchdog.LoopWatchdog(interval=0.01, threshold=0.05).start()
+    blocks_before = service_watchdog.event_loop_blocks.get()
+    try:
+        await asyncio.sleep(0.05)
+        block_the_loop(0.3)
+        await asyncio.sleep(0.05)
+    finally:
+        await watchdog.stop()
+
+    assert len(watchdog.blocks) == 1
+    block = watchdog.blocks[0]
+    assert block["blocked_ms"] >= 50
+    assert any("block_the_loop" in line for line in block["stack"])
+    assert service_watchdog.event_loop_blocks.get() == blocks_before + 1
+    assert service_watchdog.event_loop_lag.quantile(1.0) >= 0.25
+    assert 'event_loop_lag_seconds{quantile="0.99"}' in "\n".join(service_watchdog.event_loop_lag.render())
+
+
+async def test_loop_endpoint(authenticated_client):
+    response = await authenticated_client.get("/debug/loop")
+    assert response.status_code == 200
+    assert set(response.json()["lag_seconds"]) == {"p50", "p90", "p99", "p99.9"}
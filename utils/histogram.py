@@ -0,0 +1,93 @@
+from typing import Dict, List, Tuple
+
+PERCENTILES = (50.0, 75.0, 90.0, 95.0, 99.0, 99.9, 99.99, 100.0)
+
+
+class Histogram:
+    """
+    Log-linear (HDR style) histogram of non-negative integer values.
+
+    Values below ``2 ** sub_bucket_bits`` are counted exactly; above that every
+    power of two is split into ``2 ** (sub_bucket_bits - 1)`` linear buckets, so
+    the relative error stays under ``2 ** -(sub_bucket_bits - 1)`` (1.6% with the
+    default) over any range, in O(1) time and a few KB per histogram.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.half_count = 1 << (sub_bucket_bits - 1)
+        self.counts: List[int] = []
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        if value < 2 * self.half_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return shift * self.half_count + (value >> shift)
+
+    def _highest_equivalent(self, index: int) -> int:
+        if index < 2 * self.half_count:
+            return index
+        shift = index // self.half_count - 1
+        return ((index - shift * self.half_count + 1) << shift) - 1
+
+    def record(self, value: int, count: int = 1) -> None:
+        value = max(0, int(value))
+        index = self._index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += count
+        self.total += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram") -> None:
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different precision")
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def percentile(self, percentile: float) -> int:
+        if not self.total:
+            return 0
+        target = max(1, round(percentile / 100.0 * self.total))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def distribution(self, percentiles: Tuple[float, ...] = PERCENTILES) -> Dict[str, int]:
+        return {"p{:g}".format(percentile): self.percentile(percentile) for percentile in percentiles}
+
+    def buckets(self) -> List[Tuple[int, int]]:
+        """Non-empty buckets as ``(highest equivalent value, count)`` pairs."""
+        return [(self._highest_equivalent(index), count) for index, count in enumerate(self.counts) if count]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.total,
+            "min": self.min or 0,
+            "max": self.max,
+            "mean": self.mean,
+            "percentiles": self.distribution(),
+            "buckets": self.buckets(),
+        }
@@ -0,0 +1,59 @@
+import re
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_FULL_SCAN_RE = re.compile(r"^SCAN (\w+?)(?:_\d+)?(?: AS \w+)?$")
+
+Statement = Tuple[str, tuple]
+
+
+@contextmanager
+def capture_statements(engine: Engine, statements: List[Statement]):
+    """Record every statement executed on ``engine`` while the block runs."""
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, tuple(parameters or ())))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def is_plannable(statement: str) -> bool:
+    return statement.lstrip().split(" ", 1)[0].upper() in ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+def full_scans(plan: List[str], tables: set) -> List[str]:
+    """
+    Tables of ``tables`` read row by row without any index, from the detail
+    column of an SQLite ``EXPLAIN QUERY PLAN``. SQLAlchemy aliases such as
+    ``document_label_1`` count as their table; scans of subqueries, CTEs and
+    full index scans (``SCAN t USING [COVERING] INDEX``) are not reported.
+    """
+    scanned = []
+    for detail in plan:
+        match = _FULL_SCAN_RE.match(detail)
+        if match and match.group(1) in tables:
+            scanned.append(match.group(1))
+    return scanned
+
+
+async def explain(connection, statement: str, parameters: tuple) -> List[str]:
+    result = await connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return [row[-1] for row in result.all()]
+
+
+async def explain_all(connection, statements: List[Statement], tables: set) -> Dict[str, List[str]]:
+    """Map every plannable statement that full-scans one of ``tables`` to its plan."""
+    offenders = {}
+    for statement, parameters in statements:
+        if not is_plannable(statement) or statement in offenders:
+            continue
+        plan = await explain(connection, statement, parameters)
+        if full_scans(plan, tables):
+            offenders[statement] = plan
+    return offenders
@@ -1,15 +1,23 @@
+import functools
 import re
-from passlib.context import CryptContext
 from fastapi import HTTPException, status
+from services import service_tracing
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+@functools.lru_cache(maxsize=None)
+def pwd_context():
+    # passlib and bcrypt load on the first password check rather than at startup.
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+
+@service_tracing.traced()
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
+@service_tracing.traced()
 def verify_password(plain_password, hashed_password) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def validate_password(password:str, confirm_password:str) -> None:
     if password != confirm_password: